@@ -2,6 +2,8 @@
 import asyncio
 from agent_framework import ChatMessage, Role, TextContent, UriContent
 from agent_client_factory import get_azopenaichatclient
+from agent_response_cache import ResponseCacheMiddleware, SQLiteCacheBackend
+from pathlib import Path
 
 # Message with image content
 message = ChatMessage(
@@ -14,10 +16,18 @@ message = ChatMessage(
 )
 
 async def main():
+    # Answers are cached on disk for a day, per client and deployment: running the sample again
+    # replays the cached jokes instead of calling the model
+    response_cache = ResponseCacheMiddleware(
+        SQLiteCacheBackend(Path(__file__).parent / "agent_cache" / "responses.sqlite"),
+        ttl=24 * 3600,
+    )
+
     # Create a minimal agent with instructions
     agent = get_azopenaichatclient().create_agent(
         instructions="You are good at telling jokes.",
-        name="Joker"
+        name="Joker",
+        middleware=[response_cache],
     )
     
     GPT_JOKE_PROMPT = "Tell me a joke about a ChatGPT."
@@ -42,6 +52,8 @@ async def main():
     print(result_clown_joke.text)
     print()
 
+    print(f"Response cache: {response_cache.hits} hits, {response_cache.misses} model calls")
+
 # Run the main function
 if __name__ == "__main__":
     asyncio.run(main())
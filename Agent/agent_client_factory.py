@@ -1,21 +1,334 @@
 # Agent client factory for Azure OpenAI
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import httpx
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+from azure.core.credentials import AccessToken, TokenCredential
 from azure.identity import AzureCliCredential
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+from agent_mock_client import MockChatClient
+from agent_rate_limiter import RateLimitedTransport, RateLimitScheduler
 from agent_framework.azure import AzureOpenAIChatClient, AzureOpenAIResponsesClient
 
+AZURE_OPENAI_ENDPOINT = "https://ai-services-test-ai-resource.openai.azure.com/"
+AZURE_OPENAI_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+# Set this environment variable to a folder to keep access tokens on disk across process restarts
+TOKEN_CACHE_DIR_ENV = "AZURE_TOKEN_CACHE_DIR"
+
+# Set this environment variable to "mock" to run the samples offline with MockChatClient
+CHAT_CLIENT_ENV = "AGENT_CHAT_CLIENT"
+
+logger = logging.getLogger(__name__)
+
+class CachedTokenCredential:
+    """Credential wrapper that caches access tokens per scope.
+
+    Acquiring a token from AzureCliCredential or DefaultAzureCredential shells out to `az` or walks
+    the credential chain, which costs hundreds of milliseconds. This wrapper fetches each scope once,
+    serves it from memory and, once used from an event loop, refreshes it in a background task
+    `refresh_margin` seconds before it expires so requests never wait for a new token.
+
+    When `cache_file` is set, tokens are also written to that file (readable only by the current user)
+    and loaded on start, so short-lived workers skip the first token request entirely.
+    """
+
+    def __init__(self, credential: TokenCredential, cache_file: str | Path | None = None, refresh_margin: float = 300.0):
+        self._credential = credential
+        self._cache_file = Path(cache_file) if cache_file else None
+        self._refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._refresh_task: asyncio.Task[None] | None = None
+        self._tokens: dict[str, AccessToken] = self._load_cache()
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        """Returns a cached token for the scopes, requesting a new one when missing or expired."""
+        if kwargs:
+            # Claims challenges and tenant overrides must always go to the underlying credential
+            return self._credential.get_token(*scopes, **kwargs)
+
+        key = " ".join(scopes)
+        token = self._tokens.get(key)
+        if token is not None and not self._expires_within(token, 30):
+            return token
+
+        with self._lock:
+            # Another thread may have fetched the token while we were waiting for the lock
+            token = self._tokens.get(key)
+            if token is None or self._expires_within(token, 30):
+                token = self._credential.get_token(*scopes)
+                self._store(key, token)
+        return token
+
+    async def get_token_async(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        """Async variant of `get_token`. Also starts the background refresh task."""
+        self._ensure_refresh_task()
+        token = self._tokens.get(" ".join(scopes))
+        if token is not None and not kwargs and not self._expires_within(token, 30):
+            return token
+        return await asyncio.to_thread(self.get_token, *scopes, **kwargs)
+
+    def get_token_provider(self, scope: str) -> Callable[[], Awaitable[str]]:
+        """Returns an async bearer token provider for the scope (used as azure_ad_token_provider)."""
+        async def token_provider() -> str:
+            return (await self.get_token_async(scope)).token
+
+        return token_provider
+
+    def as_async(self) -> "AsyncCachedTokenCredential":
+        """Returns a view of this credential that implements the async credential protocol."""
+        return AsyncCachedTokenCredential(self)
+
+    def close(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def aclose(self) -> None:
+        """Stop the background refresh task. Cached tokens are kept."""
+        task = self._refresh_task
+        self.close()
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _expires_within(self, token: AccessToken, seconds: float) -> bool:
+        return token.expires_on - time.time() <= seconds
+
+    def _ensure_refresh_task(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            now = time.time()
+            next_refresh = min((t.expires_on - self._refresh_margin for t in self._tokens.values()), default=now + 60)
+            # Wake up at least once a minute to pick up scopes added in the meantime
+            await asyncio.sleep(min(max(next_refresh - now, 1.0), 60.0))
+
+            for key, token in list(self._tokens.items()):
+                if not self._expires_within(token, self._refresh_margin):
+                    continue
+                try:
+                    new_token = await asyncio.to_thread(self._credential.get_token, *key.split(" "))
+                    self._store(key, new_token)
+                except Exception as error:
+                    # Keep the current token; the next iteration (or a request) will try again
+                    logger.warning(f"Failed to refresh token for scope '{key}': {error}")
+
+    def _store(self, key: str, token: AccessToken) -> None:
+        self._tokens[key] = token
+        if self._cache_file is None:
+            return
+        try:
+            self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._cache_file.with_suffix(".tmp")
+            data = {k: [t.token, t.expires_on] for k, t in self._tokens.items()}
+            # The file contains bearer tokens, so only the current user may read it
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._cache_file)
+        except OSError as error:
+            logger.warning(f"Failed to write token cache {self._cache_file}: {error}")
+
+    def _load_cache(self) -> dict[str, AccessToken]:
+        if self._cache_file is None or not self._cache_file.exists():
+            return {}
+        try:
+            data = json.loads(self._cache_file.read_text())
+            tokens = {key: AccessToken(token, int(expires_on)) for key, (token, expires_on) in data.items()}
+        except (OSError, ValueError, TypeError) as error:
+            logger.warning(f"Ignoring unreadable token cache {self._cache_file}: {error}")
+            return {}
+        return {key: token for key, token in tokens.items() if not self._expires_within(token, 30)}
+
+class AsyncCachedTokenCredential:
+    """Async credential protocol on top of a shared CachedTokenCredential.
+
+    Closing it does not close the shared credential, so clients that close their credential
+    (like AzureAIAgentClient) keep the cache intact for everyone else.
+    """
+
+    def __init__(self, credential: CachedTokenCredential):
+        self._credential = credential
+
+    async def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        return await self._credential.get_token_async(*scopes, **kwargs)
+
+    async def close(self) -> None:
+        pass
+
+    async def __aenter__(self) -> "AsyncCachedTokenCredential":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        pass
+
+def get_token_cache_file(name: str) -> Path | None:
+    """Returns the on-disk token cache file for a credential, or None when disk caching is off."""
+    cache_dir = os.getenv(TOKEN_CACHE_DIR_ENV)
+    return Path(cache_dir) / f"{name}_tokens.json" if cache_dir else None
+
+# Shared credential used by every factory function below
+cli_credential = CachedTokenCredential(AzureCliCredential(), cache_file=get_token_cache_file("azure_cli"))
+
+class ClientRegistry:
+    """Process-wide cache of Azure OpenAI clients.
+
+    Clients are keyed by (endpoint, deployment, api_version). Each key owns a single
+    AsyncAzureOpenAI client backed by one keep-alive HTTP connection pool, so every agent
+    created for the same deployment reuses warm TLS connections instead of opening new ones.
+
+    Every request to a deployment goes through that deployment's RateLimitScheduler, which queues
+    requests by priority within the tokens-per-minute and requests-per-minute quota (learned from the
+    response headers unless configured) and retries 429 responses with jittered backoff.
+
+    The pools are bound to the running event loop. Call `aclose()` before the loop ends
+    (for example at the end of `main()`); the next call to a factory function creates fresh pools.
+    """
+
+    def __init__(
+        self,
+        credential: CachedTokenCredential,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        tokens_per_minute: int | None = None,
+        requests_per_minute: int | None = None,
+    ):
+        self.configure(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+            tokens_per_minute=tokens_per_minute,
+            requests_per_minute=requests_per_minute,
+        )
+        self._credential = credential
+        self._connections: dict[tuple[str, str, str], AsyncAzureOpenAI] = {}
+        self._clients: dict[tuple[type, str, str, str], Any] = {}
+        self._schedulers: dict[tuple[str, str], RateLimitScheduler] = {}
+
+    def configure(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        tokens_per_minute: int | None = None,
+        requests_per_minute: int | None = None,
+    ) -> None:
+        """Set the connection pool limits and the deployment quota. Only pools created after this call are affected."""
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._tokens_per_minute = tokens_per_minute
+        self._requests_per_minute = requests_per_minute
+
+    def get_scheduler(self, endpoint: str, deployment_name: str) -> RateLimitScheduler:
+        """Returns the rate limit scheduler shared by every client of the deployment."""
+        key = (endpoint, deployment_name)
+        scheduler = self._schedulers.get(key)
+        if scheduler is None:
+            scheduler = RateLimitScheduler(
+                tokens_per_minute=self._tokens_per_minute,
+                requests_per_minute=self._requests_per_minute,
+            )
+            self._schedulers[key] = scheduler
+        return scheduler
+
+    def get_async_client(self, endpoint: str, deployment_name: str, api_version: str) -> AsyncAzureOpenAI:
+        """Returns the shared AsyncAzureOpenAI client (and connection pool) for the given key."""
+        key = (endpoint, deployment_name, api_version)
+        async_client = self._connections.get(key)
+        if async_client is None:
+            # Quotas are per deployment, so clients with different API versions share one scheduler
+            transport = RateLimitedTransport(
+                httpx.AsyncHTTPTransport(limits=self._limits),
+                self.get_scheduler(endpoint, deployment_name),
+            )
+            async_client = AsyncAzureOpenAI(
+                azure_endpoint=endpoint,
+                azure_deployment=deployment_name,
+                api_version=api_version,
+                azure_ad_token_provider=self._credential.get_token_provider(AZURE_OPENAI_SCOPE),
+                http_client=DefaultAsyncHttpxClient(transport=transport),
+                # RateLimitedTransport owns the retries; SDK retries on top would multiply each 429 retry
+                # and bypass the scheduler's Retry-After handling
+                max_retries=0,
+            )
+            self._connections[key] = async_client
+        return async_client
+
+    def get_client(self, client_type: type, endpoint: str, deployment_name: str, api_version: str) -> Any:
+        """Returns the cached chat client of the given type, creating it on first use."""
+        key = (client_type, endpoint, deployment_name, api_version)
+        client = self._clients.get(key)
+        if client is None:
+            client = client_type(
+                async_client=self.get_async_client(endpoint, deployment_name, api_version),
+                endpoint=endpoint,
+                api_version=api_version,
+                deployment_name=deployment_name,
+            )
+            self._clients[key] = client
+        return client
+
+    async def aclose(self) -> None:
+        """Close every connection pool, forget the cached clients and stop the token refresh task."""
+        connections = list(self._connections.values())
+        self._connections.clear()
+        self._clients.clear()
+        self._schedulers.clear()
+        for async_client in connections:
+            await async_client.close()
+        await self._credential.aclose()
+
+    async def __aenter__(self) -> "ClientRegistry":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.aclose()
+
+# Shared registry used by the factory functions below
+client_registry = ClientRegistry(cli_credential)
+
+# Offline clients returned by the factory functions when CHAT_CLIENT_ENV is "mock"
+mock_client_options: dict[str, Any] = {}
+mock_clients: dict[str, MockChatClient] = {}
+
+def use_mock_client() -> bool:
+    """Returns True when the samples should run against MockChatClient instead of Azure OpenAI."""
+    return os.getenv(CHAT_CLIENT_ENV, "").lower() == "mock"
+
+def configure_mock_client(**options: Any) -> None:
+    """Set the MockChatClient options (seed, latency, chunk_size, ...) for clients created after this call."""
+    mock_client_options.clear()
+    mock_client_options.update(options)
+    mock_clients.clear()
+
+def get_mockchatclient(deployment_name="gpt-4o") -> MockChatClient:
+    """Returns the shared instance of MockChatClient for the deployment."""
+    client = mock_clients.get(deployment_name)
+    if client is None:
+        client = MockChatClient(model_id=deployment_name, **mock_client_options)
+        mock_clients[deployment_name] = client
+    return client
+
 def get_azopenaichatclient(api_version="2024-08-01-preview", deployment_name="gpt-4o") -> AzureOpenAIChatClient:
-    """Returns an instance of AzureOpenAIChatClient."""
-    return AzureOpenAIChatClient(
-        credential=AzureCliCredential(),
-        endpoint="https://ai-services-test-ai-resource.openai.azure.com/",
-        api_version=api_version,
-        deployment_name=deployment_name
-    )
+    """Returns the shared instance of AzureOpenAIChatClient for the deployment."""
+    if use_mock_client():
+        return get_mockchatclient(deployment_name)
+    return client_registry.get_client(AzureOpenAIChatClient, AZURE_OPENAI_ENDPOINT, deployment_name, api_version)
 
 def get_azopenairesponsesclient(api_version="preview", deployment_name="gpt-4o") -> AzureOpenAIResponsesClient:
-    """Returns an instance of AzureOpenAIResponsesClient."""
-    return AzureOpenAIResponsesClient(
-        credential=AzureCliCredential(),
-        endpoint="https://ai-services-test-ai-resource.openai.azure.com/",
-        api_version=api_version,
-        deployment_name=deployment_name
-    )
+    """Returns the shared instance of AzureOpenAIResponsesClient for the deployment."""
+    if use_mock_client():
+        return get_mockchatclient(deployment_name)
+    return client_registry.get_client(AzureOpenAIResponsesClient, AZURE_OPENAI_ENDPOINT, deployment_name, api_version)
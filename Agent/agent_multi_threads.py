@@ -1,6 +1,7 @@
 # Demonstrates using multiple threads with a single agent instance.
 import asyncio
-from agent_client_factory import get_azopenaichatclient
+from agent_client_factory import client_registry, get_azopenaichatclient
+from agent_thread_runner import ConcurrentThreadRunner
 
 async def main():
     # Create a minimal agent with instructions
@@ -9,23 +10,23 @@ async def main():
         name="Joker"
     )
 
-    # Create separate threads for different joke contexts
-    pirate_joke_thread = agent.get_new_thread()
-    robot_joke_thread = agent.get_new_thread()
+    # Run the conversations in parallel, each one in its own thread.
+    # Turns of the same conversation still run in order, so the explanation follows its joke.
+    runner = ConcurrentThreadRunner(agent, max_concurrency=4)
+    runner.add_conversation("pirate", ["Tell me a joke about a pirate.", "Now explain the joke"])
+    runner.add_conversation("robot", ["Tell me a joke about a robot.", "Now explain the joke."])
 
-    # Run jokes in parallel using the different threads
-    pirate_joke = await agent.run("Tell me a joke about a pirate.", thread=pirate_joke_thread)
-    print(pirate_joke.text)
+    # Print each answer as soon as it arrives
+    async for result in runner.run():
+        if result.error is not None:
+            print(f"\n[{result.conversation} #{result.turn + 1}] failed: {result.error}")
+        elif result.turn == 0:
+            print(f"\n[{result.conversation}] {result.text}")
+        else:
+            print(f"\n[{result.conversation}] Joke explanation: {result.text}")
 
-    robot_joke = await agent.run("Tell me a joke about a robot.", thread=robot_joke_thread)
-    print(robot_joke.text)
-
-    # Continue the conversations in their respective threads
-    pirate_joke_2 = await agent.run("Now explain the joke", thread=pirate_joke_thread)
-    print(f"\nPirate joke explanation: {pirate_joke_2.text}")
-
-    robot_joke_2 = await agent.run("Now explain the joke.", thread=robot_joke_thread)
-    print(f"\nRobot joke explanation: {robot_joke_2.text}")
+    # Close the shared HTTP connection pools used by the chat client
+    await client_registry.aclose()
 
 # Run the main function
 if __name__ == "__main__":
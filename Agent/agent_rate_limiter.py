@@ -0,0 +1,218 @@
+# Rate-limit-aware scheduling for the shared Azure OpenAI connection pools
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+import time
+from typing import Any
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Request header used to pass a priority from an agent to the scheduler. It is removed before the request is sent.
+PRIORITY_HEADER = "x-agent-request-priority"
+DEFAULT_PRIORITY = 5
+
+def priority_options(priority: int) -> dict[str, Any]:
+    """Chat options that give every request of an agent the priority (lower runs first).
+
+    Example: `chat_client.create_agent(..., additional_chat_options=priority_options(0))`
+    """
+    return {"extra_headers": {PRIORITY_HEADER: str(priority)}}
+
+class RateLimitScheduler:
+    """Token bucket scheduler for one deployment's requests-per-minute and tokens-per-minute quota.
+
+    Requests wait in a priority queue until both budgets can cover them. The budgets start from
+    `tokens_per_minute` / `requests_per_minute` when given, otherwise they are learned from the
+    `x-ratelimit-*` response headers, and every response corrects them with the server's view of
+    what is left. A 429 pauses the whole queue for the server's `retry-after` (plus jitter) instead of
+    letting every waiting request hit the limit again.
+    """
+
+    def __init__(
+        self,
+        tokens_per_minute: int | None = None,
+        requests_per_minute: int | None = None,
+        default_completion_tokens: int = 500,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.default_completion_tokens = default_completion_tokens
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tokens = float(tokens_per_minute) if tokens_per_minute else None
+        self._requests = float(requests_per_minute) if requests_per_minute else None
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._queue: list[tuple[int, int, asyncio.Future[None], int]] = []
+        self._sequence = itertools.count()
+        self._wakeup: asyncio.TimerHandle | None = None
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0}
+
+    async def acquire(self, cost: int, priority: int = DEFAULT_PRIORITY) -> None:
+        """Wait until the request can be sent without exceeding the quota."""
+        start = time.monotonic()
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), future, cost))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Give the reserved budget back if the grant raced with the cancellation
+            if future.done() and not future.cancelled():
+                self._refund(cost)
+            self._queue = [entry for entry in self._queue if entry[2] is not future]
+            heapq.heapify(self._queue)
+            self._dispatch()
+            raise
+        self.stats["wait_seconds"] += time.monotonic() - start
+
+    def update(self, headers: httpx.Headers) -> None:
+        """Correct the budgets with the quota the server reports as remaining."""
+        self._refill()
+        limit_tokens = _get_number(headers, "x-ratelimit-limit-tokens")
+        limit_requests = _get_number(headers, "x-ratelimit-limit-requests")
+        remaining_tokens = _get_number(headers, "x-ratelimit-remaining-tokens")
+        remaining_requests = _get_number(headers, "x-ratelimit-remaining-requests")
+
+        if limit_tokens is not None:
+            self.tokens_per_minute = int(limit_tokens)
+        if limit_requests is not None:
+            self.requests_per_minute = int(limit_requests)
+        if remaining_tokens is not None:
+            # Without a limit header, the largest remaining value seen is the best estimate of the quota
+            self.tokens_per_minute = max(self.tokens_per_minute or 0, int(remaining_tokens))
+            self._tokens = remaining_tokens if self._tokens is None else min(self._tokens, remaining_tokens)
+        if remaining_requests is not None:
+            self.requests_per_minute = max(self.requests_per_minute or 0, int(remaining_requests))
+            self._requests = remaining_requests if self._requests is None else min(self._requests, remaining_requests)
+        self._dispatch()
+
+    def throttled(self, headers: httpx.Headers, attempt: int) -> float:
+        """Record a 429 and pause the queue. Returns how long the rejected request should wait."""
+        self.stats["throttled"] += 1
+        delay = _get_retry_after(headers)
+        if delay is None:
+            # Full jitter: spread retries over the whole backoff window so they do not arrive together
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        else:
+            delay += random.uniform(0, min(delay, self.base_delay) * 0.5)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        # The server says the budget is gone; do not let queued requests assume otherwise
+        self._tokens = 0.0 if self._tokens is not None else None
+        self._requests = 0.0 if self._requests is not None else None
+        return delay
+
+    def estimate_cost(self, request: httpx.Request) -> int:
+        """Estimate the tokens a request counts against the quota: prompt size plus the completion budget."""
+        try:
+            content = request.content
+        except httpx.RequestNotRead:
+            content = b""
+        completion_tokens = self.default_completion_tokens
+        try:
+            body = json.loads(content) if content else {}
+            for key in ("max_tokens", "max_completion_tokens", "max_output_tokens"):
+                if isinstance(body.get(key), int):
+                    completion_tokens = body[key]
+                    break
+        except (ValueError, AttributeError):
+            pass
+        # Roughly four bytes of JSON per prompt token
+        return len(content) // 4 + completion_tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self._tokens is not None and self.tokens_per_minute:
+            self._tokens = min(float(self.tokens_per_minute), self._tokens + elapsed * self.tokens_per_minute / 60)
+        if self._requests is not None and self.requests_per_minute:
+            self._requests = min(float(self.requests_per_minute), self._requests + elapsed * self.requests_per_minute / 60)
+
+    def _refund(self, cost: int) -> None:
+        if self._tokens is not None:
+            self._tokens += cost
+        if self._requests is not None:
+            self._requests += 1
+
+    def _dispatch(self) -> None:
+        """Grant queued requests in priority order while the budgets allow, then sleep until they refill."""
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        self._refill()
+
+        while self._queue:
+            _, _, future, cost = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = self._get_wait(cost)
+            if wait > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            if self._tokens is not None:
+                self._tokens -= cost
+            if self._requests is not None:
+                self._requests -= 1
+            self.stats["requests"] += 1
+            future.set_result(None)
+
+    def _get_wait(self, cost: int) -> float:
+        wait = self._paused_until - time.monotonic()
+        if self._tokens is not None and self.tokens_per_minute:
+            # A request larger than the whole quota goes through once the bucket is full
+            needed = min(cost, self.tokens_per_minute)
+            wait = max(wait, (needed - self._tokens) * 60 / self.tokens_per_minute)
+        if self._requests is not None and self.requests_per_minute:
+            wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+        return wait
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that sends every request through a RateLimitScheduler and retries 429s."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, scheduler: RateLimitScheduler):
+        self._transport = transport
+        self.scheduler = scheduler
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        priority = int(request.headers.pop(PRIORITY_HEADER, DEFAULT_PRIORITY))
+        cost = self.scheduler.estimate_cost(request)
+
+        for attempt in range(self.scheduler.max_retries + 1):
+            await self.scheduler.acquire(cost, priority)
+            response = await self._transport.handle_async_request(request)
+            self.scheduler.update(response.headers)
+            if response.status_code != 429 or attempt == self.scheduler.max_retries:
+                return response
+
+            # The scheduler pauses the queue, so the next acquire() waits out the delay
+            delay = self.scheduler.throttled(response.headers, attempt)
+            self.scheduler.stats["retries"] += 1
+            logger.info(f"Rate limited by {request.url.host}; retrying in {delay:.1f}s (attempt {attempt + 1})")
+            await response.aclose()
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+def _get_number(headers: httpx.Headers, name: str) -> float | None:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+def _get_retry_after(headers: httpx.Headers) -> float | None:
+    retry_after_ms = _get_number(headers, "retry-after-ms")
+    if retry_after_ms is not None:
+        return retry_after_ms / 1000
+    return _get_number(headers, "retry-after")
@@ -0,0 +1,98 @@
+# Concurrent runner for many conversation threads on a single agent instance
+import asyncio
+import time
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from agent_framework import AgentProtocol, AgentRunResponse, AgentThread
+
+@dataclass
+class ThreadTurnResult:
+    """Outcome of one turn of one conversation."""
+    conversation: str
+    turn: int
+    prompt: str
+    thread: AgentThread
+    response: AgentRunResponse | None = None
+    error: Exception | None = None
+    elapsed: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return self.response.text if self.response is not None else ""
+
+class ConcurrentThreadRunner:
+    """Runs many AgentThread conversations on one agent at the same time.
+
+    Turns of different conversations run concurrently, at most `max_concurrency` model calls
+    at a time. Turns of the same conversation run in order, so turn 2 always sees the answer to turn 1.
+    Results are yielded as soon as each turn completes, not in submission order.
+
+    If a turn fails, the rest of that conversation is skipped (later turns depend on it) and the
+    failure is reported as a result with `error` set; other conversations keep going.
+    """
+
+    def __init__(self, agent: AgentProtocol, max_concurrency: int = 8):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self._agent = agent
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._conversations: dict[str, tuple[AgentThread, list[str]]] = {}
+
+    def add_conversation(self, name: str, prompts: Sequence[str], thread: AgentThread | None = None) -> AgentThread:
+        """Queue a conversation. Returns its thread, which can be reused for follow-up runs."""
+        if name in self._conversations:
+            raise ValueError(f"Conversation '{name}' was already added.")
+        thread = thread or self._agent.get_new_thread()
+        self._conversations[name] = (thread, list(prompts))
+        return thread
+
+    async def run(self) -> AsyncIterator[ThreadTurnResult]:
+        """Run every queued conversation and yield each turn as it completes."""
+        conversations = self._conversations
+        self._conversations = {}
+        results: asyncio.Queue[ThreadTurnResult] = asyncio.Queue()
+        tasks = [
+            asyncio.create_task(self._run_conversation(name, thread, prompts, results))
+            for name, (thread, prompts) in conversations.items()
+        ]
+        pending = sum(len(prompts) for _, prompts in conversations.values())
+        try:
+            while pending:
+                result = await results.get()
+                # A failed turn also accounts for the turns it skipped
+                pending -= 1 if result.error is None else len(conversations[result.conversation][1]) - result.turn
+                yield result
+        finally:
+            # The caller may stop iterating early; do not leave model calls running in the background
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run_all(self) -> dict[str, list[ThreadTurnResult]]:
+        """Run every queued conversation and return the results grouped by conversation, in turn order."""
+        grouped: dict[str, list[ThreadTurnResult]] = {name: [] for name in self._conversations}
+        async for result in self.run():
+            grouped[result.conversation].append(result)
+        for results in grouped.values():
+            results.sort(key=lambda result: result.turn)
+        return grouped
+
+    async def _run_conversation(
+        self,
+        name: str,
+        thread: AgentThread,
+        prompts: list[str],
+        results: asyncio.Queue[ThreadTurnResult],
+    ) -> None:
+        for turn, prompt in enumerate(prompts):
+            result = ThreadTurnResult(conversation=name, turn=turn, prompt=prompt, thread=thread)
+            async with self._semaphore:
+                start = time.perf_counter()
+                try:
+                    result.response = await self._agent.run(prompt, thread=thread)
+                except Exception as error:
+                    result.error = error
+                result.elapsed = time.perf_counter() - start
+            await results.put(result)
+            if result.error is not None:
+                return
@@ -0,0 +1,367 @@
+# Chat client that sends requests through a provider batch job instead of one call per request
+#
+# BatchChatClient reuses the request and response mapping of the OpenAI chat client, which the framework
+# has no public hook for: it subclasses agent_framework.openai._chat_client.OpenAIBaseChatClient and calls
+# its private _prepare_options and _create_chat_response. They can change in any release, so this module
+# is pinned to agent-framework-core TESTED_AGENT_FRAMEWORK_VERSION (agent_version.py, see README) and
+# warns on import with another version.
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections.abc import AsyncIterable, MutableSequence
+from dataclasses import dataclass, field
+from typing import Any, Literal, Optional, Protocol
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel, create_model
+
+from agent_framework import (
+    ChatClientProtocol,
+    ChatMessage,
+    ChatOptions,
+    ChatResponse,
+    ChatResponseUpdate,
+    UsageContent,
+    use_chat_middleware,
+    use_function_invocation,
+)
+from agent_framework.exceptions import ServiceResponseException
+from agent_framework.openai._chat_client import OpenAIBaseChatClient
+from agent_version import warn_if_untested_version
+
+logger = logging.getLogger(__name__)
+
+warn_if_untested_version("agent_batch_client.py", "private members of the OpenAI chat client")
+
+# Job states of the OpenAI Batch API; the jobs of LocalBatchServer go through the same ones
+FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+class BatchBackend(Protocol):
+    """Provider batch job interface used by BatchChatClient.
+
+    `submit` receives the chat completion request bodies keyed by custom id and returns a job id.
+    `get_results` returns one output line per request the job answered, in the OpenAI Batch API shape:
+    {"custom_id": ..., "response": {"status_code": ..., "body": ...}, "error": ...}.
+    """
+
+    async def submit(self, requests: dict[str, dict[str, Any]]) -> str: ...
+
+    async def get_status(self, job_id: str) -> str: ...
+
+    async def get_results(self, job_id: str) -> list[dict[str, Any]]: ...
+
+@dataclass
+class _PendingRequest:
+    body: dict[str, Any]
+    future: asyncio.Future[dict[str, Any]]
+
+@use_function_invocation
+@use_chat_middleware
+class BatchChatClient(OpenAIBaseChatClient):
+    """Chat client that collects requests and sends them to the model as batch jobs.
+
+    Each call waits in a queue; the queue is submitted as one job when it holds `max_batch_size` requests
+    or `max_wait` seconds after its first request arrived. The client then polls the job every
+    `poll_interval` seconds and hands every answer back to the call that made the request. Request bodies
+    and answers use the OpenAI chat completions format, so agents, structured outputs and tools behave as
+    with OpenAIChatClient.
+
+    Provider batch jobs are billed at a discount and have their own quota, but they may take hours to
+    complete: use this client for offline work such as triaging a mailbox, with enough concurrent workflow
+    runs (see BatchWorkflowRunner) to fill the batches. Streaming calls receive the whole answer at once.
+    """
+
+    OTEL_PROVIDER_NAME = "openai"
+
+    def __init__(
+        self,
+        backend: BatchBackend,
+        model_id: str = "gpt-4o",
+        max_batch_size: int = 1000,
+        max_wait: float = 5.0,
+        poll_interval: float = 30.0,
+        **kwargs: Any,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        # Requests go through the backend, never through an AsyncOpenAI client of this instance
+        super().__init__(client=None, model_id=model_id, **kwargs)
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self._ids = itertools.count(1)
+        self._pending: dict[str, _PendingRequest] = {}
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._jobs: set[asyncio.Task[None]] = set()
+
+    async def _inner_get_response(
+        self,
+        *,
+        messages: MutableSequence[ChatMessage],
+        chat_options: ChatOptions,
+        **kwargs: Any,
+    ) -> ChatResponse:
+        line = await self._enqueue(self._prepare_options(messages, chat_options))
+        error = line.get("error")
+        response = line.get("response") or {}
+        if error or response.get("status_code") != 200:
+            detail = error or response.get("body", {}).get("error") or response
+            raise ServiceResponseException(f"{type(self)} batch request {line.get('custom_id')} failed: {detail}")
+        try:
+            completion = ChatCompletion.model_validate(response["body"])
+        except Exception as ex:
+            raise ServiceResponseException(
+                f"{type(self)} batch request {line.get('custom_id')} returned an invalid completion: {ex}",
+                inner_exception=ex,
+            ) from ex
+        return self._create_chat_response(completion, chat_options)
+
+    async def _inner_get_streaming_response(
+        self,
+        *,
+        messages: MutableSequence[ChatMessage],
+        chat_options: ChatOptions,
+        **kwargs: Any,
+    ) -> AsyncIterable[ChatResponseUpdate]:
+        # Batch jobs do not stream, so the whole answer arrives as a single update
+        response = await self._inner_get_response(messages=messages, chat_options=chat_options, **kwargs)
+        for message in response.messages:
+            yield ChatResponseUpdate(
+                contents=message.contents,
+                role=message.role,
+                response_id=response.response_id,
+                model_id=response.model_id,
+                finish_reason=response.finish_reason,
+            )
+        if response.usage_details is not None:
+            yield ChatResponseUpdate(contents=[UsageContent(details=response.usage_details)], model_id=response.model_id)
+
+    async def flush(self) -> None:
+        """Submit the queued requests now instead of waiting for the batch to fill up."""
+        self._submit_pending()
+
+    async def aclose(self) -> None:
+        """Stop polling. Calls still waiting for a job fail; jobs already submitted keep running at the provider."""
+        self._submit_pending()
+        jobs = list(self._jobs)
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+
+    async def __aenter__(self) -> "BatchChatClient":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.aclose()
+
+    async def _enqueue(self, body: dict[str, Any]) -> dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        custom_id = f"request-{next(self._ids)}"
+        future: asyncio.Future[dict[str, Any]] = loop.create_future()
+        self._pending[custom_id] = _PendingRequest(body, future)
+        if len(self._pending) >= self.max_batch_size:
+            self._submit_pending()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.max_wait, self._submit_pending)
+        return await future
+
+    def _submit_pending(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        # Calls cancelled while waiting, for instance by a workflow run that failed, are left out
+        requests = {custom_id: request for custom_id, request in self._pending.items() if not request.future.done()}
+        self._pending = {}
+        if requests:
+            job = asyncio.get_running_loop().create_task(self._run_job(requests))
+            self._jobs.add(job)
+            job.add_done_callback(self._jobs.discard)
+
+    async def _run_job(self, requests: dict[str, _PendingRequest]) -> None:
+        error: Exception | None = None
+        try:
+            job_id = await self.backend.submit({custom_id: request.body for custom_id, request in requests.items()})
+            logger.info(f"Submitted batch job {job_id} with {len(requests)} requests.")
+            while (status := await self.backend.get_status(job_id)) not in FINISHED_STATUSES:
+                await asyncio.sleep(self.poll_interval)
+            # Expired and cancelled jobs still return the requests completed in time
+            for line in await self.backend.get_results(job_id):
+                request = requests.pop(line.get("custom_id"), None)
+                if request is not None and not request.future.done():
+                    request.future.set_result(line)
+            if requests:
+                error = ServiceResponseException(f"Batch job {job_id} ended '{status}' without answering {len(requests)} requests.")
+        except asyncio.CancelledError:
+            error = ServiceResponseException("The batch job was abandoned before it completed.")
+            raise
+        except Exception as ex:
+            error = ServiceResponseException(f"Batch job failed: {ex}", inner_exception=ex)
+        finally:
+            for request in requests.values():
+                if not request.future.done():
+                    request.future.set_exception(error or ServiceResponseException("The batch job returned no answer."))
+
+class OpenAIBatchBackend:
+    """Runs the jobs with the OpenAI (or Azure OpenAI) Batch API.
+
+    The requests are uploaded as a JSONL file and the answers downloaded from the job's output and error
+    files. Azure OpenAI needs a global batch deployment and the endpoint "/chat/completions".
+    """
+
+    def __init__(self, client: AsyncOpenAI, endpoint: str = "/v1/chat/completions", completion_window: str = "24h"):
+        self.client = client
+        self.endpoint = endpoint
+        self.completion_window = completion_window
+
+    async def submit(self, requests: dict[str, dict[str, Any]]) -> str:
+        content = "".join(
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": self.endpoint, "body": body}) + "\n"
+            for custom_id, body in requests.items()
+        )
+        input_file = await self.client.files.create(file=("batch.jsonl", content.encode()), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.endpoint,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    async def get_status(self, job_id: str) -> str:
+        return (await self.client.batches.retrieve(job_id)).status
+
+    async def get_results(self, job_id: str) -> list[dict[str, Any]]:
+        batch = await self.client.batches.retrieve(job_id)
+        lines: list[dict[str, Any]] = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                lines.extend(json.loads(line) for line in content.text.splitlines() if line.strip())
+        return lines
+
+@dataclass
+class _LocalJob:
+    input: bytes
+    status: str = "validating"
+    output: bytes = b""
+    created_at: float = field(default_factory=time.time)
+
+class LocalBatchServer:
+    """In-process stand-in for a provider batch endpoint, for tests and offline runs.
+
+    Jobs are exchanged as JSONL like with the OpenAI Batch API and answered by `chat_client` (for example
+    MockChatClient) with up to `max_concurrency` calls at a time, after waiting `processing_delay` seconds
+    to mimic the queueing time of a real batch. Requests are rebuilt from their text messages and JSON
+    schema response format, which is what the samples send; tool calls are not replayed.
+    """
+
+    def __init__(self, chat_client: ChatClientProtocol, processing_delay: float = 0.0, max_concurrency: int = 16):
+        self.chat_client = chat_client
+        self.processing_delay = processing_delay
+        self.max_concurrency = max_concurrency
+        self.jobs: dict[str, _LocalJob] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._response_formats: dict[str, type[BaseModel]] = {}
+
+    async def submit(self, requests: dict[str, dict[str, Any]]) -> str:
+        job_id = f"batch_local_{len(self.jobs) + 1}"
+        content = "".join(
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}) + "\n"
+            for custom_id, body in requests.items()
+        )
+        self.jobs[job_id] = job = _LocalJob(content.encode())
+        task = asyncio.get_running_loop().create_task(self._process(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    async def get_status(self, job_id: str) -> str:
+        return self.jobs[job_id].status
+
+    async def get_results(self, job_id: str) -> list[dict[str, Any]]:
+        return [json.loads(line) for line in self.jobs[job_id].output.splitlines() if line.strip()]
+
+    async def aclose(self) -> None:
+        """Cancel the jobs still being processed."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _process(self, job: _LocalJob) -> None:
+        await asyncio.sleep(self.processing_delay)
+        job.status = "in_progress"
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def answer(line: dict[str, Any]) -> dict[str, Any]:
+            async with semaphore:
+                try:
+                    body = await self._complete(line["body"])
+                    return {"custom_id": line["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}
+                except Exception as error:
+                    return {"custom_id": line["custom_id"], "response": None, "error": {"code": "server_error", "message": str(error)}}
+
+        lines = [json.loads(line) for line in job.input.splitlines()]
+        results = await asyncio.gather(*(answer(line) for line in lines))
+        job.output = "".join(json.dumps(result) + "\n" for result in results).encode()
+        job.status = "completed"
+
+    async def _complete(self, body: dict[str, Any]) -> dict[str, Any]:
+        messages = [ChatMessage(role=message["role"], text=_get_text(message.get("content"))) for message in body["messages"]]
+        response_format = body.get("response_format") or {}
+        model = self._get_response_format(response_format["json_schema"]) if response_format.get("type") == "json_schema" else None
+        response = await self.chat_client.get_response(messages, response_format=model)
+        usage = response.usage_details
+        return {
+            "id": response.response_id or f"chatcmpl-local-{id(response):x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or response.model_id or "local",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": response.text}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": usage.input_token_count or 0,
+                "completion_tokens": usage.output_token_count or 0,
+                "total_tokens": usage.total_token_count or 0,
+            } if usage is not None else None,
+        }
+
+    def _get_response_format(self, json_schema: dict[str, Any]) -> type[BaseModel]:
+        # The request only carries the JSON schema, so the chat client gets a model rebuilt from it
+        name = json_schema.get("name", "Response")
+        model = self._response_formats.get(name)
+        if model is None:
+            schema = json_schema["schema"]
+            model = _model_from_schema(name, schema, schema.get("$defs", {}))
+            self._response_formats[name] = model
+        return model
+
+def _get_text(content: Any) -> str | None:
+    if content is None or isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content if part.get("type") == "text")
+
+def _model_from_schema(name: str, schema: dict[str, Any], definitions: dict[str, Any]) -> type[BaseModel]:
+    required = set(schema.get("required", []))
+    fields = {
+        key: (_type_from_schema(key, value, definitions), ... if key in required else None)
+        for key, value in schema.get("properties", {}).items()
+    }
+    return create_model(name, **fields)
+
+def _type_from_schema(name: str, schema: dict[str, Any], definitions: dict[str, Any]) -> Any:
+    if "$ref" in schema:
+        ref_name = schema["$ref"].rsplit("/", 1)[-1]
+        return _type_from_schema(ref_name, definitions.get(ref_name, {}), definitions)
+    if "enum" in schema:
+        return Literal[tuple(schema["enum"])]
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return Optional[_type_from_schema(name, options[0], definitions)] if options else Any
+    schema_type = schema.get("type")
+    if schema_type == "object" and "properties" in schema:
+        return _model_from_schema(schema.get("title", name), schema, definitions)
+    if schema_type == "array":
+        return list[_type_from_schema(name, schema.get("items", {}), definitions)]
+    return {"string": str, "boolean": bool, "integer": int, "number": float, "object": dict}.get(schema_type, Any)
@@ -0,0 +1,89 @@
+# Batch runner that streams many inputs through one workflow graph with bounded concurrency
+import asyncio
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+from agent_framework import Workflow
+
+@dataclass
+class BatchItemResult:
+    """Outcome of one batch item."""
+    item_id: str
+    outputs: list[Any] = field(default_factory=list)
+    error: Exception | None = None
+    elapsed: float = 0.0
+
+class BatchWorkflowRunner:
+    """Runs a stream of (item_id, input) pairs through a workflow with bounded concurrency.
+
+    Each item runs in a new workflow built with `create_workflow`, on `max_concurrency` workers. Workflows
+    are not reused: an AgentExecutor keeps its conversation between runs, so a reused workflow would send
+    every earlier item along with the next one. While one item waits for its model calls, the other
+    workers keep going, so throughput comes from overlapping the items in one process.
+
+    Items are read lazily: at most `2 * max_concurrency` wait in memory, which keeps a large corpus or
+    an endless stream from being loaded at once. Results are yielded as soon as each item completes, not
+    in input order. A failed item is reported with `error` set.
+    """
+
+    def __init__(self, create_workflow: Callable[[], Workflow], max_concurrency: int = 8):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self._create_workflow = create_workflow
+        self.max_concurrency = max_concurrency
+
+    async def run(self, items: Iterable[tuple[str, Any]] | AsyncIterable[tuple[str, Any]]) -> AsyncIterator[BatchItemResult]:
+        """Run every item and yield each result as it completes."""
+        pending: asyncio.Queue[tuple[str, Any] | None] = asyncio.Queue(2 * self.max_concurrency)
+        results: asyncio.Queue[BatchItemResult | None] = asyncio.Queue()
+        producer = asyncio.create_task(self._produce(items, pending))
+        workers = [asyncio.create_task(self._work(pending, results)) for _ in range(self.max_concurrency)]
+        running = len(workers)
+        try:
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                    continue
+                yield result
+            # Surface a failure to read the items
+            await producer
+        finally:
+            # The caller may stop iterating early; do not leave workflows running in the background
+            for task in [producer, *workers]:
+                task.cancel()
+            await asyncio.gather(producer, *workers, return_exceptions=True)
+
+    async def _produce(self, items: Iterable[tuple[str, Any]] | AsyncIterable[tuple[str, Any]], pending: asyncio.Queue[tuple[str, Any] | None]) -> None:
+        error: Exception | None = None
+        try:
+            if isinstance(items, AsyncIterable):
+                async for item in items:
+                    await pending.put(item)
+            else:
+                for item in items:
+                    await pending.put(item)
+        except Exception as exc:
+            error = exc
+        # One stop marker per worker, also when reading the items failed
+        for _ in range(self.max_concurrency):
+            await pending.put(None)
+        if error is not None:
+            raise error
+
+    async def _work(self, pending: asyncio.Queue[tuple[str, Any] | None], results: asyncio.Queue[BatchItemResult | None]) -> None:
+        try:
+            while (item := await pending.get()) is not None:
+                item_id, workflow_input = item
+                result = BatchItemResult(item_id)
+                start = time.perf_counter()
+                try:
+                    events = await self._create_workflow().run(workflow_input)
+                    result.outputs = events.get_outputs()
+                except Exception as error:
+                    result.error = error
+                result.elapsed = time.perf_counter() - start
+                await results.put(result)
+        finally:
+            await results.put(None)
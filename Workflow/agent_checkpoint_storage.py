@@ -0,0 +1,992 @@
+# Compact binary checkpoint storage, catalog and retention policies for Agent Framework workflows
+#
+# Optional dependencies:
+# pip install msgpack     (or cbor2) for the binary encoding, otherwise compact JSON is used
+# pip install zstandard   for zstd compression, otherwise zlib is used
+
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from agent_framework import CheckpointStorage, FileCheckpointStorage, WorkflowCheckpoint, get_checkpoint_summary
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_EXTENSION = ".ckpt"
+CATALOG_FILE = "catalog.sqlite"
+# Bump when the catalog columns change; older catalogs are rebuilt from the checkpoint files
+CATALOG_VERSION = 2
+
+# Checkpoint statuses (from get_checkpoint_summary) of a run with nothing left to do
+COMPLETED_STATUSES = ("completed", "idle")
+CHECKPOINT_MAGIC = b"AFCK"
+FORMAT_VERSION = 2
+
+# Checkpoint kinds recorded in the file header
+FULL_SNAPSHOT = 0
+DELTA = 1
+
+# Delta operations: replace a value, append items to a list, update some keys of a dictionary
+_REPLACE, _APPEND, _UPDATE = 0, 1, 2
+
+CODECS = ["msgpack", "cbor", "json"]
+COMPRESSIONS = ["none", "zlib", "zstd"]
+# none: leave flushing to the OS, batch: fsync on sync() (after each write-behind batch), checkpoint: fsync every write
+DURABILITY_LEVELS = ["none", "batch", "checkpoint"]
+
+# Field names shared by every checkpoint. They are stored as small integers instead of strings.
+# Only append to this list: the position of a name is part of the file format.
+INTERNED_FIELDS = [
+    # WorkflowCheckpoint
+    "checkpoint_id", "workflow_id", "timestamp", "messages", "shared_state", "executor_states",
+    "iteration_count", "max_iterations", "metadata", "version",
+    # Messages between executors
+    "data", "source_id", "target_id", "trace_contexts", "source_span_ids",
+    # Superstep metadata
+    "superstep", "checkpoint_type", "graph_signature",
+    # Values encoded by the workflow runner
+    "__af_model__", "__af_dataclass__", "value",
+    # Chat messages and agent state
+    "role", "contents", "type", "text", "author_name", "message_id", "additional_properties",
+    "raw_representation", "executor_id", "agent_run_response", "full_conversation", "cache", "thread",
+]
+_FIELD_IDS = {name: index for index, name in enumerate(INTERNED_FIELDS)}
+
+# Message fields left out of the file when they are null and restored as null on load
+_OPTIONAL_MESSAGE_FIELDS = ("target_id", "trace_contexts", "source_span_ids")
+
+@dataclass
+class CheckpointHeader:
+    """Uncompressed header at the start of every binary checkpoint file."""
+    version: int
+    codec: str
+    compression: str
+    kind: int
+    parent_id: str | None
+    size: int
+
+@dataclass
+class CheckpointEntry:
+    """Catalog row describing a stored checkpoint, available without loading the checkpoint."""
+    checkpoint_id: str
+    workflow_id: str
+    timestamp: str
+    superstep: int | None = None
+    graph_signature: str | None = None
+    size: int | None = None
+    kind: int = FULL_SNAPSHOT
+    parent_id: str | None = None
+    status: str | None = None
+    pending_requests: int = 0
+
+class CheckpointCatalog:
+    """SQLite index of stored checkpoints.
+
+    Listing the checkpoints of a workflow, finding the latest one and finding the deltas that depend on
+    a checkpoint become index queries instead of reading every file in the folder.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.is_new = not self.path.exists()
+        # Storages call the catalog from worker threads (asyncio.to_thread)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._connection:
+            # The catalog can be rebuilt from the files, so it does not need an fsync per commit
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            if self._connection.execute("PRAGMA user_version").fetchone()[0] != CATALOG_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS checkpoints")
+                self._connection.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+                self.is_new = True
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "checkpoint_id TEXT PRIMARY KEY, workflow_id TEXT NOT NULL, timestamp TEXT NOT NULL, "
+                "superstep INTEGER, graph_signature TEXT, size INTEGER, kind INTEGER NOT NULL, parent_id TEXT, "
+                "status TEXT, pending_requests INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS checkpoints_workflow ON checkpoints (workflow_id, timestamp)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS checkpoints_parent ON checkpoints (parent_id)")
+
+    def add(self, entry: CheckpointEntry) -> None:
+        """Add or replace the entry of a checkpoint."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry.checkpoint_id, entry.workflow_id, entry.timestamp, entry.superstep, entry.graph_signature,
+                 entry.size, entry.kind, entry.parent_id, entry.status, entry.pending_requests),
+            )
+
+    def remove(self, checkpoint_id: str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM checkpoints WHERE checkpoint_id = ?", (checkpoint_id,))
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM checkpoints")
+
+    def get(self, checkpoint_id: str) -> CheckpointEntry | None:
+        entries = self._query("WHERE checkpoint_id = ?", (checkpoint_id,))
+        return entries[0] if entries else None
+
+    def list_entries(self, workflow_id: str | None = None) -> list[CheckpointEntry]:
+        """Entries of a workflow (or of every workflow), oldest first."""
+        if workflow_id is None:
+            return self._query("ORDER BY timestamp, rowid", ())
+        return self._query("WHERE workflow_id = ? ORDER BY timestamp, rowid", (workflow_id,))
+
+    def latest(self, workflow_id: str) -> CheckpointEntry | None:
+        entries = self._query("WHERE workflow_id = ? ORDER BY timestamp DESC, rowid DESC LIMIT 1", (workflow_id,))
+        return entries[0] if entries else None
+
+    def children(self, checkpoint_id: str) -> list[str]:
+        """IDs of the delta checkpoints built on the checkpoint."""
+        return [entry.checkpoint_id for entry in self._query("WHERE parent_id = ?", (checkpoint_id,))]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _query(self, condition: str, parameters: tuple[Any, ...]) -> list[CheckpointEntry]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT checkpoint_id, workflow_id, timestamp, superstep, graph_signature, size, kind, parent_id, "
+                "status, pending_requests "
+                f"FROM checkpoints {condition}",
+                parameters,
+            ).fetchall()
+        return [CheckpointEntry(*row) for row in rows]
+
+class BinaryCheckpointStorage:
+    """Checkpoint storage that writes one compact binary file per checkpoint.
+
+    Drop-in alternative to FileCheckpointStorage (same CheckpointStorage protocol). Each file holds
+    a small header followed by the checkpoint encoded with msgpack, CBOR or compact JSON and compressed
+    with zstd or zlib. Field names are interned (stored as integers), and null message fields are left
+    out, so repeated structure costs almost nothing.
+
+    `codec` and `compression` default to the best installed option. Files record the codec and
+    compression they were written with, so a folder can mix settings and still be read back.
+
+    With `full_snapshot_interval` greater than 1 the storage writes delta checkpoints: after each full
+    snapshot, the next `full_snapshot_interval - 1` checkpoints of the workflow only store what changed
+    since the previous one (new messages appended to a chat history, updated state keys, ...), so the
+    write cost follows the size of the change instead of the size of the state. Loading a delta replays
+    the chain back to its full snapshot. The storage keeps the last saved state of each workflow in memory
+    to compute the next delta.
+
+    `durability` controls fsync: "none" leaves flushing to the OS, "checkpoint" fsyncs every file before
+    `save_checkpoint` returns, and "batch" fsyncs the files written so far when `sync()` is called
+    (WriteBehindCheckpointStorage calls it after each batch).
+
+    A CheckpointCatalog (`catalog.sqlite` in the folder) indexes the checkpoints, so listing only reads
+    the files of the requested workflow. The catalog is built from the files the first time a folder is
+    opened; call `rebuild_catalog()` after copying checkpoint files into the folder by hand.
+    """
+
+    def __init__(
+        self,
+        storage_path: str | Path,
+        codec: str | None = None,
+        compression: str | None = None,
+        compression_level: int = 3,
+        full_snapshot_interval: int = 1,
+        durability: str = "none",
+    ):
+        if full_snapshot_interval < 1:
+            raise ValueError("full_snapshot_interval must be at least 1.")
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability '{durability}'. Use one of {DURABILITY_LEVELS}.")
+        self.storage_path = Path(storage_path)
+        self.storage_path.mkdir(parents=True, exist_ok=True)
+        self.codec = codec or get_default_codec()
+        self.compression = compression or get_default_compression()
+        self.compression_level = compression_level
+        self.full_snapshot_interval = full_snapshot_interval
+        self.durability = durability
+        self._unsynced: set[Path] = set()
+        # workflow_id -> (checkpoint_id, state, checkpoints since the last full snapshot)
+        self._last_saved: dict[str, tuple[str, dict[str, Any], int]] = {}
+        _check_available(self.codec, self.compression)
+        self.catalog = CheckpointCatalog(self.storage_path / CATALOG_FILE)
+        if self.catalog.is_new:
+            self.rebuild_catalog()
+        logger.info(f"Initialized binary checkpoint storage at {self.storage_path} ({self.codec}, {self.compression})")
+
+    async def save_checkpoint(self, checkpoint: WorkflowCheckpoint) -> str:
+        """Save a checkpoint and return its ID."""
+        file_path = self._get_path(checkpoint.checkpoint_id)
+
+        # Encoding runs in the worker thread too, so the event loop keeps running other executors
+        def _save() -> int:
+            state = _strip_message_nulls(asdict(checkpoint))
+            last_saved = self._last_saved.get(checkpoint.workflow_id)
+            if last_saved is not None and last_saved[2] + 1 < self.full_snapshot_interval:
+                parent_id, parent_state, chain_length = last_saved
+                data = _encode(diff_state(parent_state, state), DELTA, parent_id, self.codec, self.compression, self.compression_level)
+                kind, chain_length = DELTA, chain_length + 1
+            else:
+                data = _encode(state, FULL_SNAPSHOT, None, self.codec, self.compression, self.compression_level)
+                kind, parent_id, chain_length = FULL_SNAPSHOT, None, 0
+            if self.full_snapshot_interval > 1:
+                self._last_saved[checkpoint.workflow_id] = (checkpoint.checkpoint_id, state, chain_length)
+            self._write(file_path, data)
+            self.catalog.add(_get_entry(checkpoint, len(data), kind, parent_id))
+            return len(data)
+
+        size = await asyncio.to_thread(_save)
+        logger.info(f"Saved checkpoint {checkpoint.checkpoint_id} to {file_path} ({size} bytes)")
+        return checkpoint.checkpoint_id
+
+    async def sync(self) -> None:
+        """Fsync the checkpoint files written since the last sync (durability="batch")."""
+        paths, self._unsynced = self._unsynced, set()
+
+        def _sync() -> None:
+            for path in paths:
+                if path.exists():
+                    _fsync_file(path)
+            _fsync_directory(self.storage_path)
+
+        if paths:
+            await asyncio.to_thread(_sync)
+
+    async def load_checkpoint(self, checkpoint_id: str) -> WorkflowCheckpoint | None:
+        """Load a checkpoint by ID."""
+
+        def _load() -> WorkflowCheckpoint | None:
+            state = self._read_state(checkpoint_id, {})
+            return _to_checkpoint(state) if state is not None else None
+
+        return await asyncio.to_thread(_load)
+
+    async def list_checkpoint_ids(self, workflow_id: str | None = None) -> list[str]:
+        """List checkpoint IDs. If workflow_id is provided, filter by that workflow."""
+        return [entry.checkpoint_id for entry in await self.list_entries(workflow_id)]
+
+    async def list_entries(self, workflow_id: str | None = None) -> list[CheckpointEntry]:
+        """List the catalog entries, oldest first, without reading any checkpoint file."""
+        return await asyncio.to_thread(self.catalog.list_entries, workflow_id)
+
+    async def list_checkpoints(self, workflow_id: str | None = None) -> list[WorkflowCheckpoint]:
+        """List checkpoint objects. If workflow_id is provided, filter by that workflow."""
+
+        def _list_checkpoints() -> list[WorkflowCheckpoint]:
+            checkpoints: list[WorkflowCheckpoint] = []
+            # Deltas of the same chain share their parents, so rebuild each state only once
+            states: dict[str, dict[str, Any] | None] = {}
+            for entry in self.catalog.list_entries(workflow_id):
+                try:
+                    state = self._read_state(entry.checkpoint_id, states)
+                except Exception as error:
+                    logger.warning(f"Failed to read checkpoint {entry.checkpoint_id}: {error}")
+                    continue
+                if state is None:
+                    logger.warning(f"Checkpoint {entry.checkpoint_id} is in the catalog but its file is missing")
+                    continue
+                checkpoints.append(_to_checkpoint(state))
+            return checkpoints
+
+        return await asyncio.to_thread(_list_checkpoints)
+
+    async def get_latest_checkpoint(self, workflow_id: str) -> WorkflowCheckpoint | None:
+        """Load the most recent checkpoint of a workflow, e.g. to resume it."""
+        entry = await asyncio.to_thread(self.catalog.latest, workflow_id)
+        return await self.load_checkpoint(entry.checkpoint_id) if entry is not None else None
+
+    async def delete_checkpoint(self, checkpoint_id: str) -> bool:
+        """Delete a checkpoint by ID."""
+        file_path = self._get_path(checkpoint_id)
+
+        def _delete() -> bool:
+            if not file_path.exists():
+                return False
+            # Deltas built on this checkpoint become full snapshots so they can still be loaded
+            for child_id in self.catalog.children(checkpoint_id):
+                state = self._read_state(child_id, {})
+                if state is not None:
+                    data = _encode(state, FULL_SNAPSHOT, None, self.codec, self.compression, self.compression_level)
+                    self._write(self._get_path(child_id), data)
+                    self.catalog.add(_get_entry(_to_checkpoint(state), len(data), FULL_SNAPSHOT, None))
+            for workflow_id, (last_id, _, _) in list(self._last_saved.items()):
+                if last_id == checkpoint_id:
+                    del self._last_saved[workflow_id]
+            file_path.unlink()
+            self.catalog.remove(checkpoint_id)
+            logger.info(f"Deleted checkpoint {checkpoint_id} from {file_path}")
+            return True
+
+        return await asyncio.to_thread(_delete)
+
+    def _get_path(self, checkpoint_id: str) -> Path:
+        return self.storage_path / f"{checkpoint_id}{CHECKPOINT_EXTENSION}"
+
+    def _write(self, file_path: Path, data: bytes) -> None:
+        tmp_path = file_path.with_suffix(CHECKPOINT_EXTENSION + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if self.durability == "checkpoint":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        if self.durability == "checkpoint":
+            # Makes the rename itself durable
+            _fsync_directory(self.storage_path)
+        elif self.durability == "batch":
+            self._unsynced.add(file_path)
+
+    def _read_state(self, checkpoint_id: str, states: dict[str, dict[str, Any] | None]) -> dict[str, Any] | None:
+        """Returns the stored state of a checkpoint, replaying its delta chain when needed."""
+        if checkpoint_id in states:
+            return states[checkpoint_id]
+        file_path = self._get_path(checkpoint_id)
+        if not file_path.exists():
+            return None
+        data = file_path.read_bytes()
+        header = read_header(data)
+        body = _decode_body(data, header)
+        if header.kind == DELTA:
+            parent_state = self._read_state(header.parent_id, states)
+            if parent_state is None:
+                raise ValueError(f"Checkpoint {checkpoint_id} depends on missing checkpoint {header.parent_id}.")
+            body = apply_delta(parent_state, body)
+        states[checkpoint_id] = body
+        return body
+
+    def rebuild_catalog(self) -> int:
+        """Re-index every checkpoint file in the folder. Returns the number of indexed checkpoints."""
+        self.catalog.clear()
+        states: dict[str, dict[str, Any] | None] = {}
+        for file_path in self.storage_path.glob(f"*{CHECKPOINT_EXTENSION}"):
+            try:
+                data = file_path.read_bytes()
+                header = read_header(data)
+                state = self._read_state(file_path.name[:-len(CHECKPOINT_EXTENSION)], states)
+            except Exception as error:
+                logger.warning(f"Failed to read checkpoint file {file_path}: {error}")
+                continue
+            self.catalog.add(_get_entry(_to_checkpoint(state), len(data), header.kind, header.parent_id))
+        count = len(self.catalog.list_entries())
+        logger.info(f"Indexed {count} checkpoints in {self.catalog.path}")
+        return count
+
+class IndexedCheckpointStorage:
+    """Adds a CheckpointCatalog to another CheckpointStorage, e.g. FileCheckpointStorage.
+
+    Saves and deletes go to both; listing reads the catalog and then loads only the matching checkpoints.
+    The catalog defaults to `catalog.sqlite` next to the checkpoints of storages that have a `storage_path`.
+    It is filled from the wrapped storage the first time it is created.
+    """
+
+    def __init__(self, storage: CheckpointStorage, catalog_path: str | Path | None = None):
+        if catalog_path is None:
+            if not hasattr(storage, "storage_path"):
+                raise ValueError("catalog_path is required for storages without a storage_path.")
+            catalog_path = Path(storage.storage_path) / CATALOG_FILE
+        self.storage = storage
+        self.catalog = CheckpointCatalog(catalog_path)
+        self._needs_rebuild = self.catalog.is_new
+
+    async def save_checkpoint(self, checkpoint: WorkflowCheckpoint) -> str:
+        await self._ensure_catalog()
+        checkpoint_id = await self.storage.save_checkpoint(checkpoint)
+        await asyncio.to_thread(self.catalog.add, self._get_entry(checkpoint))
+        return checkpoint_id
+
+    async def load_checkpoint(self, checkpoint_id: str) -> WorkflowCheckpoint | None:
+        return await self.storage.load_checkpoint(checkpoint_id)
+
+    async def list_checkpoint_ids(self, workflow_id: str | None = None) -> list[str]:
+        return [entry.checkpoint_id for entry in await self.list_entries(workflow_id)]
+
+    async def list_entries(self, workflow_id: str | None = None) -> list[CheckpointEntry]:
+        """List the catalog entries, oldest first, without loading any checkpoint."""
+        await self._ensure_catalog()
+        return await asyncio.to_thread(self.catalog.list_entries, workflow_id)
+
+    async def list_checkpoints(self, workflow_id: str | None = None) -> list[WorkflowCheckpoint]:
+        checkpoints = []
+        for checkpoint_id in await self.list_checkpoint_ids(workflow_id):
+            checkpoint = await self.storage.load_checkpoint(checkpoint_id)
+            if checkpoint is not None:
+                checkpoints.append(checkpoint)
+        return checkpoints
+
+    async def get_latest_checkpoint(self, workflow_id: str) -> WorkflowCheckpoint | None:
+        """Load the most recent checkpoint of a workflow, e.g. to resume it."""
+        await self._ensure_catalog()
+        entry = await asyncio.to_thread(self.catalog.latest, workflow_id)
+        return await self.storage.load_checkpoint(entry.checkpoint_id) if entry is not None else None
+
+    async def delete_checkpoint(self, checkpoint_id: str) -> bool:
+        await asyncio.to_thread(self.catalog.remove, checkpoint_id)
+        return await self.storage.delete_checkpoint(checkpoint_id)
+
+    async def rebuild_catalog(self) -> int:
+        """Re-index every checkpoint of the wrapped storage. Returns the number of indexed checkpoints."""
+        self._needs_rebuild = False
+        checkpoints = await self.storage.list_checkpoints()
+        await asyncio.to_thread(self.catalog.clear)
+        for checkpoint in checkpoints:
+            await asyncio.to_thread(self.catalog.add, self._get_entry(checkpoint))
+        return len(checkpoints)
+
+    async def _ensure_catalog(self) -> None:
+        if self._needs_rebuild:
+            await self.rebuild_catalog()
+
+    def _get_entry(self, checkpoint: WorkflowCheckpoint) -> CheckpointEntry:
+        # FileCheckpointStorage names its files <checkpoint_id>.json
+        size = None
+        if hasattr(self.storage, "storage_path"):
+            file_path = Path(self.storage.storage_path) / f"{checkpoint.checkpoint_id}.json"
+            size = file_path.stat().st_size if file_path.exists() else None
+        return _get_entry(checkpoint, size, FULL_SNAPSHOT, None)
+
+class WriteBehindCheckpointStorage:
+    """Takes checkpoint writes off the superstep critical path.
+
+    `save_checkpoint` queues the checkpoint and returns; a background task saves queued checkpoints to
+    the wrapped storage in order, then calls its `sync()` (if any) once per batch. At most `max_pending`
+    checkpoints wait in the queue; further saves wait for room, which bounds memory when the disk is slower
+    than the workflow. Queued checkpoints are served from memory by `load_checkpoint`, and listing or
+    deleting first waits for the queue to drain.
+
+    A checkpoint with pending requests is a flush barrier: the workflow is about to pause for a response,
+    so `save_checkpoint` only returns once every queued checkpoint has been written. Call `flush()` (or
+    `aclose()`) after a run to wait for the remaining writes. A failed write is raised by the next save or flush.
+
+    Example: `WriteBehindCheckpointStorage(BinaryCheckpointStorage(folder, durability="batch"))`
+    """
+
+    def __init__(self, storage: CheckpointStorage, max_pending: int = 64):
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1.")
+        self.storage = storage
+        self.max_pending = max_pending
+        # The runner builds every checkpoint from freshly encoded state, so queued ones are not modified
+        self._pending: dict[str, WorkflowCheckpoint] = {}
+        self._queue: asyncio.Queue[WorkflowCheckpoint] | None = None
+        self._writer: asyncio.Task[None] | None = None
+        self._error: Exception | None = None
+
+    async def save_checkpoint(self, checkpoint: WorkflowCheckpoint) -> str:
+        self._raise_error()
+        queue = self._ensure_writer()
+        self._pending[checkpoint.checkpoint_id] = checkpoint
+        await queue.put(checkpoint)
+        if _has_pending_requests(checkpoint):
+            await self.flush()
+        return checkpoint.checkpoint_id
+
+    async def load_checkpoint(self, checkpoint_id: str) -> WorkflowCheckpoint | None:
+        checkpoint = self._pending.get(checkpoint_id)
+        if checkpoint is not None:
+            return checkpoint
+        return await self.storage.load_checkpoint(checkpoint_id)
+
+    async def list_checkpoint_ids(self, workflow_id: str | None = None) -> list[str]:
+        await self.flush()
+        return await self.storage.list_checkpoint_ids(workflow_id)
+
+    async def list_checkpoints(self, workflow_id: str | None = None) -> list[WorkflowCheckpoint]:
+        await self.flush()
+        return await self.storage.list_checkpoints(workflow_id)
+
+    async def delete_checkpoint(self, checkpoint_id: str) -> bool:
+        await self.flush()
+        return await self.storage.delete_checkpoint(checkpoint_id)
+
+    async def flush(self) -> None:
+        """Wait until every queued checkpoint has been written."""
+        if self._queue is not None:
+            await self._queue.join()
+        self._raise_error()
+
+    async def aclose(self) -> None:
+        """Write the queued checkpoints and stop the background task."""
+        try:
+            await self.flush()
+        finally:
+            writer = self._writer
+            self._writer = None
+            self._queue = None
+            if writer is not None:
+                writer.cancel()
+                await asyncio.gather(writer, return_exceptions=True)
+
+    async def __aenter__(self) -> "WriteBehindCheckpointStorage":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.aclose()
+
+    def _ensure_writer(self) -> asyncio.Queue[WorkflowCheckpoint]:
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_pending)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_loop(self._queue))
+        return self._queue
+
+    def _raise_error(self) -> None:
+        error, self._error = self._error, None
+        if error is not None:
+            raise RuntimeError("Failed to write a checkpoint in the background.") from error
+
+    async def _write_loop(self, queue: asyncio.Queue[WorkflowCheckpoint]) -> None:
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                for checkpoint in batch:
+                    await self.storage.save_checkpoint(checkpoint)
+                    self._pending.pop(checkpoint.checkpoint_id, None)
+                if hasattr(self.storage, "sync"):
+                    await self.storage.sync()
+            except Exception as error:
+                # Unwritten checkpoints stay loadable from memory; the error surfaces on the next save or flush
+                logger.error(f"Failed to write checkpoint: {error}")
+                self._error = error
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+@dataclass
+class RetentionPolicy:
+    """Which checkpoints compaction deletes. A checkpoint is deleted when any enabled rule expires it.
+
+    - `keep_last`: keep the N most recent checkpoints of each workflow.
+    - `max_age`: delete checkpoints older than this many seconds.
+    - `pending_requests_only`: keep only checkpoints waiting for a request response (human in the loop),
+      plus the latest checkpoint of each workflow.
+    - `collapse_completed`: once the latest checkpoint of a workflow shows a completed run, keep only that one.
+    """
+    keep_last: int | None = None
+    max_age: float | None = None
+    pending_requests_only: bool = False
+    collapse_completed: bool = False
+
+    def __post_init__(self) -> None:
+        if self.keep_last is not None and self.keep_last < 1:
+            raise ValueError("keep_last must be at least 1.")
+
+    def select_expired(self, entries: list[CheckpointEntry], now: float | None = None) -> list[CheckpointEntry]:
+        """Returns the entries to delete, oldest first."""
+        now = time.time() if now is None else now
+        workflows: dict[str, list[CheckpointEntry]] = {}
+        for entry in sorted(entries, key=lambda entry: entry.timestamp):
+            workflows.setdefault(entry.workflow_id, []).append(entry)
+
+        expired = []
+        for checkpoints in workflows.values():
+            latest = checkpoints[-1]
+            completed = self.collapse_completed and latest.status in COMPLETED_STATUSES and not latest.pending_requests
+            for index, entry in enumerate(checkpoints):
+                newer = len(checkpoints) - 1 - index
+                if (
+                    (self.keep_last is not None and newer >= self.keep_last)
+                    or (self.max_age is not None and now - _get_time(entry.timestamp) > self.max_age)
+                    or (self.pending_requests_only and entry is not latest and not entry.pending_requests)
+                    or (completed and entry is not latest)
+                ):
+                    expired.append(entry)
+        return sorted(expired, key=lambda entry: entry.timestamp)
+
+async def compact_checkpoints(
+    storage: CheckpointStorage,
+    policy: RetentionPolicy,
+    workflow_id: str | None = None,
+    dry_run: bool = False,
+) -> list[CheckpointEntry]:
+    """Delete the checkpoints the policy expires and return their entries.
+
+    Storages with a catalog (BinaryCheckpointStorage, IndexedCheckpointStorage) are compacted from the
+    index; other storages have their checkpoints loaded once to decide.
+    """
+    if hasattr(storage, "list_entries"):
+        entries = await storage.list_entries(workflow_id)
+    else:
+        entries = [_get_entry(checkpoint, None, FULL_SNAPSHOT, None) for checkpoint in await storage.list_checkpoints(workflow_id)]
+    expired = policy.select_expired(entries)
+    if not dry_run:
+        # Newest first, so a delta chain is rewritten at most once when its older checkpoints go away
+        for entry in reversed(expired):
+            await storage.delete_checkpoint(entry.checkpoint_id)
+        if expired:
+            logger.info(f"Compaction deleted {len(expired)} of {len(entries)} checkpoints")
+    return expired
+
+class CheckpointCompactor:
+    """Background task that applies a RetentionPolicy to a storage every `interval` seconds.
+
+    Example: `async with CheckpointCompactor(storage, RetentionPolicy(keep_last=5), interval=300): ...`
+    """
+
+    def __init__(self, storage: CheckpointStorage, policy: RetentionPolicy, interval: float = 300.0):
+        self.storage = storage
+        self.policy = policy
+        self.interval = interval
+        self.deleted = 0
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._compaction_loop())
+
+    async def run_once(self) -> list[CheckpointEntry]:
+        expired = await compact_checkpoints(self.storage, self.policy)
+        self.deleted += len(expired)
+        return expired
+
+    async def aclose(self) -> None:
+        """Stop the background task. A compaction in progress is cancelled between deletions."""
+        task = self._task
+        self._task = None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def __aenter__(self) -> "CheckpointCompactor":
+        self.start()
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.aclose()
+
+    async def _compaction_loop(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as error:
+                # Keep the task alive; the next interval tries again
+                logger.warning(f"Checkpoint compaction failed: {error}")
+            await asyncio.sleep(self.interval)
+
+def get_default_codec() -> str:
+    """Returns the most compact installed codec."""
+    if msgpack is not None:
+        return "msgpack"
+    if cbor2 is not None:
+        return "cbor"
+    return "json"
+
+def get_default_compression() -> str:
+    """Returns zstd when installed, otherwise zlib (always available)."""
+    return "zstd" if zstandard is not None else "zlib"
+
+def encode_checkpoint(checkpoint: WorkflowCheckpoint, codec: str = "msgpack", compression: str = "zstd", level: int = 3) -> bytes:
+    """Encode a checkpoint as a full snapshot: header + compressed, interned payload."""
+    return _encode(_strip_message_nulls(asdict(checkpoint)), FULL_SNAPSHOT, None, codec, compression, level)
+
+def decode_checkpoint(data: bytes) -> WorkflowCheckpoint:
+    """Decode a full snapshot written by encode_checkpoint. Deltas need their storage to be loaded."""
+    header = read_header(data)
+    if header.kind == DELTA:
+        raise ValueError(f"Delta checkpoint (parent {header.parent_id}); load it through BinaryCheckpointStorage.")
+    return _to_checkpoint(_decode_body(data, header))
+
+def read_header(data: bytes) -> CheckpointHeader:
+    """Parse the header of a binary checkpoint file."""
+    if data[:4] != CHECKPOINT_MAGIC:
+        raise ValueError("Not a binary checkpoint file.")
+    version = data[4]
+    if version == 1:
+        # Version 1 files are always full snapshots
+        return CheckpointHeader(version, CODECS[data[5]], COMPRESSIONS[data[6]], FULL_SNAPSHOT, None, 7)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format version {version}.")
+    parent_length = data[8]
+    parent_id = data[9:9 + parent_length].decode("ascii") if parent_length else None
+    return CheckpointHeader(version, CODECS[data[5]], COMPRESSIONS[data[6]], data[7], parent_id, 9 + parent_length)
+
+def diff_state(old: Any, new: Any) -> list[Any] | None:
+    """Returns the delta operation that turns `old` into `new`, or None when they are equal."""
+    if old is new:
+        return None
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = {}
+        for key, value in new.items():
+            operation = diff_state(old[key], value) if key in old else [_REPLACE, value]
+            if operation is not None:
+                changes[key] = operation
+        removed = [key for key in old if key not in new]
+        return [_UPDATE, changes, removed] if changes or removed else None
+    if isinstance(old, list) and isinstance(new, list) and len(new) >= len(old) and new[:len(old)] == old:
+        # Chat histories and message queues mostly grow at the end
+        return [_APPEND, new[len(old):]] if len(new) > len(old) else None
+    if type(old) is type(new) and old == new:
+        return None
+    return [_REPLACE, new]
+
+def apply_delta(old: Any, operation: list[Any]) -> Any:
+    """Apply a delta operation from diff_state. `old` is not modified."""
+    kind = operation[0]
+    if kind == _REPLACE:
+        return operation[1]
+    if kind == _APPEND:
+        return old + operation[1]
+    new = dict(old)
+    for key, child_operation in operation[1].items():
+        new[key] = apply_delta(old.get(key), child_operation)
+    for key in operation[2]:
+        new.pop(key, None)
+    return new
+
+def convert_checkpoints(
+    source: str | Path,
+    target: str | Path,
+    to_format: str = "binary",
+    codec: str | None = None,
+    compression: str | None = None,
+) -> int:
+    """Convert every checkpoint in `source` between the JSON (FileCheckpointStorage) and binary formats.
+
+    Returns the number of converted checkpoints. Existing files in `target` with the same ID are replaced.
+    """
+    source, target = Path(source), Path(target)
+    target.mkdir(parents=True, exist_ok=True)
+    codec = codec or get_default_codec()
+    compression = compression or get_default_compression()
+    converted = 0
+
+    if to_format == "binary":
+        for file_path in source.glob("*.json"):
+            checkpoint = WorkflowCheckpoint.from_dict(_read_json_checkpoint(file_path))
+            data = encode_checkpoint(checkpoint, codec, compression)
+            (target / f"{checkpoint.checkpoint_id}{CHECKPOINT_EXTENSION}").write_bytes(data)
+            converted += 1
+    elif to_format == "json":
+        storage = BinaryCheckpointStorage(source, codec, compression)
+        states: dict[str, dict[str, Any] | None] = {}
+        for file_path in source.glob(f"*{CHECKPOINT_EXTENSION}"):
+            checkpoint = _to_checkpoint(storage._read_state(file_path.name[:-len(CHECKPOINT_EXTENSION)], states))
+            # Same layout and encoding FileCheckpointStorage writes
+            with open(target / f"{checkpoint.checkpoint_id}.json", "w") as f:
+                json.dump(asdict(checkpoint), f, indent=2, ensure_ascii=False)
+            converted += 1
+    else:
+        raise ValueError(f"Unknown format '{to_format}'. Use 'binary' or 'json'.")
+    return converted
+
+def _read_json_checkpoint(file_path: Path) -> dict[str, Any]:
+    data = file_path.read_bytes()
+    try:
+        return json.loads(data.decode("utf-8"))
+    except UnicodeDecodeError:
+        # FileCheckpointStorage writes with the platform default encoding, which is cp1252 on most Windows machines
+        return json.loads(data.decode("cp1252", errors="replace"))
+
+def _encode(body: Any, kind: int, parent_id: str | None, codec: str, compression: str, level: int) -> bytes:
+    _check_available(codec, compression)
+    local_fields: dict[str, int] = {}
+    interned = _intern(body, local_fields)
+    payload = _serialize([list(local_fields), interned], codec)
+    parent = parent_id.encode("ascii") if parent_id else b""
+    header = CHECKPOINT_MAGIC + bytes([FORMAT_VERSION, CODECS.index(codec), COMPRESSIONS.index(compression), kind, len(parent)])
+    return header + parent + _compress(payload, compression, level)
+
+def _decode_body(data: bytes, header: CheckpointHeader) -> Any:
+    _check_available(header.codec, header.compression)
+    local_fields, body = _deserialize(_decompress(data[header.size:], header.compression), header.codec)
+    return _expand(body, INTERNED_FIELDS + local_fields)
+
+def _get_entry(checkpoint: WorkflowCheckpoint, size: int | None, kind: int, parent_id: str | None) -> CheckpointEntry:
+    metadata = checkpoint.metadata or {}
+    try:
+        summary = get_checkpoint_summary(checkpoint)
+        status, pending_requests = summary.status, len(summary.pending_requests)
+    except Exception as error:
+        logger.warning(f"Failed to summarize checkpoint {checkpoint.checkpoint_id}: {error}")
+        status, pending_requests = None, 0
+    return CheckpointEntry(
+        checkpoint_id=checkpoint.checkpoint_id,
+        workflow_id=checkpoint.workflow_id,
+        timestamp=checkpoint.timestamp,
+        superstep=metadata.get("superstep"),
+        graph_signature=metadata.get("graph_signature"),
+        size=size,
+        kind=kind,
+        parent_id=parent_id,
+        status=status,
+        pending_requests=pending_requests,
+    )
+
+def _has_pending_requests(checkpoint: WorkflowCheckpoint) -> bool:
+    # RequestInfoExecutor keeps the requests waiting for a response in its executor state
+    return any(isinstance(state, dict) and state.get("pending_requests") for state in checkpoint.executor_states.values())
+
+def _fsync_file(path: Path) -> None:
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _fsync_directory(path: Path) -> None:
+    # Windows cannot open a directory; NTFS makes the rename durable with the file
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _get_time(timestamp: str) -> float:
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def _to_checkpoint(state: dict[str, Any]) -> WorkflowCheckpoint:
+    # Copy so the runner never modifies states shared with other deltas of the chain
+    return WorkflowCheckpoint.from_dict(_restore_message_nulls(copy.deepcopy(state)))
+
+def _check_available(codec: str, compression: str) -> None:
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec '{codec}'. Use one of {CODECS}.")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}'. Use one of {COMPRESSIONS}.")
+    if codec == "msgpack" and msgpack is None:
+        raise ImportError("The msgpack codec requires the msgpack package: pip install msgpack")
+    if codec == "cbor" and cbor2 is None:
+        raise ImportError("The cbor codec requires the cbor2 package: pip install cbor2")
+    if compression == "zstd" and zstandard is None:
+        raise ImportError("zstd compression requires the zstandard package: pip install zstandard")
+
+def _serialize(value: Any, codec: str) -> bytes:
+    if codec == "msgpack":
+        return msgpack.packb(value, use_bin_type=True, strict_types=False)
+    if codec == "cbor":
+        return cbor2.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _deserialize(data: bytes, codec: str) -> Any:
+    if codec == "msgpack":
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    if codec == "cbor":
+        return cbor2.loads(data)
+    return json.loads(data)
+
+def _compress(data: bytes, compression: str, level: int) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if compression == "zlib":
+        return zlib.compress(data, min(max(level, 1), 9))
+    return data
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == "zlib":
+        return zlib.decompress(data)
+    return data
+
+def _intern(value: Any, local_fields: dict[str, int]) -> Any:
+    """Replace dictionary keys with integer ids: shared ids first, then ids local to this file."""
+    if isinstance(value, dict):
+        interned = {}
+        for key, item in value.items():
+            key_id = _FIELD_IDS.get(key)
+            if key_id is None:
+                key_id = local_fields.setdefault(key, len(INTERNED_FIELDS) + len(local_fields))
+            interned[key_id] = _intern(item, local_fields)
+        return interned
+    if isinstance(value, (list, tuple)):
+        return [_intern(item, local_fields) for item in value]
+    return value
+
+def _expand(value: Any, fields: list[str]) -> Any:
+    if isinstance(value, dict):
+        # JSON turns the integer keys into strings
+        return {fields[int(key)]: _expand(item, fields) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item, fields) for item in value]
+    return value
+
+def _strip_message_nulls(checkpoint: dict[str, Any]) -> dict[str, Any]:
+    checkpoint["messages"] = {
+        source_id: [
+            {key: item for key, item in message.items() if not (key in _OPTIONAL_MESSAGE_FIELDS and item is None)}
+            for message in messages
+        ]
+        for source_id, messages in checkpoint.get("messages", {}).items()
+    }
+    return checkpoint
+
+def _restore_message_nulls(checkpoint: dict[str, Any]) -> dict[str, Any]:
+    for messages in checkpoint.get("messages", {}).values():
+        for message in messages:
+            for key in _OPTIONAL_MESSAGE_FIELDS:
+                message.setdefault(key, None)
+    return checkpoint
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert or compact a folder of checkpoints.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="Convert checkpoints between the JSON and binary formats.")
+    convert.add_argument("source", help="Folder with the checkpoints to convert.")
+    convert.add_argument("target", help="Folder to write the converted checkpoints to.")
+    convert.add_argument("--to", dest="to_format", choices=["binary", "json"], default="binary")
+    convert.add_argument("--codec", choices=CODECS, help="Binary codec (default: best installed).")
+    convert.add_argument("--compression", choices=COMPRESSIONS, help="Compression (default: zstd if installed, else zlib).")
+
+    compact = commands.add_parser("compact", help="Delete the checkpoints a retention policy expires.")
+    compact.add_argument("folder", help="Folder with binary (.ckpt) or JSON checkpoints.")
+    compact.add_argument("--workflow-id", help="Only compact this workflow.")
+    compact.add_argument("--keep-last", type=int, help="Keep the N most recent checkpoints of each workflow.")
+    compact.add_argument("--max-age-days", type=float, help="Delete checkpoints older than this.")
+    compact.add_argument("--pending-requests-only", action="store_true", help="Keep only checkpoints waiting for a response (and the latest).")
+    compact.add_argument("--collapse-completed", action="store_true", help="Keep only the final checkpoint of completed runs.")
+    compact.add_argument("--dry-run", action="store_true", help="List what would be deleted without deleting it.")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        count = convert_checkpoints(args.source, args.target, args.to_format, args.codec, args.compression)
+        print(f"Converted {count} checkpoints from '{args.source}' to '{args.target}'.")
+        return
+
+    policy = RetentionPolicy(
+        keep_last=args.keep_last,
+        max_age=args.max_age_days * 86400 if args.max_age_days is not None else None,
+        pending_requests_only=args.pending_requests_only,
+        collapse_completed=args.collapse_completed,
+    )
+    folder = Path(args.folder)
+    storage = BinaryCheckpointStorage(folder) if any(folder.glob(f"*{CHECKPOINT_EXTENSION}")) else FileCheckpointStorage(folder)
+    expired = asyncio.run(compact_checkpoints(storage, policy, args.workflow_id, args.dry_run))
+    for entry in expired:
+        print(f"{'Would delete' if args.dry_run else 'Deleted'} {entry.checkpoint_id} ({entry.workflow_id}, {entry.timestamp}, {entry.status})")
+    print(f"{len(expired)} checkpoints {'would be deleted' if args.dry_run else 'deleted'}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Agents that wrap another agent to change how its calls are made
+from collections.abc import AsyncIterable
+from typing import Any
+
+from agent_framework import (
+    AgentProtocol,
+    AgentRunResponse,
+    AgentRunResponseUpdate,
+    AgentThread,
+    BaseAgent,
+    ChatMessage,
+    Role,
+)
+
+class DelegatingAgent(BaseAgent):
+    """Agent that forwards every call to `agent`; subclasses override run and run_stream to intercept them.
+
+    Wrapping the agent keeps a workflow on the public AgentExecutor: `AgentExecutor(wrapper, id=...)` runs
+    the wrapper like any agent, with its own thread and events, so the wrapper never depends on how the
+    executor caches messages or emits its events. The wrapper has the id, name and description of the
+    agent and creates its threads. A subclass that answers without the agent adds the exchange to the
+    caller's thread with `add_to_thread`, as an agent call would.
+    """
+
+    def __init__(self, agent: AgentProtocol):
+        super().__init__(id=agent.id, name=agent.name, description=agent.description)
+        self.agent = agent
+
+    def get_new_thread(self, **kwargs: Any) -> AgentThread:
+        return self.agent.get_new_thread(**kwargs)
+
+    async def run(self, messages: Any = None, *, thread: AgentThread | None = None, **kwargs: Any) -> AgentRunResponse:
+        return await self.agent.run(messages, thread=thread, **kwargs)
+
+    async def run_stream(self, messages: Any = None, *, thread: AgentThread | None = None, **kwargs: Any) -> AsyncIterable[AgentRunResponseUpdate]:
+        async for update in self.agent.run_stream(messages, thread=thread, **kwargs):
+            yield update
+
+async def add_to_thread(thread: AgentThread | None, messages: list[ChatMessage], response: AgentRunResponse) -> None:
+    """Record a request and its response in `thread`, like an agent does at the end of a call."""
+    if thread is not None:
+        await thread.on_new_messages([*messages, *response.messages])
+
+def as_messages(messages: Any) -> list[ChatMessage]:
+    """The messages of an agent call (None, a string, a ChatMessage or a list of them) as a list of ChatMessage."""
+    if messages is None:
+        return []
+    if isinstance(messages, (str, ChatMessage)):
+        messages = [messages]
+    return [ChatMessage(role=Role.USER, text=message) if isinstance(message, str) else message for message in messages]
+
+async def stream_response(response: AgentRunResponse) -> AsyncIterable[AgentRunResponseUpdate]:
+    """A complete response as streaming updates, one per message, for a run_stream that did not stream."""
+    for message in response.messages:
+        yield AgentRunResponseUpdate(contents=message.contents, role=message.role, author_name=message.author_name)
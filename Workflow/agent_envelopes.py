@@ -0,0 +1,34 @@
+# Read-only agent requests that fan-out edges can share between their targets
+from collections.abc import Iterable
+from dataclasses import FrozenInstanceError
+from typing import Any
+
+from agent_framework import AgentExecutorRequest, ChatMessage
+
+class SharedRequest(AgentExecutorRequest):
+    """AgentExecutorRequest meant to be sent once and delivered to every target of a fan-out edge group.
+
+    The workflow runner delivers the same message object to every target of a fan-out, without copying
+    it, so N experts reading a long conversation share one request and one list of messages; a sender
+    that calls send_message once per target instead creates N envelopes and, with checkpointing, stores
+    the conversation N times. Since the request is shared, it is read-only: the messages are kept in a
+    tuple and its attributes cannot be reassigned, so one target cannot change what the others receive.
+    A handler that needs to change it calls `for_write()` for its own mutable copy (copy on write); the
+    ChatMessage objects themselves are shared by every copy and must not be modified in place.
+
+    AgentExecutor accepts it like any AgentExecutorRequest.
+    """
+
+    def __init__(self, messages: Iterable[ChatMessage], should_respond: bool = True):
+        object.__setattr__(self, "messages", tuple(messages))
+        object.__setattr__(self, "should_respond", should_respond)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise FrozenInstanceError(f"SharedRequest is read-only; call for_write() to change '{name}'.")
+
+    def __delattr__(self, name: str) -> None:
+        raise FrozenInstanceError(f"SharedRequest is read-only; call for_write() to remove '{name}'.")
+
+    def for_write(self) -> AgentExecutorRequest:
+        """A mutable AgentExecutorRequest with its own list of the same messages."""
+        return AgentExecutorRequest(messages=list(self.messages), should_respond=self.should_respond)
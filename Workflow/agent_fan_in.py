@@ -0,0 +1,139 @@
+# Incremental fan-in: expert agents run side by side and their responses are aggregated as they arrive
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from agent_framework import (
+    AgentExecutorRequest,
+    AgentExecutorResponse,
+    AgentProtocol,
+    AgentRunEvent,
+    AgentRunResponse,
+    AgentRunUpdateEvent,
+    ChatMessage,
+    Executor,
+    Role,
+    WorkflowContext,
+    handler,
+)
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class FanInPolicy:
+    """When a StreamingFanIn stops waiting for its experts.
+
+    `quorum`: finish as soon as this many experts have answered (None waits for all of them).
+    `timeout`: finish this many seconds after the request with the responses received so far, even when
+    no expert has answered yet. Both can be combined: 2 of 3 experts or 20 seconds, whichever comes first.
+    """
+    quorum: int | None = None
+    timeout: float | None = None
+
+class StreamingFanIn(Executor):
+    """Fan-out/fan-in of expert agents in one step, aggregating every response as soon as it arrives.
+
+    A fan-in edge group delivers its list only once every branch has finished, so the slowest expert
+    sets the latency of the whole workflow. Expert nodes followed by a k-of-n aggregator node would not
+    help either: the runner delivers the messages of a superstep only once every executor of that
+    superstep has finished, so the aggregator would still start after the slowest expert. StreamingFanIn
+    instead runs the expert agents concurrently itself, keyed by expert id: `on_result` is called with
+    each AgentExecutorResponse in the order they finish, and `finalize` once the policy is met, with the
+    responses received and the ids of the experts still missing. Experts that have not answered by then
+    are cancelled; an expert that fails is logged and counted as missing.
+
+    Each expert runs on its own thread and emits AgentRunEvent/AgentRunUpdateEvent under its id, like an
+    AgentExecutor would. What this gives up: the experts are not nodes of the graph, so a visualization
+    shows only the fan-in executor, and the whole panel is one superstep, so no checkpoint is taken
+    between experts and a run resumed from a checkpoint calls every expert again. By default `finalize`
+    sends the list of responses on, like a fan-in edge group would, so an existing aggregator can follow
+    it unchanged; subclasses override the hooks to aggregate incrementally. `responses()` is the same
+    stream as an async iterator.
+    """
+
+    def __init__(self, experts: Mapping[str, AgentProtocol], policy: FanInPolicy | None = None, id: str | None = None):
+        super().__init__(id=id or "fan_in")
+        self.experts = dict(experts)
+        self.policy = policy or FanInPolicy()
+        self._threads = {expert_id: agent.get_new_thread() for expert_id, agent in self.experts.items()}
+        # Messages of requests that did not ask for a response yet, sent with the next one
+        self._pending: list[ChatMessage] = []
+
+    @handler
+    async def from_str(self, text: str, ctx: WorkflowContext[Any, Any]) -> None:
+        await self._fan_in([ChatMessage(Role.USER, text=text)], ctx)
+
+    @handler
+    async def from_request(self, request: AgentExecutorRequest, ctx: WorkflowContext[Any, Any]) -> None:
+        await self._fan_in(request.messages, ctx, request.should_respond)
+
+    async def on_result(self, response: AgentExecutorResponse, ctx: WorkflowContext[Any, Any]) -> None:
+        """Called with each expert response as it arrives."""
+
+    async def finalize(self, responses: list[AgentExecutorResponse], missing: list[str], ctx: WorkflowContext[Any, Any]) -> None:
+        """Called once with the responses in arrival order and the ids of the experts that did not answer."""
+        await ctx.send_message(responses)
+
+    async def responses(
+        self, messages: Sequence[ChatMessage], ctx: WorkflowContext[Any, Any], should_respond: bool = True
+    ) -> AsyncIterator[AgentExecutorResponse]:
+        """Run every expert on the messages and yield their responses as they finish, until the policy is met."""
+        messages = [*self._pending, *messages]
+        if not should_respond:
+            self._pending = messages
+            return
+        # The request of an expert that does not answer is not added to its thread, so it does not carry over
+        self._pending = []
+
+        tasks = {asyncio.create_task(self._run_expert(expert_id, messages, ctx)): expert_id for expert_id in self.experts}
+        quorum = min(self.policy.quorum or len(tasks), len(tasks))
+        deadline = time.monotonic() + self.policy.timeout if self.policy.timeout is not None else None
+        answered = 0
+        pending = set(tasks)
+        try:
+            while pending and answered < quorum:
+                # Past the deadline, only the responses already finished are taken
+                timeout = max(deadline - time.monotonic(), 0.0) if deadline is not None else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    try:
+                        response = task.result()
+                    except Exception as error:
+                        logger.warning(f"Expert '{tasks[task]}' failed: {error}")
+                        continue
+                    answered += 1
+                    yield response
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run_expert(self, expert_id: str, messages: list[ChatMessage], ctx: WorkflowContext[Any, Any]) -> AgentExecutorResponse:
+        agent = self.experts[expert_id]
+        thread = self._threads[expert_id]
+        if ctx.is_streaming():
+            updates = []
+            async for update in agent.run_stream(messages, thread=thread):
+                updates.append(update)
+                await ctx.add_event(AgentRunUpdateEvent(expert_id, update))
+            response = AgentRunResponse.from_agent_run_response_updates(updates)
+        else:
+            response = await agent.run(messages, thread=thread)
+            await ctx.add_event(AgentRunEvent(expert_id, response))
+        return AgentExecutorResponse(expert_id, response, full_conversation=[*messages, *response.messages])
+
+    async def _fan_in(self, messages: Sequence[ChatMessage], ctx: WorkflowContext[Any, Any], should_respond: bool = True) -> None:
+        results: list[AgentExecutorResponse] = []
+        async for response in self.responses(messages, ctx, should_respond):
+            results.append(response)
+            await self.on_result(response, ctx)
+        if not should_respond:
+            return
+        answered = {response.executor_id for response in results}
+        await self.finalize(results, [expert_id for expert_id in self.experts if expert_id not in answered], ctx)
@@ -0,0 +1,187 @@
+# Fusion of linear chains of function executors into a single workflow step
+#
+# WorkflowBuilder has no public way to rewrite the graph before it is built, so FusingWorkflowBuilder reads
+# and temporarily replaces its private _edge_groups, _executors and _start_executor. They can change in any
+# release, so this module is pinned to agent-framework-core TESTED_AGENT_FRAMEWORK_VERSION (agent_version.py,
+# see README) and warns on import with another version.
+import copy
+import logging
+from collections.abc import Sequence
+from typing import Any
+
+from agent_framework import (
+    Executor,
+    ExecutorEvent,
+    FunctionExecutor,
+    SingleEdgeGroup,
+    Workflow,
+    WorkflowBuilder,
+    WorkflowContext,
+)
+from agent_version import warn_if_untested_version
+
+logger = logging.getLogger(__name__)
+
+warn_if_untested_version("agent_fusion.py", "private members of WorkflowBuilder")
+
+class FusedStepEvent(ExecutorEvent):
+    """Debug event of a FusedExecutor: `executor_id` is the fused step, `data` the message it sent on."""
+
+class _StepContext:
+    """WorkflowContext of a step inside a FusedExecutor: messages are collected for the next step,
+    everything else (outputs, events, shared state, streaming mode) goes to the fused executor's context."""
+
+    def __init__(self, ctx: WorkflowContext[Any, Any], next_id: str):
+        self._ctx = ctx
+        self._next_id = next_id
+        self.sent: list[Any] = []
+
+    async def send_message(self, message: Any, target_id: str | None = None) -> None:
+        if target_id is not None and target_id != self._next_id:
+            logger.warning(f"Message for '{target_id}' dropped: the only edge leads to '{self._next_id}'.")
+            return
+        self.sent.append(message)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._ctx, name)
+
+class FusedExecutor(Executor):
+    """Runs a linear chain of function executors as one executor, passing each message straight to the next
+    function instead of through a superstep, a message envelope and the executor events of every hop.
+
+    The executor takes the id of the first step, so the edges into the chain are unchanged; the edges out
+    of the last step start from it. With `debug`, a FusedStepEvent is emitted for every message a step sends.
+    """
+
+    def __init__(self, steps: Sequence[FunctionExecutor], debug: bool = False):
+        super().__init__(id=steps[0].id, type="FusedExecutor", defer_discovery=True)
+        self.steps = list(steps)
+        self.debug = debug
+        head, tail = self.steps[0]._handler_specs[0], self.steps[-1]._handler_specs[0]
+        self._register_instance_handler(
+            name="+".join(step.id for step in self.steps),
+            func=self._run_steps,
+            message_type=head["message_type"],
+            ctx_annotation=tail["ctx_annotation"],
+            output_types=tail["output_types"],
+            workflow_output_types=tail["workflow_output_types"],
+        )
+
+    async def _run_steps(self, message: Any, ctx: WorkflowContext[Any, Any], index: int = 0) -> None:
+        step = self.steps[index]
+        if index == len(self.steps) - 1:
+            await _call_step(step, message, ctx)
+            return
+        next_step = self.steps[index + 1]
+        step_ctx = _StepContext(ctx, next_step.id)
+        await _call_step(step, message, step_ctx)
+        for sent in step_ctx.sent:
+            if self.debug:
+                await ctx.add_event(FusedStepEvent(step.id, sent))
+            if not next_step.can_handle(sent):
+                logger.warning(f"Message of type {type(sent).__name__} dropped: '{next_step.id}' cannot handle it.")
+                continue
+            await self._run_steps(sent, ctx, index + 1)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**super().to_dict(), "steps": [step.id for step in self.steps]}
+
+async def _call_step(step: FunctionExecutor, message: Any, ctx: Any) -> None:
+    # A function executor has exactly one handler, registered for the function's message type
+    handler = next(iter(step._handlers.values()))
+    await handler(message, ctx)
+
+class FusingWorkflowBuilder(WorkflowBuilder):
+    """WorkflowBuilder whose build() fuses linear chains of function executors into FusedExecutors.
+
+    A link a -> b is fused when both are @executor functions, the link is the only edge out of a and the only
+    edge into b, it has no condition, a yields no workflow output and b is not the start executor. A chain that
+    ends the workflow starts after the start executor. Every other executor and edge is left as is. Fusion changes the executor ids and the number of supersteps, so
+    checkpoints of an unfused workflow cannot be resumed by the fused one, and the other way round.
+
+    `fuse=False` builds the workflow unchanged; `debug=True` emits a FusedStepEvent per fused step.
+    """
+
+    def __init__(self, *args: Any, fuse: bool = True, debug: bool = False, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.fuse = fuse
+        self.debug = debug
+
+    def build(self) -> Workflow:
+        if not self.fuse:
+            return super().build()
+        edge_groups, executors, start_executor = self._edge_groups, self._executors, self._start_executor
+        self._edge_groups, self._executors = self._fuse_chains()
+        if isinstance(start_executor, Executor):
+            # The start executor may have been replaced by the chain it heads, which keeps its id
+            self._start_executor = start_executor.id
+        try:
+            return super().build()
+        finally:
+            self._edge_groups, self._executors, self._start_executor = edge_groups, executors, start_executor
+
+    def _fuse_chains(self) -> tuple[list[Any], dict[str, Executor]]:
+        start_id = self._start_executor.id if isinstance(self._start_executor, Executor) else self._start_executor
+        outgoing: dict[str, int] = {}
+        incoming: dict[str, int] = {}
+        for group in self._edge_groups:
+            for edge in group.edges:
+                outgoing[edge.source_id] = outgoing.get(edge.source_id, 0) + 1
+                incoming[edge.target_id] = incoming.get(edge.target_id, 0) + 1
+
+        # Fusable links, by source id
+        links: dict[str, SingleEdgeGroup] = {}
+        for group in self._edge_groups:
+            if type(group) is not SingleEdgeGroup or group.edges[0].condition_name is not None:
+                continue
+            edge = group.edges[0]
+            source, target = self._executors.get(edge.source_id), self._executors.get(edge.target_id)
+            if (
+                _is_function_step(source)
+                and _is_function_step(target)
+                and source is not target
+                and outgoing[edge.source_id] == 1
+                and incoming[edge.target_id] == 1
+                and not source.workflow_output_types
+                and edge.target_id != start_id
+            ):
+                links[edge.source_id] = group
+
+        fused_links: set[int] = set()
+        renamed: dict[str, str] = {}
+        executors = dict(self._executors)
+        linked_targets = {group.edges[0].target_id for group in links.values()}
+        for head_id in links:
+            if head_id in linked_targets:
+                continue
+            chain = [head_id]
+            while chain[-1] in links:
+                chain.append(links[chain[-1]].edges[0].target_id)
+            if head_id == start_id and not outgoing.get(chain[-1]):
+                # The runner always runs a superstep after the start executor and polls it for events every
+                # 50 ms, so a workflow fused into its start executor would wait for that empty superstep
+                chain = chain[1:]
+                if len(chain) < 2:
+                    continue
+            fused_links.update(id(links[step_id]) for step_id in chain[:-1])
+            fused = FusedExecutor([self._executors[step_id] for step_id in chain], debug=self.debug)
+            for step_id in chain[1:]:
+                del executors[step_id]
+            executors[fused.id] = fused
+            renamed[chain[-1]] = fused.id
+
+        edge_groups: list[Any] = []
+        for group in self._edge_groups:
+            if id(group) in fused_links:
+                continue
+            if any(edge.source_id in renamed for edge in group.edges):
+                # Copies, so the builder can still build the unfused graph
+                group = copy.copy(group)
+                group.edges = [copy.copy(edge) for edge in group.edges]
+                for edge in group.edges:
+                    edge.source_id = renamed.get(edge.source_id, edge.source_id)
+            edge_groups.append(group)
+        return edge_groups, executors
+
+def _is_function_step(executor: Executor | None) -> bool:
+    return type(executor) is FunctionExecutor and len(executor._handler_specs) == 1
@@ -0,0 +1,156 @@
+# Hedged agent calls: a call slower than usual gets a duplicate and the first response wins
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterable
+from typing import Any
+
+from agent_framework import (
+    AgentExecutor,
+    AgentProtocol,
+    AgentRunResponse,
+    AgentRunResponseUpdate,
+    AgentThread,
+    ChatMessage,
+)
+from agent_delegation import DelegatingAgent, add_to_thread, as_messages, stream_response
+
+logger = logging.getLogger(__name__)
+
+class Hedging:
+    """Latency history and hedging budget of one agent executor.
+
+    When a call is still running after the `percentile` of the last `window` call latencies, a duplicate
+    request is sent and whichever response comes first is used; the other call is cancelled. Before
+    `warmup` latencies have been observed, `initial_delay` seconds are used instead (None: no hedging).
+
+    A duplicate is billed like any call, so `budget` caps them: every call earns `budget` of a duplicate
+    and each duplicate spends one, with at most `burst` saved up. Over n calls at most burst + budget * n
+    duplicates are sent, 10% more calls by default instead of up to twice as many. Keep the same Hedging
+    across workflow builds, so the history and budget carry over; it belongs to one executor.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        budget: float = 0.1,
+        burst: float = 1.0,
+        window: int = 100,
+        warmup: int = 10,
+        initial_delay: float | None = None,
+    ):
+        if not 0.0 < percentile <= 1.0:
+            raise ValueError(f"Percentile {percentile} is not between 0 and 1.")
+        self.percentile = percentile
+        self.budget = budget
+        self.burst = burst
+        self.warmup = warmup
+        self.initial_delay = initial_delay
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._tokens = burst
+
+    def delay(self) -> float | None:
+        """Seconds after which a call gets a duplicate, or None when it should not be hedged."""
+        if len(self._latencies) < self.warmup:
+            return self.initial_delay
+        ordered = sorted(self._latencies)
+        return ordered[max(math.ceil(self.percentile * len(ordered)) - 1, 0)]
+
+    def record(self, seconds: float) -> None:
+        """Add the latency of a completed call to the history and earn its share of the budget."""
+        self.calls += 1
+        self._latencies.append(seconds)
+        self._tokens = min(self._tokens + self.budget, self.burst)
+
+    def can_hedge(self) -> bool:
+        return self._tokens >= 1.0
+
+    def spend(self) -> bool:
+        """Take one duplicate out of the budget, if there is one left."""
+        if not self.can_hedge():
+            return False
+        self._tokens -= 1.0
+        self.hedged += 1
+        return True
+
+class HedgedAgent(DelegatingAgent):
+    """Agent that sends a duplicate request when its call is slower than usual (see Hedging).
+
+    Both calls run on new threads with the conversation so far, and only the winning exchange is added to
+    the caller's thread. Calls on a thread kept by the service, and calls with no delay yet or no budget
+    left, go straight to the agent; a hedged streaming call yields the winning response once it is complete.
+    """
+
+    def __init__(self, agent: AgentProtocol, hedging: Hedging):
+        super().__init__(agent)
+        self.hedging = hedging
+
+    async def run(self, messages: Any = None, *, thread: AgentThread | None = None, **kwargs: Any) -> AgentRunResponse:
+        if not self._should_hedge(thread):
+            started = time.monotonic()
+            response = await super().run(messages, thread=thread, **kwargs)
+            self.hedging.record(time.monotonic() - started)
+            return response
+        return await self._run_hedged(as_messages(messages), thread, **kwargs)
+
+    async def run_stream(self, messages: Any = None, *, thread: AgentThread | None = None, **kwargs: Any) -> AsyncIterable[AgentRunResponseUpdate]:
+        if not self._should_hedge(thread):
+            started = time.monotonic()
+            async for update in super().run_stream(messages, thread=thread, **kwargs):
+                yield update
+            self.hedging.record(time.monotonic() - started)
+            return
+        async for update in stream_response(await self._run_hedged(as_messages(messages), thread, **kwargs)):
+            yield update
+
+    def _should_hedge(self, thread: AgentThread | None) -> bool:
+        service_thread = thread is not None and thread.service_thread_id is not None
+        return self.hedging.delay() is not None and self.hedging.can_hedge() and not service_thread
+
+    async def _run_hedged(self, messages: list[ChatMessage], thread: AgentThread | None, **kwargs: Any) -> AgentRunResponse:
+        store = thread.message_store if thread is not None else None
+        conversation = (await store.list_messages() if store is not None else []) + messages
+        delay = self.hedging.delay()
+        started = time.monotonic()
+        primary = asyncio.create_task(self._call(conversation, **kwargs))
+        attempts = {primary}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done and self.hedging.spend():
+                logger.info(f"'{self.display_name}' has not answered after {delay:.2f}s, sending a duplicate request.")
+                attempts.add(asyncio.create_task(self._call(conversation, **kwargs)))
+            pending = attempts
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        # The other call may still answer
+                        error = error or task.exception()
+                        continue
+                    response = task.result()
+                    if task is not primary:
+                        self.hedging.hedge_wins += 1
+                    # The latency the caller saw: a winning duplicate started only after the delay
+                    self.hedging.record(time.monotonic() - started)
+                    await add_to_thread(thread, messages, response)
+                    return response
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def _call(self, messages: list[ChatMessage], **kwargs: Any) -> AgentRunResponse:
+        return await self.agent.run(messages, thread=self.agent.get_new_thread(), **kwargs)
+
+class HedgedAgentExecutor(AgentExecutor):
+    """AgentExecutor of a HedgedAgent, whose slow calls get a duplicate request within the Hedging budget."""
+
+    def __init__(self, agent: AgentProtocol, hedging: Hedging, **kwargs: Any):
+        self.hedging = hedging
+        super().__init__(HedgedAgent(agent, hedging), **kwargs)
@@ -0,0 +1,267 @@
+# Offline chat client that stands in for Azure OpenAI in the samples and benchmarks
+import asyncio
+import hashlib
+import math
+import random
+import types
+import typing
+from collections.abc import AsyncIterable, Callable, MutableSequence
+from typing import Any, ClassVar, Literal
+from pydantic import BaseModel
+
+from agent_framework import (
+    BaseChatClient,
+    ChatMessage,
+    ChatOptions,
+    ChatResponse,
+    ChatResponseUpdate,
+    Role,
+    TextContent,
+    UsageContent,
+    UsageDetails,
+    use_chat_middleware,
+    use_function_invocation,
+)
+
+# A latency function receives the client's random generator and returns a delay in seconds
+LatencyFunction = Callable[[random.Random], float]
+
+# A script receives the request messages and returns the structured output (model, dict or JSON string)
+ScriptFunction = Callable[[list[ChatMessage]], Any]
+
+def constant_latency(seconds: float) -> LatencyFunction:
+    """Every call takes exactly `seconds`."""
+    return lambda rng: seconds
+
+def uniform_latency(low: float, high: float) -> LatencyFunction:
+    """Delays are spread evenly between `low` and `high` seconds."""
+    return lambda rng: rng.uniform(low, high)
+
+def lognormal_latency(median: float, sigma: float = 0.5) -> LatencyFunction:
+    """Long-tailed delays around `median` seconds, which is how real model latency tends to look."""
+    if median <= 0:
+        return constant_latency(0.0)
+    return lambda rng: rng.lognormvariate(math.log(median), sigma)
+
+@use_function_invocation
+@use_chat_middleware
+class MockChatClient(BaseChatClient):
+    """Deterministic chat client that never leaves the process.
+
+    Responses depend only on `seed` and the request messages, so repeated runs produce the same
+    outputs and the same workflow paths. When the agent sets a `response_format`, the client returns
+    JSON for that model: either from `scripts` (keyed by model class or class name) or synthesized from
+    the model fields. Plain requests get a short text answer.
+
+    `latency` controls how long a call takes before the first token; streaming calls then yield the
+    text in chunks of `chunk_size` characters, `chunk_delay` seconds apart. The delay depends on the
+    request messages too, unless `latency_per_call` is set: then it is drawn anew for every call, like
+    a real service, so a duplicate request (see agent_hedging.py) can be faster than the original.
+
+    Like OpenAI, the client reports prompt caching in the usage ("prompt/cached_tokens"): the longest
+    prefix of the prompt already sent before, in blocks of 128 tokens, once it reaches
+    `prompt_cache_min_tokens` tokens.
+    """
+
+    OTEL_PROVIDER_NAME: ClassVar[str] = "mock"
+
+    def __init__(
+        self,
+        model_id: str = "mock",
+        seed: int = 0,
+        latency: LatencyFunction | None = None,
+        chunk_size: int = 16,
+        chunk_delay: float = 0.0,
+        scripts: dict[type[BaseModel] | str, Any] | None = None,
+        prompt_cache_min_tokens: int = 1024,
+        latency_per_call: bool = False,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.model_id = model_id
+        self.seed = seed
+        self.latency = latency or constant_latency(0.0)
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_delay = chunk_delay
+        self.scripts: dict[str, Any] = {}
+        self.call_count = 0
+        self.prompt_cache_min_tokens = prompt_cache_min_tokens
+        self.latency_per_call = latency_per_call
+        self._prompt_prefixes: set[bytes] = set()
+        for key, script in (scripts or {}).items():
+            self.set_script(key, script)
+
+    def set_script(self, response_format: type[BaseModel] | str, script: Any) -> None:
+        """Script the output for a response format.
+
+        `script` is a value (model instance, dict or JSON string), a list of values used in turn,
+        or a function that receives the request messages and returns a value.
+        Use the key "text" to script plain (unstructured) responses.
+        """
+        key = response_format if isinstance(response_format, str) else response_format.__name__
+        if isinstance(script, list):
+            script = _cycle(script)
+        self.scripts[key] = script
+
+    async def _inner_get_response(
+        self,
+        *,
+        messages: MutableSequence[ChatMessage],
+        chat_options: ChatOptions,
+        **kwargs: Any,
+    ) -> ChatResponse:
+        rng = self._get_random(messages)
+        text = self._get_text(list(messages), chat_options, rng)
+        prefixes, cached_tokens = self._check_prompt_cache(messages)
+        await asyncio.sleep(self._get_latency(rng))
+        # The prompt is cached once it has been processed, so requests sent at the same time all miss
+        self._prompt_prefixes.update(prefixes)
+        return ChatResponse(
+            messages=[ChatMessage(role=Role.ASSISTANT, text=text)],
+            model_id=self.model_id,
+            usage_details=self._get_usage(messages, text, cached_tokens),
+            response_format=chat_options.response_format,
+        )
+
+    async def _inner_get_streaming_response(
+        self,
+        *,
+        messages: MutableSequence[ChatMessage],
+        chat_options: ChatOptions,
+        **kwargs: Any,
+    ) -> AsyncIterable[ChatResponseUpdate]:
+        rng = self._get_random(messages)
+        text = self._get_text(list(messages), chat_options, rng)
+        prefixes, cached_tokens = self._check_prompt_cache(messages)
+        await asyncio.sleep(self._get_latency(rng))
+        self._prompt_prefixes.update(prefixes)
+        for start in range(0, len(text), self.chunk_size):
+            if start and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield ChatResponseUpdate(
+                contents=[TextContent(text=text[start:start + self.chunk_size])],
+                role=Role.ASSISTANT,
+                model_id=self.model_id,
+            )
+        yield ChatResponseUpdate(
+            contents=[UsageContent(details=self._get_usage(messages, text, cached_tokens))],
+            role=Role.ASSISTANT,
+            model_id=self.model_id,
+        )
+
+    def _get_random(self, messages: MutableSequence[ChatMessage]) -> random.Random:
+        self.call_count += 1
+        digest = hashlib.sha256(str(self.seed).encode())
+        for message in messages:
+            digest.update(f"{message.role}:{message.text}\n".encode())
+        return random.Random(digest.digest())
+
+    def _get_latency(self, rng: random.Random) -> float:
+        if self.latency_per_call:
+            # Still reproducible: the n-th call of a run always gets the same delay
+            rng = random.Random(f"{self.seed}:{self.call_count}")
+        return self.latency(rng)
+
+    def _get_text(self, messages: list[ChatMessage], chat_options: ChatOptions, rng: random.Random) -> str:
+        response_format = chat_options.response_format
+        if response_format is None:
+            script = self.scripts.get("text")
+            if script is not None:
+                return str(_run_script(script, messages))
+            prompt = _last_user_text(messages)
+            return f"[{self.model_id}] Response #{rng.randint(1000, 9999)} to: {prompt[:200]}"
+
+        script = self.scripts.get(response_format.__name__)
+        value = _run_script(script, messages) if script is not None else _synthesize(response_format, messages, rng)
+        if isinstance(value, str):
+            return value
+        if isinstance(value, BaseModel):
+            return value.model_dump_json()
+        return response_format.model_validate(value).model_dump_json()
+
+    def _get_usage(self, messages: MutableSequence[ChatMessage], text: str, cached_tokens: int = 0) -> UsageDetails:
+        # Rough estimate of four characters per token, good enough for throughput numbers
+        input_tokens = sum(len(message.text or "") for message in messages) // 4 + 1
+        output_tokens = len(text) // 4 + 1
+        usage = UsageDetails(
+            input_token_count=input_tokens,
+            output_token_count=output_tokens,
+            total_token_count=input_tokens + output_tokens,
+        )
+        if cached_tokens:
+            usage["prompt/cached_tokens"] = cached_tokens
+        return usage
+
+    def _check_prompt_cache(self, messages: MutableSequence[ChatMessage]) -> tuple[list[bytes], int]:
+        """Returns the prefix hashes of the prompt at every 128-token boundary and the number of cached tokens."""
+        block = 128 * 4
+        prompt = "".join(f"{message.role}:{message.text or ''}\n" for message in messages)
+        if len(prompt) // 4 < self.prompt_cache_min_tokens:
+            return [], 0
+        if len(self._prompt_prefixes) > 100_000:
+            self._prompt_prefixes.clear()
+        # Running hash, so a known hash means the whole prefix up to that boundary was sent before
+        digest = hashlib.sha256()
+        prefixes: list[bytes] = []
+        cached_chars = 0
+        for end in range(block, len(prompt) + 1, block):
+            digest.update(prompt[end - block:end].encode())
+            prefixes.append(digest.digest())
+            if prefixes[-1] in self._prompt_prefixes:
+                cached_chars = end
+        cached_tokens = cached_chars // 4
+        return prefixes, cached_tokens if cached_tokens >= self.prompt_cache_min_tokens else 0
+
+def _cycle(values: list[Any]) -> ScriptFunction:
+    index = 0
+
+    def next_value(_: list[ChatMessage]) -> Any:
+        nonlocal index
+        value = values[index % len(values)]
+        index += 1
+        return value
+
+    return next_value
+
+def _run_script(script: Any, messages: list[ChatMessage]) -> Any:
+    return script(messages) if callable(script) else script
+
+def _last_user_text(messages: list[ChatMessage]) -> str:
+    for message in reversed(messages):
+        if message.role == Role.USER and message.text:
+            return message.text
+    return ""
+
+def _synthesize(model: type[BaseModel], messages: list[ChatMessage], rng: random.Random) -> dict[str, Any]:
+    """Build a plausible value for every field of the model."""
+    return {
+        name: _synthesize_value(name, field.annotation, messages, rng)
+        for name, field in model.model_fields.items()
+    }
+
+def _synthesize_value(name: str, annotation: Any, messages: list[ChatMessage], rng: random.Random) -> Any:
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is Literal:
+        return rng.choice(args)
+    if origin in (typing.Union, types.UnionType):
+        options = [arg for arg in args if arg is not type(None)]
+        return _synthesize_value(name, options[0], messages, rng) if options else None
+    if origin in (list, set, tuple):
+        item_type = args[0] if args else str
+        return [_synthesize_value(name, item_type, messages, rng) for _ in range(rng.randint(1, 3))]
+    if origin is dict:
+        return {}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _synthesize(annotation, messages, rng)
+    if annotation is bool:
+        return rng.random() < 0.5
+    if annotation is int:
+        return rng.randint(1, 20)
+    if annotation is float:
+        return round(rng.uniform(0, 1), 3)
+    if "content" in name:
+        # Fields such as DetectionResult.email_content carry the original input forward
+        return _last_user_text(messages)
+    return f"Mock {name.replace('_', ' ')} #{rng.randint(1000, 9999)}"
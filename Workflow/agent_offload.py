@@ -0,0 +1,165 @@
+# Executors that run CPU-bound functions in a process or thread pool instead of on the event loop
+import asyncio
+import importlib
+import inspect
+import os
+import pickle
+import typing
+from collections.abc import Callable
+from concurrent.futures import Executor as PoolExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Literal, overload
+
+from agent_framework import Executor, WorkflowContext
+
+PoolKind = Literal["process", "thread"]
+
+# Out-of-band pickle buffers at least this large go through shared memory instead of the worker pipe
+SHARED_MEMORY_THRESHOLD = 1 << 20
+
+_pools: dict[PoolKind, PoolExecutor] = {}
+
+def get_pool(kind: PoolKind) -> PoolExecutor:
+    """The pool of the given kind shared by every offloaded executor in the process, created on first use."""
+    pool = _pools.get(kind)
+    if pool is None:
+        workers = os.cpu_count() or 1
+        pool = _pools[kind] = ProcessPoolExecutor(max_workers=workers) if kind == "process" else ThreadPoolExecutor(max_workers=workers)
+    return pool
+
+def shutdown_pools() -> None:
+    """Stop the shared pools, for example before exiting a long-running service."""
+    while _pools:
+        _, pool = _pools.popitem()
+        pool.shutdown(cancel_futures=True)
+
+class OffloadExecutor(Executor):
+    """Executor that runs a pure function `func(message) -> result` in a pool and sends its result on.
+
+    With `pool="process"` the function runs in another process, so CPU-bound work uses another core and
+    does not block the other executors and workflows on the event loop; fan-out branches then run in
+    parallel. The function must be defined at module level and the message and result must be picklable.
+    Messages are pickled with protocol 5: large out-of-band buffers (bytearray, PickleBuffer, NumPy
+    arrays) are placed in shared memory rather than copied through the pool's pipe. `pool="thread"` avoids
+    pickling and suits functions that release the GIL (I/O, compression, NumPy).
+
+    Messages with fewer than `inline_below` items run on the event loop, where they are quicker than the
+    trip to the pool. The message type is declared as annotated for the graph validation, but the handler
+    is registered for its bare container type (`list` for `list[int]`): the framework checks every item of
+    a parameterized container on the event loop each time it routes the message, which for large messages
+    costs more than the work being offloaded.
+    """
+
+    def __init__(self, func: Callable[[Any], Any], pool: PoolKind = "process", inline_below: int = 0, id: str | None = None):
+        super().__init__(id=id or func.__name__, type="OffloadExecutor", defer_discovery=True)
+        hints = typing.get_type_hints(func)
+        parameters = list(inspect.signature(func).parameters.values())
+        if not parameters or parameters[0].name not in hints or any(p.default is p.empty for p in parameters[1:]):
+            raise ValueError(f"Offloaded function {func.__name__} must take an annotated message (message: T), other parameters need defaults.")
+        self.func = func
+        self.pool = pool
+        self.inline_below = inline_below
+        self._message_type = hints[parameters[0].name]
+        result_type = hints.get("return")
+        self._register_instance_handler(
+            name=func.__name__,
+            func=self._run,
+            message_type=typing.get_origin(self._message_type) or self._message_type,
+            ctx_annotation=WorkflowContext[result_type] if result_type is not None else WorkflowContext,
+            output_types=[result_type] if result_type not in (None, type(None)) else [],
+            workflow_output_types=[],
+        )
+
+    @property
+    def input_types(self) -> list[type[Any]]:
+        return [self._message_type]
+
+    async def _run(self, message: Any, ctx: WorkflowContext[Any]) -> None:
+        if self.inline_below and hasattr(message, "__len__") and len(message) < self.inline_below:
+            result = self.func(message)
+        elif self.pool == "thread":
+            result = await asyncio.get_running_loop().run_in_executor(get_pool("thread"), self.func, message)
+        else:
+            result = await _run_in_process(self.func, message)
+        if result is not None:
+            await ctx.send_message(result)
+
+@overload
+def offload(func: Callable[[Any], Any]) -> OffloadExecutor: ...
+
+@overload
+def offload(*, id: str | None = None, pool: PoolKind = "process", inline_below: int = 0) -> Callable[[Callable[[Any], Any]], OffloadExecutor]: ...
+
+def offload(
+    func: Callable[[Any], Any] | None = None, *, id: str | None = None, pool: PoolKind = "process", inline_below: int = 0
+) -> Callable[[Callable[[Any], Any]], OffloadExecutor] | OffloadExecutor:
+    """Decorator like @executor for a pure function whose return value is sent on, run in a pool.
+
+    Example:
+        @offload(id="checksum", pool="process")
+        def checksum(data: bytes) -> str:
+            return hashlib.sha256(data).hexdigest()
+    """
+    def wrapper(func: Callable[[Any], Any]) -> OffloadExecutor:
+        return OffloadExecutor(func, pool=pool, inline_below=inline_below, id=id)
+
+    if func is not None:
+        return wrapper(func)
+    return wrapper
+
+async def _run_in_process(func: Callable[[Any], Any], message: Any) -> Any:
+    buffers: list[pickle.PickleBuffer] = []
+    payload = pickle.dumps(message, protocol=5, buffer_callback=buffers.append)
+    blocks: list[shared_memory.SharedMemory] = []
+    transported: list[bytes | tuple[str, int]] = []
+    try:
+        for buffer in buffers:
+            raw = buffer.raw()
+            if raw.nbytes < SHARED_MEMORY_THRESHOLD:
+                transported.append(bytes(raw))
+                continue
+            block = shared_memory.SharedMemory(create=True, size=raw.nbytes)
+            blocks.append(block)
+            block.buf[:raw.nbytes] = raw
+            transported.append((block.name, raw.nbytes))
+        # The function is sent by name: a decorated function's module attribute is its OffloadExecutor
+        future = get_pool("process").submit(_call_in_worker, func.__module__, func.__qualname__, payload, transported)
+        return await asyncio.wrap_future(future)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+def _call_in_worker(module: str, qualname: str, payload: bytes, transported: list[bytes | tuple[str, int]]) -> Any:
+    target: Any = importlib.import_module(module)
+    for name in qualname.split("."):
+        target = getattr(target, name)
+    func = target.func if isinstance(target, OffloadExecutor) else target
+
+    blocks: list[shared_memory.SharedMemory] = []
+    buffers: list[Any] = []
+    for item in transported:
+        if isinstance(item, bytes):
+            buffers.append(item)
+        else:
+            name, size = item
+            # track=False: the parent owns the block and unlinks it
+            block = shared_memory.SharedMemory(name=name, track=False) if _SHARED_MEMORY_TRACK else shared_memory.SharedMemory(name=name)
+            blocks.append(block)
+            buffers.append(block.buf[:size])
+    message = None
+    try:
+        message = pickle.loads(payload, buffers=buffers)
+        return func(message)
+    finally:
+        # Views of the blocks must be released before the blocks can be closed
+        message = buffers = None
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                # The result still references the block; it is released with the result
+                pass
+
+# SharedMemory(track=...) exists from Python 3.13; before that the worker's resource tracker registers the block too
+_SHARED_MEMORY_TRACK = "track" in inspect.signature(shared_memory.SharedMemory).parameters
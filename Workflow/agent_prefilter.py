@@ -0,0 +1,202 @@
+# Cheap local pre-classification in front of an agent executor
+import math
+import re
+from collections import Counter
+from collections.abc import AsyncIterable, Callable, Iterable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+from pydantic import BaseModel
+
+from agent_framework import (
+    AgentExecutor,
+    AgentProtocol,
+    AgentRunResponse,
+    AgentRunResponseUpdate,
+    AgentThread,
+    ChatMessage,
+    Role,
+)
+from agent_delegation import DelegatingAgent, add_to_thread, as_messages, stream_response
+
+@dataclass
+class Prediction:
+    """Label picked by a pre-classifier, with its confidence between 0 and 1."""
+    label: str
+    confidence: float
+    reason: str = ""
+
+# A pre-classifier receives the text of the request and returns a prediction, or None when it has no opinion
+PreClassifier = Callable[[str], Prediction | None]
+
+@dataclass
+class Rule:
+    """A regular expression that is evidence for `label`; `weight` is the confidence a single match gives."""
+    pattern: str
+    label: str
+    weight: float
+    reason: str
+    flags: int = re.IGNORECASE
+    compiled: re.Pattern[str] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.compiled = re.compile(self.pattern, self.flags)
+
+class RuleClassifier:
+    """Scores each label by the rules that match the text and predicts the best one.
+
+    The weights of the matching rules of a label are combined as independent evidence
+    (1 - (1 - w1) * (1 - w2) * ...), so several weak signals add up to a confident prediction
+    while a single weak one does not.
+    """
+
+    def __init__(self, rules: Sequence[Rule]):
+        self.rules = list(rules)
+
+    def __call__(self, text: str) -> Prediction | None:
+        doubt: dict[str, float] = {}
+        reasons: dict[str, list[str]] = {}
+        for rule in self.rules:
+            if rule.compiled.search(text):
+                doubt[rule.label] = doubt.get(rule.label, 1.0) * (1.0 - rule.weight)
+                reasons.setdefault(rule.label, []).append(rule.reason)
+        if not doubt:
+            return None
+        label = min(doubt, key=doubt.get)
+        return Prediction(label, 1.0 - doubt[label], "Matched rules: " + ", ".join(reasons[label]) + ".")
+
+# Signals of the bulk scam and lottery emails that make up most spam; none is conclusive on its own
+SPAM_RULES = [
+    Rule(r"\b(you('ve| have)? won|winners?|congratulations)\b", "spam", 0.5, "prize announcement"),
+    Rule(r"\b(lottery|jackpot|grand prize)\b", "spam", 0.6, "lottery"),
+    Rule(r"\bclaim (your|the)? ?(prize|winnings|reward|now)\b", "spam", 0.6, "asks to claim a prize"),
+    Rule(r"\b(click here|act (now|fast)|limited time|expires tonight)\b", "spam", 0.5, "pressure to act"),
+    Rule(r"\b(bank account details|wire transfer|processing fee|western union)\b", "spam", 0.7, "asks for money or bank details"),
+    Rule(r"\$\s?\d{1,3}(,\d{3}){2,}", "spam", 0.4, "large sum of money"),
+    Rule(r"\b(verify|confirm) your (account|identity|password)\b", "spam", 0.3, "asks to verify an account"),
+    Rule(r"(!\s*){3,}|\b[A-Z]{4,}( [A-Z]{4,}){2,}\b", "spam", 0.2, "shouting", flags=0),
+]
+
+class NaiveBayesClassifier:
+    """Small multinomial naive Bayes text classifier for labeled examples, trained in memory in milliseconds.
+
+    Example:
+        classifier = NaiveBayesClassifier().fit(texts, labels)
+        prediction = classifier("You have WON a prize")
+    """
+
+    TOKEN_PATTERN = re.compile(r"[a-z0-9$']+")
+
+    def __init__(self, smoothing: float = 1.0):
+        self.smoothing = smoothing
+        self._label_counts: Counter[str] = Counter()
+        self._token_counts: dict[str, Counter[str]] = {}
+        self._vocabulary: set[str] = set()
+
+    def fit(self, texts: Iterable[str], labels: Iterable[str]) -> "NaiveBayesClassifier":
+        """Add labeled examples. Can be called again to learn from more examples."""
+        for text, label in zip(texts, labels, strict=True):
+            tokens = self._tokenize(text)
+            self._label_counts[label] += 1
+            self._token_counts.setdefault(label, Counter()).update(tokens)
+            self._vocabulary.update(tokens)
+        return self
+
+    def __call__(self, text: str) -> Prediction | None:
+        if not self._label_counts:
+            return None
+        total = sum(self._label_counts.values())
+        tokens = [token for token in self._tokenize(text) if token in self._vocabulary]
+        scores: dict[str, float] = {}
+        for label, count in self._label_counts.items():
+            counts = self._token_counts[label]
+            denominator = sum(counts.values()) + self.smoothing * len(self._vocabulary)
+            scores[label] = math.log(count / total) + sum(
+                math.log((counts[token] + self.smoothing) / denominator) for token in tokens
+            )
+        # Softmax of the log likelihoods gives the posterior of each label
+        best = max(scores, key=scores.get)
+        posterior = 1.0 / sum(math.exp(score - scores[best]) for score in scores.values())
+        return Prediction(best, posterior, f"Naive Bayes classifier ({len(tokens)} known words).")
+
+    def _tokenize(self, text: str) -> list[str]:
+        return self.TOKEN_PATTERN.findall(text.lower())
+
+class PreFilteredAgent(DelegatingAgent):
+    """Agent that asks a cheap local classifier first and only calls the wrapped agent when it is unsure.
+
+    When the classifier's prediction reaches `threshold` and `to_result(prediction, text)` returns a model,
+    the answer is that model as the agent's structured output: a response with the model as JSON text and
+    as `value`, exactly what the agent would have returned. Every other request is forwarded to the agent;
+    `to_result` returns None for labels that should always get the agent's opinion.
+
+    `classified` and `forwarded` count the requests answered by the classifier and by the agent.
+    """
+
+    def __init__(
+        self,
+        agent: AgentProtocol,
+        classifier: PreClassifier,
+        to_result: Callable[[Prediction, str], BaseModel | None],
+        threshold: float = 0.9,
+    ):
+        super().__init__(agent)
+        self.classifier = classifier
+        self.to_result = to_result
+        self.threshold = threshold
+        self.classified = 0
+        self.forwarded = 0
+
+    async def run(self, messages: Any = None, *, thread: AgentThread | None = None, **kwargs: Any) -> AgentRunResponse:
+        response = await self._classify(as_messages(messages), thread)
+        if response is None:
+            return await super().run(messages, thread=thread, **kwargs)
+        return response
+
+    async def run_stream(self, messages: Any = None, *, thread: AgentThread | None = None, **kwargs: Any) -> AsyncIterable[AgentRunResponseUpdate]:
+        response = await self._classify(as_messages(messages), thread)
+        updates = super().run_stream(messages, thread=thread, **kwargs) if response is None else stream_response(response)
+        async for update in updates:
+            yield update
+
+    async def _classify(self, messages: list[ChatMessage], thread: AgentThread | None) -> AgentRunResponse | None:
+        text = "\n".join(message.text for message in messages if message.role == Role.USER and message.text)
+        prediction = self.classifier(text)
+        result = self.to_result(prediction, text) if prediction is not None and prediction.confidence >= self.threshold else None
+        if result is None:
+            self.forwarded += 1
+            return None
+
+        self.classified += 1
+        response = AgentRunResponse(
+            messages=[ChatMessage(role=Role.ASSISTANT, text=result.model_dump_json(), author_name="pre_classifier")],
+            value=result,
+            additional_properties={"pre_classifier": prediction.label, "confidence": prediction.confidence},
+        )
+        await add_to_thread(thread, messages, response)
+        return response
+
+class PreFilteredAgentExecutor(AgentExecutor):
+    """AgentExecutor of a PreFilteredAgent: the classifier answers the requests it is sure about.
+
+    The executor keeps the agent's id, so the edges, conditions and switch cases after it do not change,
+    and a classified request emits the same events and AgentExecutorResponse as an agent call.
+    """
+
+    def __init__(
+        self,
+        agent: AgentProtocol,
+        classifier: PreClassifier,
+        to_result: Callable[[Prediction, str], BaseModel | None],
+        threshold: float = 0.9,
+        **kwargs: Any,
+    ):
+        self.prefilter = PreFilteredAgent(agent, classifier, to_result, threshold)
+        super().__init__(self.prefilter, **kwargs)
+
+    @property
+    def classified(self) -> int:
+        return self.prefilter.classified
+
+    @property
+    def forwarded(self) -> int:
+        return self.prefilter.forwarded
@@ -0,0 +1,200 @@
+# Provider prompt caching: stable instruction prefixes and cached-token reporting per agent
+import asyncio
+import hashlib
+import inspect
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterable, Awaitable, Callable
+from dataclasses import dataclass, field
+
+from agent_framework import (
+    ChatContext,
+    ChatMiddleware,
+    ChatResponse,
+    ChatResponseUpdate,
+    UsageContent,
+    UsageDetails,
+)
+from agent_response_cache import drop_prepended_instructions
+
+# Additional usage count in which the OpenAI and Azure OpenAI chat clients report the prompt tokens served from cache
+CACHED_TOKENS_KEY = "prompt/cached_tokens"
+
+# OpenAI and Azure OpenAI only cache prompts of at least this many tokens, in increments of 128 tokens
+MIN_CACHED_PROMPT_TOKENS = 1024
+
+# Prefixes whose first request is remembered for warm-up; the oldest are forgotten beyond this
+MAX_WARM_PREFIXES = 256
+
+@dataclass
+class PromptCacheStats:
+    """Prompt cache usage of one agent (or of a whole run)."""
+    calls: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    short_prompts: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of the input tokens that were served from the provider's prompt cache."""
+        return self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+    def add(self, usage: UsageDetails | None, elapsed: float) -> None:
+        self.calls += 1
+        self.elapsed += elapsed
+        if usage is not None:
+            self.input_tokens += usage.input_token_count or 0
+            self.cached_tokens += usage.additional_counts.get(CACHED_TOKENS_KEY, 0)
+            # Prompts below the provider minimum are never cached, whatever their prefix
+            self.short_prompts += (usage.input_token_count or 0) < MIN_CACHED_PROMPT_TOKENS
+
+class WarmPrefixes:
+    """The prefixes already sent by a group of agents, for the warm-up of PromptPrefixMiddleware.
+
+    Each prefix maps to an event set once its first request has been processed; only the `max_prefixes`
+    most recent are kept, so a forgotten prefix is simply warmed up again.
+    """
+
+    def __init__(self, max_prefixes: int = MAX_WARM_PREFIXES):
+        self.max_prefixes = max_prefixes
+        self._events: OrderedDict[str, asyncio.Event] = OrderedDict()
+
+    async def warm_up(self, prefix_hash: str, timeout: float) -> asyncio.Event | None:
+        """Returns the event to set when this request is the first one for the prefix, else waits for the first one."""
+        if timeout <= 0:
+            return None
+        event = self._events.get(prefix_hash)
+        if event is None:
+            event = self._events[prefix_hash] = asyncio.Event()
+            if len(self._events) > self.max_prefixes:
+                self._events.popitem(last=False)
+            return event
+        self._events.move_to_end(prefix_hash)
+        if not event.is_set():
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return None
+
+@dataclass
+class PromptCacheReport:
+    """Collects the prompt cache usage of every agent that shares it; use one report per run.
+
+    The agents that share a report also share their warm-up, so only the first of them waits for a new prefix.
+    """
+    agents: dict[str, PromptCacheStats] = field(default_factory=dict)
+    warm_prefixes: WarmPrefixes = field(default_factory=WarmPrefixes)
+
+    def record(self, agent_name: str, usage: UsageDetails | None, elapsed: float) -> None:
+        self.agents.setdefault(agent_name, PromptCacheStats()).add(usage, elapsed)
+
+    @property
+    def total(self) -> PromptCacheStats:
+        total = PromptCacheStats()
+        for stats in self.agents.values():
+            total.calls += stats.calls
+            total.input_tokens += stats.input_tokens
+            total.cached_tokens += stats.cached_tokens
+            total.short_prompts += stats.short_prompts
+            total.elapsed += stats.elapsed
+        return total
+
+    def format(self) -> str:
+        """Table of calls, input tokens, cached tokens, hit ratio, prompts too short to cache and model time per agent."""
+        rows = [*self.agents.items(), ("total", self.total)]
+        width = max(len(name) for name, _ in rows)
+        lines = [f"{'agent':<{width}}  calls  input tokens  cached tokens  cached  too short  seconds"]
+        for name, stats in rows:
+            lines.append(
+                f"{name:<{width}}  {stats.calls:>5}  {stats.input_tokens:>12}  {stats.cached_tokens:>13}  "
+                f"{stats.hit_ratio:>6.0%}  {stats.short_prompts:>9}  {stats.elapsed:>7.2f}"
+            )
+        return "\n".join(lines)
+
+class PromptPrefixMiddleware(ChatMiddleware):
+    """Chat middleware that keeps an agent's instructions a byte-identical prefix of every request.
+
+    Providers cache the longest previously seen prefix of a prompt, so agents that share a block of
+    instructions only benefit when the block starts the request with exactly the same text. This
+    middleware sends the instructions once, as the first message, with the indentation of triple-quoted
+    strings removed so the same block defined in different places produces the same bytes.
+
+    `prompt_cache_key=True` also sends a hash of the instructions as the OpenAI `prompt_cache_key`, which
+    routes requests with the same prefix to the same cache. Requests sent at the same moment all miss the
+    cache, because it is written once the first of them is processed: with `warm_up_timeout`, the first
+    request for a new prefix goes alone and the others wait for it (at most that many seconds), as long as
+    the prompt is long enough to be cached at all (MIN_CACHED_PROMPT_TOKENS); shorter prompts never wait.
+
+    With a `report`, the cached-token count of every call is recorded under `name`, and the warm-up is
+    shared with the other agents of the report; without one it only covers this agent.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        report: PromptCacheReport | None = None,
+        prompt_cache_key: bool = False,
+        warm_up_timeout: float = 0.0,
+    ):
+        self.name = name
+        self.report = report
+        self.prompt_cache_key = prompt_cache_key
+        self.warm_up_timeout = warm_up_timeout
+        self.warm_prefixes = report.warm_prefixes if report is not None else WarmPrefixes()
+
+    async def process(self, context: ChatContext, next: Callable[[ChatContext], Awaitable[None]]) -> None:
+        instructions = context.chat_options.instructions
+        if instructions:
+            drop_prepended_instructions(context)
+            context.chat_options.instructions = inspect.cleandoc(instructions)
+            prefix_hash = hashlib.sha256(context.chat_options.instructions.encode()).hexdigest()[:32]
+            if self.prompt_cache_key:
+                context.chat_options.additional_properties["prompt_cache_key"] = prefix_hash
+            # Waiting only pays off for prompts long enough to be cached (about four characters per token)
+            prompt_length = len(context.chat_options.instructions) + sum(len(message.text or "") for message in context.messages)
+            timeout = self.warm_up_timeout if prompt_length // 4 >= MIN_CACHED_PROMPT_TOKENS else 0.0
+            warmed = await self.warm_prefixes.warm_up(prefix_hash, timeout)
+        else:
+            warmed = None
+
+        start = time.perf_counter()
+        try:
+            await next(context)
+        except BaseException:
+            if warmed is not None:
+                warmed.set()
+            raise
+
+        def record(usage: UsageDetails | None) -> None:
+            if warmed is not None:
+                warmed.set()
+            if self.report is not None:
+                self.report.record(self.name, usage, time.perf_counter() - start)
+
+        if context.is_streaming:
+            context.result = _record_usage(context.result, warmed, record)
+        elif isinstance(context.result, ChatResponse):
+            record(context.result.usage_details)
+        else:
+            record(None)
+
+async def _record_usage(
+    stream: AsyncIterable[ChatResponseUpdate] | None,
+    warmed: asyncio.Event | None,
+    record: Callable[[UsageDetails | None], None],
+) -> AsyncIterable[ChatResponseUpdate]:
+    usage: UsageDetails | None = None
+    try:
+        if stream is not None:
+            async for update in stream:
+                # The prompt has been processed, and cached, once the first update arrives
+                if warmed is not None:
+                    warmed.set()
+                for content in update.contents:
+                    if isinstance(content, UsageContent):
+                        usage = content.details if usage is None else usage + content.details
+                yield update
+    finally:
+        record(usage)
@@ -0,0 +1,489 @@
+# Response cache for chat clients, used as chat middleware on agents
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterable, Awaitable, Callable, MutableSequence, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Protocol
+from pydantic import BaseModel
+
+from agent_framework import (
+    ChatContext,
+    ChatMessage,
+    ChatMiddleware,
+    ChatOptions,
+    ChatResponse,
+    ChatResponseUpdate,
+    Role,
+    TextContent,
+)
+
+logger = logging.getLogger(__name__)
+
+# Chat options that change the answer; everything else (user, store, metadata, ...) is left out of the key
+KEY_OPTIONS = ("temperature", "top_p", "max_tokens", "seed", "stop", "frequency_penalty", "presence_penalty", "tool_choice")
+
+# An embedding function turns the prompt text into a vector; it may be async (for example a provider embedding call)
+EmbeddingFunction = Callable[[str], Sequence[float] | Awaitable[Sequence[float]]]
+
+class CacheBackend(Protocol):
+    """Storage of cached responses. Backends evict expired entries and the least recently used ones beyond `max_bytes`."""
+
+    def get(self, key: str) -> bytes | None: ...
+
+    def set(self, key: str, value: bytes, ttl: float | None) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+class MemoryCacheBackend:
+    """In-process LRU cache, limited to `max_bytes` of serialized responses."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[bytes, float | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float | None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, time.time() + ttl if ttl is not None else None)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+class SQLiteCacheBackend:
+    """Cache in a SQLite file, shared by processes on the same machine and kept across restarts."""
+
+    def __init__(self, path: str | Path, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._connection.commit()
+
+    def get(self, key: str) -> bytes | None:
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._connection.commit()
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            return row[0]
+
+    def set(self, key: str, value: bytes, ttl: float | None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + ttl if ttl is not None else None, now),
+            )
+            self._connection.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            self._evict()
+            self._connection.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._connection.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _evict(self) -> None:
+        size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        # Drop the least recently used entries until the rest fits
+        dropped: list[str] = []
+        for key, entry_size in self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if size <= self.max_bytes:
+                break
+            dropped.append(key)
+            size -= entry_size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in dropped])
+
+class DiskCacheBackend:
+    """Cache with one file per response in a folder. The file modification time records the last use."""
+
+    _EXPIRY = struct.Struct("<d")
+
+    def __init__(self, folder: str | Path, max_bytes: int = 512 * 1024 * 1024):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.size = sum(path.stat().st_size for path in self.folder.glob("*.response"))
+
+    def get(self, key: str) -> bytes | None:
+        path = self._get_path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        (expires_at,) = self._EXPIRY.unpack_from(data)
+        if expires_at and expires_at <= time.time():
+            self.delete(key)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another writer in the meantime; the data read is still valid
+            pass
+        return data[self._EXPIRY.size:]
+
+    def set(self, key: str, value: bytes, ttl: float | None) -> None:
+        data = self._EXPIRY.pack(time.time() + ttl if ttl is not None else 0.0) + value
+        if len(data) > self.max_bytes:
+            return
+        path = self._get_path(key)
+        temp_path = path.with_suffix(".tmp")
+        with self._lock:
+            self.size -= self._get_size(path)
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        path = self._get_path(key)
+        with self._lock:
+            size = self._get_size(path)
+            path.unlink(missing_ok=True)
+            self.size -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in self.folder.glob("*.response"):
+                path.unlink(missing_ok=True)
+            self.size = 0
+
+    def _evict(self) -> None:
+        files = sorted((path.stat().st_mtime, path) for path in self.folder.glob("*.response"))
+        for _, path in files:
+            if self.size <= self.max_bytes:
+                break
+            size = self._get_size(path)
+            path.unlink(missing_ok=True)
+            self.size -= size
+
+    def _get_path(self, key: str) -> Path:
+        return self.folder / f"{key}.response"
+
+    def _get_size(self, path: Path) -> int:
+        try:
+            return path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+def hashed_ngram_embedding(text: str, dimensions: int = 512, n: int = 3) -> list[float]:
+    """Local embedding of the character n-grams of the text, hashed into `dimensions` buckets.
+
+    It needs no model and is good at recognizing the same prompt with small edits (whitespace,
+    punctuation, a changed name or number); use a provider embedding for paraphrases.
+    """
+    vector = [0.0] * dimensions
+    text = f" {normalize_text(text).lower()} "
+    for index in range(len(text) - n + 1):
+        digest = hashlib.blake2b(text[index:index + n].encode(), digest_size=4).digest()
+        vector[int.from_bytes(digest, "little") % dimensions] += 1.0
+    return vector
+
+@dataclass
+class _IndexEntry:
+    key: str
+    vector: list[float]
+
+class EmbeddingIndex:
+    """Finds cached prompts whose user messages embed within `threshold` cosine similarity of a new prompt's.
+
+    Only prompts with the same client, model, instructions, tools, response format and options are compared, since a
+    similar question asked with different settings needs its own answer. The index lives in memory and
+    keeps the `max_entries` most recent prompts; entries whose response was evicted are skipped.
+    """
+
+    def __init__(self, embed: EmbeddingFunction = hashed_ngram_embedding, threshold: float = 0.95, max_entries: int = 10_000):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._scopes: dict[str, list[_IndexEntry]] = {}
+        self._count = 0
+
+    async def get_vector(self, text: str) -> list[float]:
+        vector = self.embed(text)
+        if isinstance(vector, Awaitable):
+            vector = await vector
+        norm = math.sqrt(math.fsum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def search(self, scope: str, vector: list[float]) -> list[str]:
+        """Keys of the entries above the threshold, most similar first."""
+        matches = []
+        for entry in self._scopes.get(scope, []):
+            similarity = math.fsum(a * b for a, b in zip(entry.vector, vector))
+            if similarity >= self.threshold:
+                matches.append((similarity, entry.key))
+        return [key for _, key in sorted(matches, reverse=True)]
+
+    def add(self, scope: str, key: str, vector: list[float]) -> None:
+        self._scopes.setdefault(scope, []).append(_IndexEntry(key, vector))
+        self._count += 1
+        if self._count > self.max_entries:
+            # Drop the oldest entry of the largest scope
+            oldest = max(self._scopes.values(), key=len)
+            oldest.pop(0)
+            self._count -= 1
+
+    def remove(self, scope: str, key: str) -> None:
+        entries = self._scopes.get(scope, [])
+        for index, entry in enumerate(entries):
+            if entry.key == key:
+                del entries[index]
+                self._count -= 1
+                return
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of whitespace, so prompts that only differ in spacing share a cache entry."""
+    return re.sub(r"\s+", " ", text).strip()
+
+def get_cache_scope(chat_options: ChatOptions, chat_client: Any = None) -> dict[str, Any]:
+    """Everything but the messages that determines the answer: client and model, instructions, tools, response format and options."""
+    response_format = chat_options.response_format
+    if isinstance(response_format, type) and issubclass(response_format, BaseModel):
+        response_format = response_format.model_json_schema()
+    return {
+        "client": _describe_client(chat_client, chat_options),
+        "instructions": normalize_text(chat_options.instructions or ""),
+        "tools": [_describe_tool(tool) for tool in chat_options.tools or []],
+        "response_format": response_format,
+        **{name: getattr(chat_options, name, None) for name in KEY_OPTIONS},
+    }
+
+def get_cache_key(messages: Sequence[ChatMessage], chat_options: ChatOptions, chat_client: Any = None) -> str:
+    """Hash of the normalized request: scope plus the role and contents of every message."""
+    payload = {"scope": get_cache_scope(chat_options, chat_client), "messages": [_describe_message(message) for message in messages]}
+    return _hash(payload)
+
+class ResponseCacheMiddleware(ChatMiddleware):
+    """Chat middleware that answers repeated requests from a cache instead of calling the model.
+
+    Requests are keyed on the chat client (its type, model or deployment and endpoint) and their normalized
+    instructions, messages, tools, response format and sampling options, so one cache can serve several
+    clients without mixing their answers; an exact match is served from `backend` (MemoryCacheBackend, SQLiteCacheBackend,
+    DiskCacheBackend or your own). With an `index`, a request without an exact match is also answered by
+    the response of a cached prompt with the same settings whose user messages are within the similarity
+    threshold. A near match is not the same question, so only use an index where a slightly different
+    answer is acceptable. Entries expire after `ttl` seconds
+    (None keeps them until evicted). Streaming requests are cached as well; a hit is replayed as one update.
+
+    Cached responses carry `additional_properties["cache"]` = "hit" or "similar". Only use a cache where
+    the same prompt may get the same answer: with a high temperature every call is expected to differ.
+
+    Example:
+        cache = ResponseCacheMiddleware(SQLiteCacheBackend("cache/responses.sqlite"), ttl=24 * 3600)
+        agent = chat_client.create_agent(instructions="...", middleware=[cache])
+    """
+
+    def __init__(self, backend: CacheBackend | None = None, ttl: float | None = 3600.0, index: EmbeddingIndex | None = None):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+        self.index = index
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    async def process(self, context: ChatContext, next: Callable[[ChatContext], Awaitable[None]]) -> None:
+        key = get_cache_key(context.messages, context.chat_options, context.chat_client)
+        response = self._load(key, context.chat_options, "hit")
+        scope = vector = None
+        if response is None and self.index is not None:
+            scope = _hash(get_cache_scope(context.chat_options, context.chat_client))
+            vector = await self.index.get_vector(_get_prompt_text(context.messages))
+            for similar_key in self.index.search(scope, vector):
+                response = self._load(similar_key, context.chat_options, "similar")
+                if response is not None:
+                    break
+                # The backend evicted or expired this response
+                self.index.remove(scope, similar_key)
+            self.similar_hits += response is not None
+        elif response is not None:
+            self.hits += 1
+
+        if response is not None:
+            context.result = _replay(response) if context.is_streaming else response
+            return
+
+        self.misses += 1
+        drop_prepended_instructions(context)
+        await next(context)
+
+        def store(result: ChatResponse) -> None:
+            self._store(key, result)
+            if self.index is not None:
+                self.index.add(scope, key, vector)
+
+        if context.is_streaming:
+            context.result = _record(context.result, context.chat_options, store)
+        elif isinstance(context.result, ChatResponse):
+            store(context.result)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def _load(self, key: str, chat_options: ChatOptions, kind: str) -> ChatResponse | None:
+        data = self.backend.get(key)
+        if data is None:
+            return None
+        try:
+            response = ChatResponse.from_dict(json.loads(data))
+        except Exception as error:
+            logger.warning(f"Dropping unreadable cached response {key}: {error}")
+            self.backend.delete(key)
+            return None
+        if isinstance(chat_options.response_format, type):
+            response.try_parse_value(output_format_type=chat_options.response_format)
+        response.additional_properties = {**(response.additional_properties or {}), "cache": kind}
+        return response
+
+    def _store(self, key: str, response: ChatResponse) -> None:
+        # Truncated or filtered answers are not worth repeating
+        if response.finish_reason is not None and response.finish_reason.value not in ("stop", "tool_calls"):
+            return
+        response_dict = response.to_dict(exclude={"raw_representation"})
+        # The parsed structured output is rebuilt from the text when the entry is loaded
+        response_dict.pop("value", None)
+        data = json.dumps(response_dict, default=str).encode()
+        self.backend.set(key, data, self.ttl)
+
+async def _replay(response: ChatResponse) -> AsyncIterable[ChatResponseUpdate]:
+    for message in response.messages:
+        yield ChatResponseUpdate(
+            contents=message.contents,
+            role=message.role,
+            response_id=response.response_id,
+            model_id=response.model_id,
+            finish_reason=response.finish_reason,
+            additional_properties=response.additional_properties,
+        )
+
+async def _record(
+    stream: AsyncIterable[ChatResponseUpdate] | None,
+    chat_options: ChatOptions,
+    store: Callable[[ChatResponse], None],
+) -> AsyncIterable[ChatResponseUpdate]:
+    if stream is None:
+        return
+    updates: list[ChatResponseUpdate] = []
+    async for update in stream:
+        updates.append(update)
+        yield update
+    # Only a stream that was read to the end is cached
+    store(ChatResponse.from_chat_response_updates(updates))
+
+def drop_prepended_instructions(context: ChatContext) -> None:
+    """Remove the instructions that the middleware pipeline prepended as a system message.
+
+    The chat client prepends them again, so without this the model receives the instructions twice;
+    every chat middleware that calls `next` with the instructions still in the chat options needs it.
+    """
+    messages = context.messages
+    instructions = context.chat_options.instructions
+    if instructions and messages and str(messages[0].role) == "system" and messages[0].text == instructions:
+        context.messages = messages[1:]
+
+def _describe_client(chat_client: Any, chat_options: ChatOptions) -> dict[str, Any]:
+    # The chat options only carry a model id when the caller overrides it; otherwise the client's is used
+    client_type = type(chat_client)
+    return {
+        "type": f"{client_type.__module__}.{client_type.__qualname__}" if chat_client is not None else None,
+        "model_id": chat_options.model_id or getattr(chat_client, "model_id", None),
+        "endpoint": getattr(chat_client, "endpoint", None),
+    }
+
+def _describe_message(message: ChatMessage) -> list[Any]:
+    contents = []
+    for content in message.contents:
+        if isinstance(content, TextContent):
+            contents.append(normalize_text(content.text))
+        else:
+            contents.append(content.to_dict(exclude={"raw_representation", "additional_properties"}))
+    return [str(message.role), contents]
+
+def _describe_tool(tool: Any) -> Any:
+    if isinstance(tool, dict):
+        return tool
+    parameters = getattr(tool, "parameters", None)
+    return {
+        "name": getattr(tool, "name", getattr(tool, "__name__", repr(tool))),
+        "description": getattr(tool, "description", getattr(tool, "__doc__", None)),
+        "parameters": parameters() if callable(parameters) else parameters,
+    }
+
+def _get_prompt_text(messages: MutableSequence[ChatMessage]) -> str:
+    # Only the user turns are compared: the instructions prepended as a system message are in the scope
+    # already and would make every prompt of an agent look alike
+    return "\n".join(message.text for message in messages if message.role == Role.USER and message.text)
+
+def _hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
@@ -0,0 +1,198 @@
+# Keyed routing for WorkflowBuilder edge groups
+import enum
+import logging
+from collections.abc import Callable, Hashable, Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any, Literal, get_args, get_origin
+from agent_framework import AgentProtocol, Executor, WorkflowBuilder, WorkflowContext, handler
+
+logger = logging.getLogger(__name__)
+
+Target = Executor | AgentProtocol
+
+@dataclass
+class KeyCase:
+    """Routes the messages whose key equals `key` to `target`."""
+    key: Hashable
+    target: Target
+
+def add_keyed_switch_case_edge_group(
+    builder: WorkflowBuilder,
+    source: Target,
+    key: Callable[[Any], Hashable],
+    cases: Mapping[Hashable, Target] | Sequence[KeyCase],
+    default: Target,
+    keys: Iterable[Hashable] | type | None = None,
+) -> WorkflowBuilder:
+    """Add a switch-case edge group that dispatches on `key(message)` with a hash table.
+
+    `add_switch_case_edge_group` evaluates its Case predicates one after the other; here the key is
+    computed once and looked up, so routing cost does not depend on the number of cases. Messages whose
+    key has no case, or whose key function raises, go to `default`.
+
+    `keys` lists the values the key can take: an iterable, a Literal type or an Enum class. The cases are
+    checked when the edge group is added: a key listed twice or a key outside `keys` (a case that can never
+    match) raises ValueError, and a warning is logged when every key has a case, since `default` is then
+    unreachable. Pass the cases as KeyCase items to detect duplicates; a dict literal silently keeps the last one.
+
+    Example:
+        add_keyed_switch_case_edge_group(builder, classifier, lambda m: m.spam_decision,
+                                         {"NotSpam": reply, "Spam": mark_spam}, default=review,
+                                         keys=Literal["NotSpam", "Spam", "Uncertain"])
+    """
+    pairs = list(cases.items()) if isinstance(cases, Mapping) else [(case.key, case.target) for case in cases]
+    if not pairs:
+        raise ValueError("A keyed switch-case edge group needs at least one case.")
+    domain = _get_key_domain(keys)
+
+    targets: list[Target] = []
+
+    def get_index(target: Target) -> int:
+        # Several keys may share a target; each target gets a single edge
+        for index, existing in enumerate(targets):
+            if existing is target:
+                return index
+        targets.append(target)
+        return len(targets) - 1
+
+    table: dict[Hashable, int] = {}
+    for case_key, target in pairs:
+        if case_key in table:
+            raise ValueError(f"Duplicate switch-case key {case_key!r}.")
+        if domain is not None and case_key not in domain:
+            raise ValueError(f"Switch-case key {case_key!r} can never match; the possible keys are {list(domain)}.")
+        table[case_key] = get_index(target)
+    default_index = get_index(default)
+
+    if domain is not None and all(value in table for value in domain):
+        logger.warning("Every possible key has a case, so the default target of the switch-case is unreachable.")
+
+    def keyed_switch_case(message: Any, target_ids: list[str]) -> list[str]:
+        try:
+            index = table.get(key(message), default_index)
+        except Exception as error:
+            # Same as a Case predicate that raises: fall through to the default
+            logger.warning(f"Switch-case key function failed, routing to the default target: {error}")
+            index = default_index
+        return [target_ids[index]]
+
+    return builder.add_multi_selection_edge_group(source, targets, keyed_switch_case)
+
+class MultiSelectionJoin(Executor):
+    """Optional fan-in for add_parallel_selection_edge_group.
+
+    A regular fan-in waits for a message from every source, so it never fires when the selector picks only
+    some of the branches. The join is an extra target of the selection: with each routed message it learns
+    which branches the message activated, and once each of them has sent its result, it sends a dict of
+    branch target id -> result. Messages selected one after another are joined in the same order.
+
+    The open rounds are kept in the workflow's shared state, so every run starts without any (even when a
+    previous run of the same workflow failed or was abandoned) and they are saved with the checkpoints.
+    """
+
+    def __init__(self, id: str = "multi_selection_join"):
+        super().__init__(id=id)
+        # Executor id that delivers the result of each branch -> branch target id
+        self._branch_ends: dict[str, str] = {}
+        # Routed message id -> (message, selected branch ids), until the message reaches the join
+        self._selections: dict[int, tuple[Any, list[str]]] = {}
+
+    def add_branch(self, branch_id: str, end_id: str | None = None) -> None:
+        """Declare a branch whose result is sent by `end_id` (by default the branch target itself)."""
+        self._branch_ends[end_id or branch_id] = branch_id
+
+    def expect(self, message: Any, branch_ids: list[str]) -> None:
+        """Register the branches selected for a message; the join receives the same message next."""
+        self._selections[id(message)] = (message, list(branch_ids))
+
+    @handler
+    async def collect(self, result: Any, ctx: WorkflowContext[dict[str, Any]]) -> None:
+        selection = self._selections.pop(id(result), None)
+        async with ctx.shared_state.hold() as state:
+            key = f"{self.id}.rounds"
+            # One entry per routed message: [selected branch ids, results received so far]
+            rounds: list[list[Any]] = await state.get_within_hold(key) if await state.has_within_hold(key) else []
+            if selection is not None and selection[0] is result:
+                if selection[1]:
+                    rounds.append([selection[1], {}])
+                    await state.set_within_hold(key, rounds)
+                return
+
+            source_id = ctx.source_executor_ids[0] if ctx.source_executor_ids else None
+            branch_id = self._branch_ends.get(source_id, source_id)
+            for index, (expected, results) in enumerate(rounds):
+                if branch_id in expected and branch_id not in results:
+                    results[branch_id] = result
+                    complete = len(results) == len(expected)
+                    if complete:
+                        del rounds[index]
+                    await state.set_within_hold(key, rounds)
+                    break
+            else:
+                raise RuntimeError(f"Join '{self.id}' received a result from '{source_id}' that no selection is waiting for.")
+        if complete:
+            await ctx.send_message({branch: results[branch] for branch in expected})
+
+def add_parallel_selection_edge_group(
+    builder: WorkflowBuilder,
+    source: Target,
+    targets: Sequence[Target],
+    selector: Callable[[Any], Iterable[Target | str]],
+    join: MultiSelectionJoin | None = None,
+    branch_ends: Mapping[Executor, Executor] | None = None,
+) -> WorkflowBuilder:
+    """Add a multi-selection edge group: `selector(message)` picks any number of targets (executors or ids).
+
+    Every selected target receives the message and they all run in the same superstep, concurrently.
+    With a `join`, the join also receives every routed message, each branch sends its result to it and the
+    join emits the results of the selected branches together. A branch may span several executors: `branch_ends` maps a target to the executor
+    that sends the branch's result (by default the target itself). Targets must be executors when
+    joining, because the join matches results to branches by executor id.
+    """
+    if not targets:
+        raise ValueError("A multi-selection edge group needs at least one target.")
+
+    def select(message: Any, target_ids: list[str]) -> list[str]:
+        selected = []
+        for choice in selector(message):
+            if isinstance(choice, str):
+                target_id = choice
+            else:
+                # The builder may wrap agents, so resolve targets by position rather than by object
+                positions = [index for index, target in enumerate(targets) if target is choice]
+                if not positions:
+                    raise ValueError(f"Selector returned {choice!r}, which is not a target of this edge group.")
+                target_id = target_ids[positions[0]]
+            if target_id not in selected:
+                selected.append(target_id)
+        if join is not None:
+            join.expect(message, selected)
+            selected.append(target_ids[-1])
+        return selected
+
+    if join is None:
+        return builder.add_multi_selection_edge_group(source, targets, select)
+
+    builder.add_multi_selection_edge_group(source, [*targets, join], select)
+
+    branch_ends = branch_ends or {}
+    for target in targets:
+        if not isinstance(target, Executor):
+            raise TypeError("Joined multi-selection targets must be executors; wrap agents in AgentExecutor.")
+        end = branch_ends.get(target, target)
+        join.add_branch(target.id, end.id)
+        builder.add_edge(end, join)
+    return builder
+
+def _get_key_domain(keys: Iterable[Hashable] | type | None) -> list[Hashable] | None:
+    if keys is None:
+        return None
+    if get_origin(keys) is Literal:
+        return list(get_args(keys))
+    if isinstance(keys, type) and issubclass(keys, enum.Enum):
+        return list(keys)
+    if keys is bool:
+        return [False, True]
+    if isinstance(keys, type):
+        raise ValueError(f"Cannot list the values of {keys!r}; pass a Literal type, an Enum class or the values.")
+    return list(keys)
@@ -0,0 +1,191 @@
+# Speculative execution of the likely branch behind a conditional edge
+import asyncio
+import logging
+from collections import deque
+from collections.abc import AsyncIterable, Awaitable, Callable, Sequence
+from typing import Any
+
+from agent_framework import (
+    AgentExecutor,
+    AgentExecutorRequest,
+    AgentProtocol,
+    AgentRunResponse,
+    AgentRunResponseUpdate,
+    AgentThread,
+    ChatMessage,
+    Executor,
+    WorkflowContext,
+    handler,
+)
+from agent_delegation import DelegatingAgent, add_to_thread, as_messages, stream_response
+
+logger = logging.getLogger(__name__)
+
+class Speculation:
+    """When to start the likely branch behind a conditional edge ahead of the decision, learned from past decisions.
+
+    A SpeculationLauncher starts the branch with `prepare(input)` as soon as the workflow input arrives,
+    while the upstream executor is still deciding. The conditional edge in front of the branch is wrapped
+    with `guard(condition)`: when the condition rejects the message, the speculative work is cancelled and
+    discarded; when it accepts it, the branch's SpeculativeAgentExecutor uses the result already in flight
+    instead of starting over. The branch then costs max(upstream, branch) instead of their sum.
+
+    Whether to speculate follows the hit rate of the last `window` decisions: after `warmup` decisions,
+    the branch is only started ahead when at least `min_hit_rate` of them took it. A cancelled call is
+    still billed for the tokens it used, so keep speculation for branches that are usually taken.
+
+    Keep the same Speculation across workflow builds, so the hit rate is learned over every run; each
+    build takes its own SpeculativeBranch from it with `branch()`, which holds the work in flight for
+    that workflow, so workflows run concurrently never pick up each other's speculative calls.
+    """
+
+    def __init__(
+        self,
+        prepare: Callable[[Any], Any] = lambda message: message,
+        min_hit_rate: float = 0.5,
+        window: int = 50,
+        warmup: int = 3,
+    ):
+        self.prepare = prepare
+        self.min_hit_rate = min_hit_rate
+        self.warmup = warmup
+        self.started = 0
+        self.committed = 0
+        self.discarded = 0
+        self._history: deque[bool] = deque(maxlen=window)
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of the recent decisions that took the branch (1.0 before any decision)."""
+        return sum(self._history) / len(self._history) if self._history else 1.0
+
+    def should_start(self) -> bool:
+        return len(self._history) < self.warmup or self.hit_rate >= self.min_hit_rate
+
+    def record(self, taken: bool) -> None:
+        """Add a decision of the conditional edge to the history."""
+        self._history.append(taken)
+
+    def branch(self) -> "SpeculativeBranch":
+        """The speculative branch of one workflow build."""
+        return SpeculativeBranch(self)
+
+class SpeculativeBranch:
+    """The speculatively started branch of one workflow: the call in flight and the input it was started for."""
+
+    def __init__(self, speculation: Speculation):
+        self.speculation = speculation
+        self._run: Callable[[Any], Awaitable[Any]] | None = None
+        self._input: Any = None
+        self._task: asyncio.Task[Any] | None = None
+
+    def bind(self, run: Callable[[Any], Awaitable[Any]]) -> None:
+        """Set the function that computes the branch result; called by the branch's executor."""
+        self._run = run
+
+    def start(self, message: Any) -> bool:
+        """Start the branch ahead of the decision for the workflow input `message`, if it is likely to be taken."""
+        # Speculation left over from a run that did not reach the decision
+        self.discard()
+        if self._run is None or not self.speculation.should_start():
+            return False
+        self._input = self.speculation.prepare(message)
+        self._task = asyncio.get_running_loop().create_task(self._run(self._input))
+        self.speculation.started += 1
+        return True
+
+    def guard(self, condition: Callable[[Any], bool]) -> Callable[[Any], bool]:
+        """Wrap the edge condition in front of the branch to record each decision and drop rejected speculation."""
+        def guarded_condition(message: Any) -> bool:
+            taken = condition(message)
+            self.speculation.record(bool(taken))
+            if not taken:
+                self.discard()
+            return taken
+
+        return guarded_condition
+
+    def take(self, branch_input: Any, same_input: Callable[[Any, Any], bool]) -> asyncio.Task[Any] | None:
+        """The task started for `branch_input`, or None when nothing matching was started ahead."""
+        task, speculative_input = self._task, self._input
+        self._task = self._input = None
+        if task is None:
+            return None
+        if not same_input(speculative_input, branch_input):
+            # The branch received a different input than predicted: the work in flight is useless
+            task.cancel()
+            self.speculation.discarded += 1
+            return None
+        self.speculation.committed += 1
+        return task
+
+    def discard(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self.speculation.discarded += 1
+        self._task = self._input = None
+
+class SpeculationLauncher(Executor):
+    """Start executor that launches the speculative branches and forwards the input unchanged."""
+
+    def __init__(self, branches: Sequence[SpeculativeBranch], id: str = "speculation_launcher"):
+        super().__init__(id=id)
+        self.branches = list(branches)
+
+    @handler
+    async def launch(self, message: AgentExecutorRequest, ctx: WorkflowContext[AgentExecutorRequest]) -> None:
+        for branch in self.branches:
+            branch.start(message)
+        await ctx.send_message(message)
+
+class SpeculativeAgent(DelegatingAgent):
+    """Agent whose call may already have been started by a SpeculationLauncher.
+
+    When it is called with the messages the speculative call was started with, it waits for that call
+    instead of calling the agent again; otherwise it calls the agent. Speculative calls run on a new
+    thread, so a discarded call leaves no trace in the conversation; a used one is added to the thread.
+    """
+
+    def __init__(self, agent: AgentProtocol, branch: SpeculativeBranch):
+        super().__init__(agent)
+        self.branch = branch
+        branch.bind(self._run_speculatively)
+
+    async def _run_speculatively(self, request: AgentExecutorRequest) -> AgentRunResponse:
+        return await self.agent.run(list(request.messages), thread=self.agent.get_new_thread())
+
+    async def run(self, messages: Any = None, *, thread: AgentThread | None = None, **kwargs: Any) -> AgentRunResponse:
+        response = await self._take_speculative(as_messages(messages), thread)
+        if response is None:
+            return await super().run(messages, thread=thread, **kwargs)
+        return response
+
+    async def run_stream(self, messages: Any = None, *, thread: AgentThread | None = None, **kwargs: Any) -> AsyncIterable[AgentRunResponseUpdate]:
+        response = await self._take_speculative(as_messages(messages), thread)
+        updates = super().run_stream(messages, thread=thread, **kwargs) if response is None else stream_response(response)
+        async for update in updates:
+            yield update
+
+    async def _take_speculative(self, messages: list[ChatMessage], thread: AgentThread | None) -> AgentRunResponse | None:
+        task = self.branch.take(messages, _same_messages)
+        if task is None:
+            return None
+        try:
+            response = await task
+        except Exception as error:
+            # A failed speculative call gets a normal second chance
+            logger.warning(f"Speculative call of '{self.display_name}' failed, calling the agent again: {error}")
+            return None
+        await add_to_thread(thread, messages, response)
+        return response
+
+class SpeculativeAgentExecutor(AgentExecutor):
+    """AgentExecutor of a SpeculativeAgent, for the branch that a SpeculationLauncher starts ahead."""
+
+    def __init__(self, agent: AgentProtocol, branch: SpeculativeBranch, **kwargs: Any):
+        self.branch = branch
+        super().__init__(SpeculativeAgent(agent, branch), **kwargs)
+
+def _same_messages(request: AgentExecutorRequest, messages: list[ChatMessage]) -> bool:
+    expected = [(str(message.role), message.text) for message in request.messages]
+    return expected == [(str(message.role), message.text) for message in messages]
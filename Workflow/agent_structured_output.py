@@ -0,0 +1,41 @@
+# Parse-once structured output for AgentExecutorResponse messages
+from typing import TypeVar
+from agent_framework import AgentExecutorResponse
+from pydantic import BaseModel, ValidationError
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# Attribute holding the parsed models on a response. It is not a dataclass field, so checkpoints leave it out.
+_CACHE_ATTRIBUTE = "_structured_output_cache"
+
+def parse_response(response: AgentExecutorResponse, model: type[ModelT]) -> ModelT:
+    """Returns the agent's structured output as `model`, validating the JSON text at most once per model.
+
+    The result is memoized on the response, so edge conditions, switch-case predicates and downstream
+    executors that receive the same response share one validation. When the agent already parsed its
+    `response_format` into `agent_run_response.value`, that value is used without parsing again.
+    Raises pydantic.ValidationError like `model.model_validate_json`; failures are memoized as well.
+    """
+    cache: dict[type[BaseModel], BaseModel | ValidationError] = response.__dict__.setdefault(_CACHE_ATTRIBUTE, {})
+    result = cache.get(model)
+    if result is None:
+        value = response.agent_run_response.value
+        if isinstance(value, model):
+            result = value
+        else:
+            try:
+                result = model.model_validate_json(response.agent_run_response.text)
+            except ValidationError as error:
+                result = error
+        cache[model] = result
+    if isinstance(result, ValidationError):
+        # Drop the traceback of the earlier raise so it does not grow every time the failure is reused
+        raise result.with_traceback(None)
+    return result
+
+def try_parse_response(response: AgentExecutorResponse, model: type[ModelT]) -> ModelT | None:
+    """Same as parse_response, but returns None when the text does not match the model."""
+    try:
+        return parse_response(response, model)
+    except ValidationError:
+        return None
@@ -0,0 +1,153 @@
+# Read-only numeric array payloads for workflow messages and vectorized reducers over them
+import array
+import math
+import pickle
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class Vector:
+    """Read-only one-dimensional numeric array sent as a workflow message.
+
+    The values live in one contiguous buffer: a NumPy array when NumPy is installed, otherwise an
+    `array.array` seen through a memoryview. Workflows send the same message object to every fan-out
+    target, so the buffer is made read-only and every branch reads the same memory without copying it
+    and without being able to change what the others see. `view()` returns another read-only view.
+
+    Unlike `list[int]`, whose every item the framework type-checks on each hop, a Vector is routed by
+    its class. It pickles with protocol 5 as an out-of-band buffer, so OffloadExecutor passes it to
+    worker processes through shared memory.
+
+    `typecode` is an `array` type code: "q" (64-bit integers) or "d" (64-bit floats) for most data.
+    """
+
+    def __init__(self, values: Any, typecode: str = "d"):
+        if np is not None:
+            data = np.asarray(values, dtype=_NUMPY_TYPES.get(typecode, typecode)) if not isinstance(values, np.ndarray) else values
+            data = data.reshape(-1).view()
+            data.flags.writeable = False
+            self.typecode = data.dtype.char
+        else:
+            if isinstance(values, memoryview):
+                data = values if values.format == typecode else values.cast("B").cast(typecode)
+            elif isinstance(values, array.array):
+                data = memoryview(values)
+            else:
+                data = memoryview(array.array(typecode, values))
+            data = data.toreadonly()
+            self.typecode = data.format
+        self.data = data
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], typecode: str = "d") -> "Vector":
+        """Build a vector from any iterable of numbers, copying them once into a contiguous buffer."""
+        if np is not None:
+            return cls(np.fromiter(values, dtype=_NUMPY_TYPES.get(typecode, typecode)), typecode)
+        return cls(array.array(typecode, values), typecode)
+
+    def view(self) -> "Vector":
+        """Another read-only vector over the same memory."""
+        return Vector(self.data, self.typecode)
+
+    def tolist(self) -> list[float]:
+        return self.data.tolist()
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __repr__(self) -> str:
+        return f"Vector(len={len(self)}, typecode={self.typecode!r})"
+
+    def __reduce_ex__(self, protocol: int) -> tuple[Any, ...]:
+        if np is not None:
+            return Vector, (self.data, self.typecode)
+        # Protocol 5 lets the pickler hand the buffer out of band instead of copying it into the stream
+        buffer = pickle.PickleBuffer(self.data) if protocol >= 5 else self.data.tobytes()
+        return _rebuild_vector, (buffer, self.typecode)
+
+def _rebuild_vector(buffer: Any, typecode: str) -> Vector:
+    return Vector(memoryview(buffer).cast("B").cast(typecode), typecode)
+
+# array type codes for the NumPy dtypes they correspond to
+_NUMPY_TYPES = {"b": "i1", "B": "u1", "h": "i2", "H": "u2", "i": "i4", "I": "u4", "l": "i8", "L": "u8", "q": "i8", "Q": "u8", "f": "f4", "d": "f8"}
+
+@dataclass
+class VectorSummary:
+    """Statistics of a vector; `quantiles` maps each requested quantile (0 to 1) to its value."""
+    count: int
+    sum: float
+    mean: float
+    min: float
+    max: float
+    quantiles: dict[float, float] = field(default_factory=dict)
+
+# The reducers below are module-level functions, so they can run inline or be offloaded with OffloadExecutor:
+#     OffloadExecutor(mean, pool="process", inline_below=1_000_000, id="average")
+
+def count(values: Vector) -> int:
+    """Number of values."""
+    return len(values)
+
+def total(values: Vector) -> int | float:
+    """Sum of the values (0 for an empty vector)."""
+    if np is not None:
+        return values.data.sum().item()
+    # fsum is exact for floats; integers are summed exactly anyway
+    return math.fsum(values.data) if values.typecode in "fd" else sum(values.data)
+
+def mean(values: Vector) -> float:
+    """Arithmetic mean of the values."""
+    if not len(values):
+        raise ValueError("The mean of an empty vector is undefined.")
+    return total(values) / len(values)
+
+def minimum(values: Vector) -> int | float:
+    """Smallest value."""
+    return values.data.min().item() if np is not None else min(values.data)
+
+def maximum(values: Vector) -> int | float:
+    """Largest value."""
+    return values.data.max().item() if np is not None else max(values.data)
+
+def quantiles(values: Vector, points: Sequence[float] = (0.25, 0.5, 0.75)) -> dict[float, float]:
+    """Quantiles of the values, linearly interpolated between the closest ranks like numpy.quantile."""
+    if not len(values):
+        raise ValueError("The quantiles of an empty vector are undefined.")
+    if np is not None:
+        return dict(zip(points, np.quantile(values.data, points).tolist()))
+    return _sorted_quantiles(sorted(values.data), points)
+
+def summarize(values: Vector, points: Sequence[float] = (0.25, 0.5, 0.75)) -> VectorSummary:
+    """All the statistics of the values, in one step instead of one branch per statistic."""
+    if not len(values):
+        raise ValueError("An empty vector has no statistics.")
+    if np is not None:
+        value_sum = total(values)
+        low, high = minimum(values), maximum(values)
+        quantile_values = quantiles(values, points) if points else {}
+    else:
+        # One sort gives the minimum, the maximum and every quantile
+        ordered = sorted(values.data)
+        value_sum = math.fsum(ordered) if values.typecode in "fd" else sum(ordered)
+        low, high = ordered[0], ordered[-1]
+        quantile_values = _sorted_quantiles(ordered, points)
+    return VectorSummary(len(values), value_sum, value_sum / len(values), low, high, quantile_values)
+
+def _sorted_quantiles(ordered: Sequence[float], points: Sequence[float]) -> dict[float, float]:
+    result: dict[float, float] = {}
+    for point in points:
+        if not 0.0 <= point <= 1.0:
+            raise ValueError(f"Quantile {point} is not between 0 and 1.")
+        position = point * (len(ordered) - 1)
+        below = math.floor(position)
+        above = min(below + 1, len(ordered) - 1)
+        result[point] = ordered[below] + (ordered[above] - ordered[below]) * (position - below)
+    return result
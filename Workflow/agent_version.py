@@ -0,0 +1,22 @@
+# The agent-framework-core version the samples are written against, and a warning for modules that depend on its internals
+import logging
+from importlib.metadata import PackageNotFoundError, version
+
+logger = logging.getLogger(__name__)
+
+TESTED_AGENT_FRAMEWORK_VERSION = "1.0.0b251016"
+
+def get_agent_framework_version() -> str | None:
+    """The installed agent-framework-core version, or None when it is not installed as a package."""
+    try:
+        return version("agent-framework-core")
+    except PackageNotFoundError:
+        return None
+
+def warn_if_untested_version(module: str, uses: str) -> None:
+    """Log a warning when `module`, which relies on `uses` (private framework members), runs on another version."""
+    installed = get_agent_framework_version()
+    if installed not in (None, TESTED_AGENT_FRAMEWORK_VERSION):
+        logger.warning(
+            f"{module} uses {uses} of agent-framework-core {TESTED_AGENT_FRAMEWORK_VERSION}; version {installed} is installed."
+        )
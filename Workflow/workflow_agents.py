@@ -2,15 +2,13 @@
 import asyncio
 
 from agent_client_factory import get_azopenaichatclient
-from agent_framework import AgentExecutor, AgentRunEvent, WorkflowBuilder
+from agent_framework import AgentExecutor, AgentRunEvent, Workflow, WorkflowBuilder
 from agent_utilities import generate_workflow_visualization
 
-async def main() -> None:
-    # Create the chat client
-    agent = get_azopenaichatclient()
-
+def create_workflow(chat_client) -> Workflow:
+    """Build the Writer -> Reviewer workflow on top of the chat client."""
     # Create a Writer agent that generates content
-    writer = AgentExecutor(agent.create_agent(
+    writer = AgentExecutor(chat_client.create_agent(
         name="Writer",
         instructions=(
             "You are an excellent content writer. You create new content and edit contents based on the feedback."
@@ -18,7 +16,7 @@ async def main() -> None:
     ), id="writer")
 
     # Create a Reviewer agent that provides feedback
-    reviewer = AgentExecutor(agent.create_agent(
+    reviewer = AgentExecutor(chat_client.create_agent(
         name="Reviewer",
         instructions=(
             "You are an excellent content reviewer. "
@@ -28,7 +26,11 @@ async def main() -> None:
     ), id="reviewer")
 
     # Build the workflow with agents as executors
-    workflow = WorkflowBuilder().set_start_executor(writer).add_edge(writer, reviewer).build()
+    return WorkflowBuilder().set_start_executor(writer).add_edge(writer, reviewer).build()
+
+async def main() -> None:
+    # Create the chat client and the workflow
+    workflow = create_workflow(get_azopenaichatclient())
     generate_workflow_visualization(workflow, name="diagrams/workflow_agents")
 
     # Run the workflow
@@ -0,0 +1,138 @@
+# Batch email triage: streams a mail folder or a JSONL file through one of the spam detection workflows.
+# Results are appended to a JSONL file as each email completes, and a rerun skips the emails already
+# triaged by the same workflow, so an interrupted batch resumes where it stopped.
+#
+# Example: python workflow_batch_triage.py mail --output triage_results.jsonl --workflow switch_case --concurrency 16
+# JSONL input: one object per line with "id" (optional) and "text" (or "body", "content", "email").
+# Add --batch to send the model calls as provider batch jobs (cheaper, but answers may take hours); use a high
+# --concurrency so each job carries many emails.
+# Set AGENT_CHAT_CLIENT=mock to try it offline against MockChatClient (batch jobs then run on LocalBatchServer).
+
+import argparse
+import asyncio
+import json
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+from agent_batch_runner import BatchWorkflowRunner
+from agent_client_factory import client_registry, get_azopenaichatclient, get_batchchatclient
+from agent_framework import AgentExecutorRequest, ChatMessage, Role
+
+import workflow_branching_conditional
+import workflow_branching_multi_selection
+import workflow_branching_switch_case
+
+WORKFLOWS = {
+    "conditional": workflow_branching_conditional.create_workflow,
+    "switch_case": workflow_branching_switch_case.create_workflow,
+    "multi_selection": workflow_branching_multi_selection.create_workflow,
+}
+
+TEXT_FIELDS = ("text", "body", "content", "email")
+
+def read_emails(source: Path) -> Iterator[tuple[str, str]]:
+    """Yield (id, text) for every email in a folder (id = relative path) or a JSONL file (id = "id" or line number)."""
+    if source.is_dir():
+        for path in sorted(source.rglob("*")):
+            if path.is_file() and not path.name.startswith("."):
+                yield path.relative_to(source).as_posix(), path.read_text(encoding="utf-8", errors="replace")
+        return
+
+    with open(source, encoding="utf-8", errors="replace") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = next((record[name] for name in TEXT_FIELDS if name in record), None)
+            if text is None:
+                raise ValueError(f"{source}:{line_number} has none of the fields {TEXT_FIELDS}.")
+            yield str(record.get("id", line_number)), text
+
+def load_completed(output: Path, workflow: str) -> set[str]:
+    """IDs already triaged successfully by `workflow` in a previous run. Failed emails are tried again, and
+    emails triaged by another workflow are triaged again by this one."""
+    completed: set[str] = set()
+    if not output.exists():
+        return completed
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of a run that was killed while writing
+                continue
+            if record.get("workflow") != workflow:
+                continue
+            if record.get("error") is None:
+                completed.add(record["id"])
+            else:
+                completed.discard(record["id"])
+    return completed
+
+def ends_with_newline(path: Path) -> bool:
+    """True for an empty file or one whose last byte is a newline."""
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return True
+        f.seek(-1, 2)
+        return f.read(1) == b"\n"
+
+def get_requests(source: Path, completed: set[str], limit: int | None) -> Iterator[tuple[str, AgentExecutorRequest]]:
+    count = 0
+    for email_id, text in read_emails(source):
+        if email_id in completed:
+            continue
+        if limit is not None and count >= limit:
+            return
+        count += 1
+        yield email_id, AgentExecutorRequest(messages=[ChatMessage(Role.USER, text=text)], should_respond=True)
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Triage a folder or JSONL file of emails with a spam detection workflow.")
+    parser.add_argument("source", type=Path, help="Folder of email files or JSONL file.")
+    parser.add_argument("--output", type=Path, default=Path("triage_results.jsonl"), help="JSONL file the results are appended to.")
+    parser.add_argument("--workflow", choices=list(WORKFLOWS), default="switch_case", help="Workflow graph to run.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Emails processed at the same time.")
+    parser.add_argument("--limit", type=int, help="Stop after this many new emails.")
+    parser.add_argument("--batch", action="store_true", help="Send the model calls as batch jobs instead of one request each.")
+    args = parser.parse_args()
+
+    completed = load_completed(args.output, args.workflow)
+    if completed:
+        print(f"Resuming: {len(completed)} emails in '{args.output}' are already triaged by the '{args.workflow}' workflow.")
+
+    # A batch job is submitted once every email in flight waits for the model, or after max_wait
+    chat_client = get_batchchatclient(max_batch_size=args.concurrency) if args.batch else get_azopenaichatclient()
+    runner = BatchWorkflowRunner(lambda: WORKFLOWS[args.workflow](chat_client), max_concurrency=args.concurrency)
+
+    processed = failed = 0
+    start = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as f:
+        # Terminate a line left incomplete by a crash so the next record starts on its own line
+        if not ends_with_newline(args.output):
+            f.write("\n")
+        async for result in runner.run(get_requests(args.source, completed, args.limit)):
+            record = {
+                "id": result.item_id,
+                "workflow": args.workflow,
+                "outputs": result.outputs,
+                "error": repr(result.error) if result.error is not None else None,
+                "elapsed": round(result.elapsed, 3),
+            }
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            processed += 1
+            failed += result.error is not None
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Triaged {processed} emails ({failed} failed) in {elapsed:.1f}s, {rate:.1f} emails/s. Results: '{args.output}'.")
+
+    if args.batch:
+        await chat_client.aclose()
+    # Close the shared HTTP connection pools used by the chat client
+    await client_registry.aclose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
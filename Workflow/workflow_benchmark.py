@@ -0,0 +1,284 @@
+# Benchmark that runs the workflow samples offline against MockChatClient.
+# Reports per-run latency percentiles, events per second and peak memory, so framework overhead
+# (WorkflowBuilder, AgentExecutor, fan-out/fan-in, RequestInfoExecutor) can be measured without model latency.
+#
+# Example: python workflow_benchmark.py --iterations 50 --latency lognormal:0.05,0.5 --chunk-size 8
+
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from agent_framework import (
+    AgentExecutorRequest,
+    ChatMessage,
+    InMemoryCheckpointStorage,
+    RequestInfoEvent,
+    Role,
+    Workflow,
+)
+from agent_fan_in import FanInPolicy
+from agent_hedging import Hedging
+from agent_speculation import Speculation
+from agent_mock_client import LatencyFunction, MockChatClient, constant_latency, lognormal_latency, uniform_latency
+
+import workflow_agents
+import workflow_branching_conditional
+import workflow_branching_multi_selection
+import workflow_branching_switch_case
+import workflow_checkpoints
+import workflow_concurrent
+import workflow_request_and_response
+import workflow_sequential
+import workflow_visualization
+import world_cup_2026
+
+MAIL_FOLDER = Path(__file__).parent / "mail"
+
+@dataclass
+class Scenario:
+    """A workflow sample prepared for unattended runs."""
+    name: str
+    # Builds a fresh workflow from the chat client
+    create_workflow: Callable[[MockChatClient], Workflow]
+    # Returns the workflow input for an iteration
+    get_input: Callable[[int], Any]
+    # Answers a RequestInfoEvent (request data, turn number) on behalf of the user
+    respond: Callable[[Any, int], Any] | None = None
+
+@dataclass
+class ScenarioResult:
+    """Measurements collected for one scenario."""
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    events: int = 0
+    errors: int = 0
+    peak_rss_mb: float | None = None
+
+def get_email_request(files: list[str], distinct: bool = False) -> Callable[[int], AgentExecutorRequest]:
+    """Cycle through the sample emails, one per iteration; `distinct` signs each one so no response cache hits."""
+    emails = [(MAIL_FOLDER / name).read_text(encoding="utf-8", errors="replace") for name in files]
+
+    def get_input(iteration: int) -> AgentExecutorRequest:
+        email = emails[iteration % len(emails)]
+        if distinct:
+            email += f"\n\nSent from benchmark run {iteration}"
+        return AgentExecutorRequest(messages=[ChatMessage(Role.USER, text=email)], should_respond=True)
+
+    return get_input
+
+def answer_guess(request: Any, turn: int) -> str:
+    """Play the guessing game with a fixed secret, accepting any guess after a few turns."""
+    guess = getattr(request, "guess", None)
+    if guess is None or guess == 7 or turn >= 5:
+        return "correct"
+    return "higher" if guess < 7 else "lower"
+
+def get_scenarios() -> list[Scenario]:
+    prompt = "Create a slogan for a new full gas SUV that is affordable and strong."
+    # Kept across the runs of the scenario, like the executors of a long-running service
+    world_cup_hedging = {expert_id: Hedging(warmup=5) for expert_id in world_cup_2026.EXPERT_IDS}
+    reply_speculation = Speculation()
+    return [
+        Scenario("sequential", lambda _: workflow_sequential.create_workflow(), lambda i: f"benchmark run {i}"),
+        Scenario("sequential_unfused", lambda _: workflow_sequential.create_workflow(fuse=False), lambda i: f"benchmark run {i}"),
+        Scenario(
+            "concurrent",
+            lambda _: workflow_concurrent.create_workflow(),
+            lambda i: [random.Random(i).randint(1, 100) for _ in range(100)],
+        ),
+        Scenario(
+            "checkpoints",
+            lambda _: workflow_checkpoints.create_workflow(InMemoryCheckpointStorage()),
+            lambda i: f"Checkpoints are great! {i}",
+        ),
+        Scenario(
+            "checkpoints_fused",
+            lambda _: workflow_checkpoints.create_workflow(InMemoryCheckpointStorage(), fuse=True),
+            lambda i: f"Checkpoints are great! {i}",
+        ),
+        Scenario("agents", workflow_agents.create_workflow, lambda i: prompt),
+        Scenario("visualization", workflow_visualization.create_workflow, lambda i: prompt),
+        Scenario(
+            "visualization_quorum",
+            lambda client: workflow_visualization.create_workflow(client, FanInPolicy(quorum=2)),
+            lambda i: prompt,
+        ),
+        Scenario(
+            "branching_conditional",
+            workflow_branching_conditional.create_workflow,
+            get_email_request(["email.txt", "spam.txt"]),
+        ),
+        # New emails, so spam detection and the reply are model calls: in sequence, or overlapped by speculation
+        Scenario(
+            "branching_conditional_new_mail",
+            workflow_branching_conditional.create_workflow,
+            get_email_request(["email.txt", "spam.txt"], distinct=True),
+        ),
+        Scenario(
+            "branching_conditional_speculative",
+            lambda client: workflow_branching_conditional.create_workflow(client, reply_speculation),
+            get_email_request(["email.txt", "spam.txt"], distinct=True),
+        ),
+        Scenario(
+            "branching_multi_selection",
+            workflow_branching_multi_selection.create_workflow,
+            get_email_request(["email.txt", "spam.txt", "ambiguous_email.txt"]),
+        ),
+        Scenario(
+            "branching_switch_case",
+            workflow_branching_switch_case.create_workflow,
+            get_email_request(["email.txt", "spam.txt", "ambiguous_email.txt"]),
+        ),
+        Scenario(
+            "request_and_response",
+            workflow_request_and_response.create_workflow,
+            lambda i: "start",
+            answer_guess,
+        ),
+        Scenario("world_cup_2026", world_cup_2026.create_workflow, lambda i: world_cup_2026.ENTRY_PROMPT, lambda request, turn: ""),
+        Scenario(
+            "world_cup_2026_quorum",
+            lambda client: world_cup_2026.create_workflow(client, fan_in_policy=FanInPolicy(quorum=2)),
+            lambda i: world_cup_2026.ENTRY_PROMPT,
+            lambda request, turn: "",
+        ),
+        Scenario(
+            "world_cup_2026_hedged",
+            lambda client: world_cup_2026.create_workflow(client, hedging=world_cup_hedging),
+            lambda i: world_cup_2026.ENTRY_PROMPT,
+            lambda request, turn: "",
+        ),
+    ]
+
+def get_peak_rss_mb() -> float | None:
+    """Peak resident set size of the process in MB, or None when the platform does not report it."""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024)
+
+def parse_latency(value: str) -> LatencyFunction:
+    """Parse constant:SECONDS, uniform:LOW,HIGH or lognormal:MEDIAN[,SIGMA]."""
+    kind, _, params = value.partition(":")
+    numbers = [float(number) for number in params.split(",") if number]
+    if kind == "constant" and len(numbers) == 1:
+        return constant_latency(numbers[0])
+    if kind == "uniform" and len(numbers) == 2:
+        return uniform_latency(numbers[0], numbers[1])
+    if kind == "lognormal" and len(numbers) in (1, 2):
+        return lognormal_latency(*numbers)
+    raise argparse.ArgumentTypeError(f"Invalid latency '{value}'. Use constant:S, uniform:LOW,HIGH or lognormal:MEDIAN[,SIGMA].")
+
+async def run_once(scenario: Scenario, chat_client: MockChatClient, iteration: int) -> int:
+    """Run the scenario to completion, answering every request, and return the number of events."""
+    workflow = scenario.create_workflow(chat_client)
+    stream = workflow.run_stream(scenario.get_input(iteration))
+    events = 0
+    turn = 0
+    while True:
+        responses: dict[str, Any] = {}
+        async for event in stream:
+            events += 1
+            if isinstance(event, RequestInfoEvent):
+                if scenario.respond is None:
+                    raise RuntimeError(f"Scenario '{scenario.name}' received an unexpected request: {event.data}")
+                responses[event.request_id] = scenario.respond(event.data, turn)
+        if not responses:
+            return events
+        turn += 1
+        stream = workflow.send_responses_streaming(responses)
+
+async def run_scenario(scenario: Scenario, chat_client: MockChatClient, iterations: int, warmup: int, verbose: bool) -> ScenarioResult:
+    result = ScenarioResult(scenario.name)
+    # The samples print as they go; keep the report readable unless asked otherwise
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        for iteration in range(warmup + iterations):
+            start = time.perf_counter()
+            try:
+                events = await run_once(scenario, chat_client, iteration)
+            except Exception as error:
+                result.errors += 1
+                print(f"{scenario.name} run {iteration} failed: {error!r}", file=sys.stderr)
+                continue
+            elapsed = time.perf_counter() - start
+            if iteration >= warmup:
+                result.latencies.append(elapsed)
+                result.events += events
+    result.peak_rss_mb = get_peak_rss_mb()
+    return result
+
+def percentiles(values: list[float]) -> tuple[float, float, float]:
+    """Returns p50, p95 and p99 of the values."""
+    if len(values) == 1:
+        return values[0], values[0], values[0]
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+def print_report(results: list[ScenarioResult]) -> None:
+    header = f"{'scenario':<24}{'runs':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'events/s':>12}{'peak RSS MB':>14}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        rss = f"{result.peak_rss_mb:.1f}" if result.peak_rss_mb is not None else "n/a"
+        if not result.latencies:
+            print(f"{result.name:<24}{0:>6}{result.errors:>8}{'-':>10}{'-':>10}{'-':>10}{'-':>12}{rss:>14}")
+            continue
+        p50, p95, p99 = percentiles(result.latencies)
+        events_per_second = result.events / sum(result.latencies)
+        print(
+            f"{result.name:<24}{len(result.latencies):>6}{result.errors:>8}"
+            f"{p50 * 1000:>10.2f}{p95 * 1000:>10.2f}{p99 * 1000:>10.2f}{events_per_second:>12.0f}{rss:>14}"
+        )
+    print("\nPeak RSS is the process high-water mark after each scenario, so it only grows down the table.")
+
+async def main() -> None:
+    scenarios = get_scenarios()
+    parser = argparse.ArgumentParser(description="Benchmark the workflow samples offline against MockChatClient.")
+    parser.add_argument("--iterations", "-n", type=int, default=20, help="Measured runs per scenario.")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured runs per scenario before measuring.")
+    parser.add_argument("--samples", nargs="+", choices=[s.name for s in scenarios], help="Scenarios to run (default: all).")
+    parser.add_argument("--latency", type=parse_latency, default=constant_latency(0.0), help="Model latency, e.g. constant:0.05, uniform:0.02,0.1 or lognormal:0.05,0.5.")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Characters per streaming update.")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds between streaming updates.")
+    parser.add_argument("--latency-per-call", action="store_true", help="Draw the latency anew for every call instead of per prompt.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the mock responses.")
+    parser.add_argument("--verbose", action="store_true", help="Show the output printed by the samples.")
+    args = parser.parse_args()
+
+    chat_client = MockChatClient(
+        seed=args.seed,
+        latency=args.latency,
+        chunk_size=args.chunk_size,
+        chunk_delay=args.chunk_delay,
+        latency_per_call=args.latency_per_call,
+    )
+
+    results = []
+    for scenario in scenarios:
+        if args.samples and scenario.name not in args.samples:
+            continue
+        results.append(await run_scenario(scenario, chat_client, args.iterations, args.warmup, args.verbose))
+    print_report(results)
+
+if __name__ == "__main__":
+    asyncio.run(main())
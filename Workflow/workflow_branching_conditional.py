@@ -2,6 +2,10 @@
 import asyncio
 from agent_utilities import generate_workflow_visualization, get_input_text
 from agent_client_factory import get_azopenaichatclient
+from agent_response_cache import ResponseCacheMiddleware
+from agent_prefilter import SPAM_RULES, PreFilteredAgentExecutor, Prediction, RuleClassifier
+from agent_speculation import Speculation, SpeculationLauncher, SpeculativeAgentExecutor
+from agent_structured_output import parse_response
 from pathlib import Path
 from typing import Any
 from typing_extensions import Never
@@ -12,6 +16,7 @@ from agent_framework import (
     AgentExecutorResponse,
     ChatMessage,
     Role,
+    Workflow,
     WorkflowBuilder,
     WorkflowContext,
     executor
@@ -28,6 +33,21 @@ class EmailResponse(BaseModel):
     """Represents the response from the email assistant."""
     response: str
 
+# Rule-based spam pre-classifier, shared by every workflow built from this module
+pre_classifier = RuleClassifier(SPAM_RULES)
+
+# Hit rate of the speculative reply drafting, learned across every workflow built from this module
+speculation = Speculation()
+
+# Exact-match cache of the spam detection answers, so an email seen before costs a lookup instead of a model call
+response_cache = ResponseCacheMiddleware()
+
+def spam_from_prediction(prediction: Prediction, email: str) -> DetectionResult | None:
+    """Turn a confident spam prediction into the agent's output. Anything else is left to the agent."""
+    if prediction.label != "spam":
+        return None
+    return DetectionResult(is_spam=True, reason=prediction.reason, email_content=email)
+
 def get_condition(expected_result: bool):
     """Create a condition callable that routes based on DetectionResult.is_spam."""
     # The returned function will be used as an edge predicate.
@@ -38,8 +58,9 @@ def get_condition(expected_result: bool):
 
         try:
             # Prefer parsing a structured DetectionResult from the agent JSON text.
-            # Using model_validate_json ensures type safety and raises if the shape is wrong.
-            detection = DetectionResult.model_validate_json(message.agent_run_response.text)
+            # parse_response validates once per response and raises if the shape is wrong;
+            # the other edge and the downstream executor reuse the same parsed result.
+            detection = parse_response(message, DetectionResult)
             # Route only when the spam flag matches the expected path.
             return detection.is_spam == expected_result
         except Exception:
@@ -53,7 +74,7 @@ def get_condition(expected_result: bool):
 async def handle_email_response(response: AgentExecutorResponse, ctx: WorkflowContext[Never, str]) -> None:
     """Handle legitimate emails by drafting a professional response."""
     # Downstream of the email assistant. Parse a validated EmailResponse and yield the workflow output.
-    email_response = EmailResponse.model_validate_json(response.agent_run_response.text)
+    email_response = parse_response(response, EmailResponse)
     await ctx.yield_output(f"Email sent:\n{email_response.response}")
 
 
@@ -61,7 +82,7 @@ async def handle_email_response(response: AgentExecutorResponse, ctx: WorkflowCo
 async def handle_spam_classifier_response(response: AgentExecutorResponse, ctx: WorkflowContext[Never, str]) -> None:
     """Handle spam emails by marking them appropriately."""
     # Spam path. Confirm the DetectionResult and yield the workflow output. Guard against accidental non spam input.
-    detection = DetectionResult.model_validate_json(response.agent_run_response.text)
+    detection = parse_response(response, DetectionResult)
     if detection.is_spam:
         await ctx.yield_output(f"Email marked as spam:\n{detection.reason}")
     else:
@@ -73,11 +94,10 @@ async def to_email_assistant_request(
     response: AgentExecutorResponse, ctx: WorkflowContext[AgentExecutorRequest]
 ) -> None:
     """Transform spam detection response into a request for the email assistant."""
-    detection = DetectionResult.model_validate_json(response.agent_run_response.text)
-
-    # Create a new request for the email assistant with the original email content
+    # Create a new request for the email assistant with the original email content, taken from the
+    # conversation rather than the agent's copy of it so it matches a speculatively started request
     request = AgentExecutorRequest(
-        messages=[ChatMessage(Role.USER, text=detection.email_content)],
+        messages=[ChatMessage(Role.USER, text=response.full_conversation[0].text)],
         should_respond=True
     )
     await ctx.send_message(request)
@@ -102,13 +122,18 @@ async def get_email_sample() -> str:
     email_path = Path(__file__).parent / "mail" / options[option]
     return email_path.read_text(encoding="utf-8", errors="replace")
 
-# The main function
-async def main() -> None:
-    email = await get_email_sample()
-    chat_client = get_azopenaichatclient()
-
-    # Create the agent for spam detection
-    spam_detection_agent = AgentExecutor(
+# Build the workflow
+def create_workflow(chat_client, speculation: Speculation | None = None) -> Workflow:
+    """Build the spam detection workflow on top of the chat client.
+
+    With a `speculation`, the email assistant starts drafting the reply at the same time as spam detection,
+    since most mail is legitimate. The draft is used when the email turns out not to be spam and discarded
+    otherwise, so the common path takes about as long as the slower of the two calls instead of both. Pass
+    the same Speculation to every build (the module-level `speculation`, for example), so that drafting
+    ahead stops once spam becomes the usual case.
+    """
+    # Obvious spam is recognized by local rules; the agent only sees the emails the rules are unsure about
+    spam_detection_agent = PreFilteredAgentExecutor(
         chat_client.create_agent(
             instructions=(
                 "You are a spam detection assistant that identifies spam emails. "
@@ -116,30 +141,43 @@ async def main() -> None:
                 "Include the original email content in email_content."
             ),
             response_format=DetectionResult,
+            middleware=[response_cache],
         ),
+        classifier=pre_classifier,
+        to_result=spam_from_prediction,
         id="spam_detection_agent",
     )
 
     # Create the agent for email assistance
-    email_assistant_agent = AgentExecutor(
-        chat_client.create_agent(
-            instructions=(
-                "You are an email assistant that helps users draft professional responses to emails. "
-                "Your input might be a JSON object that includes 'email_content'; base your reply on that content. "
-                "Return JSON with a single field 'response' containing the drafted reply."
-            ),
-            response_format=EmailResponse,
+    email_assistant = chat_client.create_agent(
+        instructions=(
+            "You are an email assistant that helps users draft professional responses to emails. "
+            "Your input might be a JSON object that includes 'email_content'; base your reply on that content. "
+            "Return JSON with a single field 'response' containing the drafted reply."
         ),
-        id="email_assistant_agent",
+        response_format=EmailResponse,
     )
 
+    not_spam = get_condition(False)
+    if speculation is not None:
+        # The launcher starts the email assistant on the incoming email and passes it on to spam detection;
+        # the guarded condition commits the draft for legitimate mail and cancels it for spam
+        branch = speculation.branch()
+        start = SpeculationLauncher([branch], id="speculate_reply")
+        email_assistant_agent = SpeculativeAgentExecutor(email_assistant, branch, id="email_assistant_agent")
+        not_spam = branch.guard(not_spam)
+    else:
+        start = spam_detection_agent
+        email_assistant_agent = AgentExecutor(email_assistant, id="email_assistant_agent")
+
     # Build the workflow 
-    workflow = (
-        WorkflowBuilder()
-        .set_start_executor(spam_detection_agent)
-        
+    builder = WorkflowBuilder().set_start_executor(start)
+    if speculation is not None:
+        builder.add_edge(start, spam_detection_agent)
+    return (
+        builder
         # This path handles legitimate emails: spam detection (IS NOT SPAM) -> to email assistant -> email assistant -> handle response
-        .add_edge(spam_detection_agent, to_email_assistant_request, condition=get_condition(False))
+        .add_edge(spam_detection_agent, to_email_assistant_request, condition=not_spam)
         .add_edge(to_email_assistant_request, email_assistant_agent)
         .add_edge(email_assistant_agent, handle_email_response)
         
@@ -147,6 +185,11 @@ async def main() -> None:
         .add_edge(spam_detection_agent, handle_spam_classifier_response, condition=get_condition(True))
         .build()
     )
+
+# The main function
+async def main() -> None:
+    email = await get_email_sample()
+    workflow = create_workflow(get_azopenaichatclient(), speculation)
     generate_workflow_visualization(workflow, name="diagrams/workflow_branching_conditional")
     
     # Since the start executor is an AgentExecutor, we need to send an AgentExecutorRequest object.
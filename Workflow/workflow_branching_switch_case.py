@@ -2,18 +2,21 @@
 import asyncio
 from agent_utilities import generate_workflow_visualization, get_input_text
 from agent_client_factory import get_azopenaichatclient
+from agent_response_cache import ResponseCacheMiddleware
+from agent_prefilter import SPAM_RULES, PreFilteredAgentExecutor, Prediction, RuleClassifier
+from agent_routing import add_keyed_switch_case_edge_group
+from agent_structured_output import parse_response
 from pathlib import Path
-from typing import Any, Literal
+from typing import Literal
 from typing_extensions import Never
 
 from agent_framework import (
     AgentExecutor,
     AgentExecutorRequest,
     AgentExecutorResponse,
-    Case,
     ChatMessage,
-    Default,
     Role,
+    Workflow,
     WorkflowBuilder,
     WorkflowContext,
     executor
@@ -35,17 +38,28 @@ class EmailResponse(BaseModel):
     """Represents the response from the email assistant."""
     response: str
 
+# Rule-based spam pre-classifier, shared by every workflow built from this module
+pre_classifier = RuleClassifier(SPAM_RULES)
+
+# Exact-match cache of the spam detection answers, so an email seen before costs a lookup instead of a model call
+response_cache = ResponseCacheMiddleware()
+
+def spam_from_prediction(prediction: Prediction, email: str) -> DetectionResultAgent | None:
+    """Turn a confident spam prediction into the agent's output. Anything else is left to the agent."""
+    if prediction.label != "spam":
+        return None
+    return DetectionResultAgent(spam_decision="Spam", reason=prediction.reason)
 
 @executor(id="to_detection_result")
 async def to_detection_result(response: AgentExecutorResponse, ctx: WorkflowContext[DetectionResult]) -> None:
-    parsed = DetectionResultAgent.model_validate_json(response.agent_run_response.text)
+    parsed = parse_response(response, DetectionResultAgent)
     email_content = response.full_conversation[0].text
     await ctx.send_message(DetectionResult(spam_decision=parsed.spam_decision, reason=parsed.reason, email_content=email_content))
 
 @executor(id="send_email")
 async def handle_email_response(response: AgentExecutorResponse, ctx: WorkflowContext[Never, str]) -> None:
     """Handle legitimate emails by drafting a professional response."""
-    email_response = EmailResponse.model_validate_json(response.agent_run_response.text)
+    email_response = parse_response(response, EmailResponse)
     await ctx.yield_output(f"Email sent:\n{email_response.response}")
 
 @executor(id="handle_spam")
@@ -102,22 +116,11 @@ async def get_email_sample() -> str:
     return email_path.read_text(encoding="utf-8", errors="replace")
 
 
-def get_case(expected_decision: str):
-    """Factory that returns a predicate matching a specific spam_decision value."""
-
-    def condition(message: Any) -> bool:
-        # Only match when the upstream payload is a DetectionResult with the expected decision.
-        return isinstance(message, DetectionResult) and message.spam_decision == expected_decision
-
-    return condition
-
-
-# The main function
-async def main() -> None:
-    email = await get_email_sample()
-    chat_client = get_azopenaichatclient()
-
-    spam_detection_agent = AgentExecutor(
+# Build the workflow
+def create_workflow(chat_client) -> Workflow:
+    """Build the spam detection workflow on top of the chat client."""
+    # Obvious spam is recognized by local rules; the agent only sees the emails the rules are unsure about
+    spam_detection_agent = PreFilteredAgentExecutor(
         chat_client.create_agent(
             instructions=(
                 "You are a spam detection assistant that identifies spam emails. "
@@ -126,7 +129,10 @@ async def main() -> None:
                 "and 'reason' (string)."
             ),
             response_format=DetectionResultAgent,
+            middleware=[response_cache],
         ),
+        classifier=pre_classifier,
+        to_result=spam_from_prediction,
         id="spam_detection_agent",
     )
 
@@ -143,22 +149,36 @@ async def main() -> None:
     )
 
     # Build workflow: spam_detection_agent -> to_detection_result -> switch (NotSpam or Spam or Default).
-    workflow = (
+    builder = (
         WorkflowBuilder()
         .set_start_executor(spam_detection_agent)
         .add_edge(spam_detection_agent, to_detection_result)
-        .add_switch_case_edge_group(
-            to_detection_result,
-            [
-                Case(condition=get_case("NotSpam"), target=to_email_assistant_request),
-                Case(condition=get_case("Spam"), target=handle_spam_classifier_response),
-                Default(target=handle_uncertain),
-            ],
-        )
+    )
+    # Same routing as add_switch_case_edge_group with Case(condition=...) for NotSpam and Spam and Default(handle_uncertain),
+    # but the decision is looked up in a table instead of testing each case in turn.
+    # keys lets the builder reject cases for decisions the agent can never return.
+    add_keyed_switch_case_edge_group(
+        builder,
+        to_detection_result,
+        key=lambda detection: detection.spam_decision,
+        cases={
+            "NotSpam": to_email_assistant_request,
+            "Spam": handle_spam_classifier_response,
+        },
+        default=handle_uncertain,
+        keys=DetectionResultAgent.model_fields["spam_decision"].annotation,
+    )
+    return (
+        builder
         .add_edge(to_email_assistant_request, email_assistant_agent)
         .add_edge(email_assistant_agent, handle_email_response)
         .build()
     )
+
+# The main function
+async def main() -> None:
+    email = await get_email_sample()
+    workflow = create_workflow(get_azopenaichatclient())
     generate_workflow_visualization(workflow, name="diagrams/workflow_branching_switch_case")
 
     # Since the start executor is an AgentExecutor, we need to send an AgentExecutorRequest object.
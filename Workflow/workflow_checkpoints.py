@@ -2,11 +2,13 @@
 import asyncio
 
 from agent_framework import (
+    CheckpointStorage,
     FileCheckpointStorage,
-    WorkflowBuilder,
+    Workflow,
     WorkflowContext,
     executor,
 )
+from agent_fusion import FusingWorkflowBuilder
 from agent_utilities import generate_workflow_visualization, get_input_text
 from typing_extensions import Never
 
@@ -33,16 +35,15 @@ async def final(text: str, ctx: WorkflowContext[Never]) -> None:
     await ctx.yield_output(text)
 
 # Main function to run the workflow with checkpoints
-async def main() -> None:
-    # Checkpoint storage
-    checkpoint_storage = FileCheckpointStorage(CHECKPOINTS_FOLDER)
+def create_workflow(checkpoint_storage: CheckpointStorage, fuse: bool = False) -> Workflow:
+    """Build the sequential workflow that saves a checkpoint after every superstep.
 
-    # Another option is to use the built-in in-memory storage
-    # second_checkpoint_storage = InMemoryCheckpointStorage()
-
-    # Build workflow with checkpointing enabled
-    workflow = (
-        WorkflowBuilder()
+    Each executor is its own superstep, so there is a checkpoint between every two of them to resume from.
+    With `fuse`, the three functions after the first one run as a single step with a single checkpoint,
+    which is much cheaper when the chain is too quick to be worth resuming halfway.
+    """
+    return (
+        FusingWorkflowBuilder(fuse=fuse)
         .set_start_executor(first)
         .add_edge(first, second)
         .add_edge(second, third)
@@ -51,6 +52,26 @@ async def main() -> None:
         .build()
     )
 
+async def main() -> None:
+    # Checkpoint storage
+    checkpoint_storage = FileCheckpointStorage(CHECKPOINTS_FOLDER)
+
+    # Another option is to use the built-in in-memory storage
+    # second_checkpoint_storage = InMemoryCheckpointStorage()
+
+    # Or compact binary files (msgpack/CBOR + zstd) from agent_checkpoint_storage.py
+    # third_checkpoint_storage = BinaryCheckpointStorage(CHECKPOINTS_FOLDER)
+    # with delta checkpoints between full snapshots, so each superstep only writes what changed
+    # fourth_checkpoint_storage = BinaryCheckpointStorage(CHECKPOINTS_FOLDER, full_snapshot_interval=10)
+    # Both binary storages keep a SQLite catalog, so list_checkpoints(workflow_id) only reads that workflow's files.
+    # The same catalog can be added to the JSON files:
+    # fifth_checkpoint_storage = IndexedCheckpointStorage(FileCheckpointStorage(CHECKPOINTS_FOLDER))
+    # Write-behind: supersteps queue their checkpoints and a background task writes them (await storage.aclose() at the end)
+    # sixth_checkpoint_storage = WriteBehindCheckpointStorage(BinaryCheckpointStorage(CHECKPOINTS_FOLDER, durability="batch"))
+
+    # Build workflow with checkpointing enabled
+    workflow = create_workflow(checkpoint_storage)
+
     generate_workflow_visualization(workflow, name="diagrams/workflow_checkpoints")
 
     # Run the workflow and create checkpoints
@@ -1,7 +1,9 @@
 import asyncio
 import random
 
-from agent_framework import Executor, WorkflowBuilder, WorkflowContext, WorkflowOutputEvent, handler
+from agent_framework import Executor, Workflow, WorkflowBuilder, WorkflowContext, WorkflowOutputEvent, handler
+from agent_offload import OffloadExecutor, PoolKind
+from agent_vectors import Vector, count, mean, total
 from agent_utilities import generate_workflow_visualization
 from typing_extensions import Never
 
@@ -12,35 +14,19 @@ class Dispatcher(Executor):
     """
 
     @handler
-    async def handle(self, numbers: list[int], ctx: WorkflowContext[list[int]]):
+    async def handle(self, numbers: list[int], ctx: WorkflowContext[Vector]):
         if not numbers:
             raise RuntimeError("Input must be a valid list of integers.")
 
-        await ctx.send_message(numbers)
-
-class Average(Executor):
-    """Calculate the average of a list of integers."""
+        # Packed once into a read-only array that every branch reads without copying
+        await ctx.send_message(Vector.from_values(numbers, "q"))
 
     @handler
-    async def handle(self, numbers: list[int], ctx: WorkflowContext[float]):
-        average: float = sum(numbers) / len(numbers)
-        await ctx.send_message(average)
+    async def handle_vector(self, numbers: Vector, ctx: WorkflowContext[Vector]):
+        if not len(numbers):
+            raise RuntimeError("Input must be a non-empty vector.")
 
-class Sum(Executor):
-    """Calculate the sum of a list of integers."""
-
-    @handler
-    async def handle(self, numbers: list[int], ctx: WorkflowContext[int]):
-        total: int = sum(numbers)
-        await ctx.send_message(total)
-
-class Count(Executor):
-    """Count the number of integers in a list."""
-
-    @handler
-    async def handle(self, numbers: list[int], ctx: WorkflowContext[int]):
-        count: int = len(numbers)
-        await ctx.send_message(count)
+        await ctx.send_message(numbers)
 
 class Aggregator(Executor):
     """Aggregate the results from the different tasks and yield the final output."""
@@ -49,22 +35,33 @@ class Aggregator(Executor):
     async def handle(self, results: list[int | float], ctx: WorkflowContext[Never, list[int | float]]):
         await ctx.yield_output(results)
 
-async def main() -> None:
+def create_workflow(pool: PoolKind = "thread", inline_below: int = 100_000) -> Workflow:
+    """Build the fan-out/fan-in workflow.
+
+    The numbers are sent to the branches as a read-only Vector and reduced with the vectorized count,
+    total and mean from agent_vectors. Vectors of at least `inline_below` numbers are processed in `pool`
+    instead of on the event loop; shorter ones are quicker to process inline. These reductions are cheap
+    next to moving the data, so a thread pool is as fast as a process pool here without the pickling and
+    shared-memory setup of each step; use pool="process" for CPU-bound reducers that hold the GIL.
+    """
     # Create the executors
     dispatcher = Dispatcher(id="dispatcher")
-    count = Count(id="ito")
-    summation = Sum(id="summation")
-    average = Average(id="average")
+    counter = OffloadExecutor(count, pool=pool, inline_below=inline_below, id="ito")
+    summation = OffloadExecutor(total, pool=pool, inline_below=inline_below, id="summation")
+    averager = OffloadExecutor(mean, pool=pool, inline_below=inline_below, id="average")
     aggregator = Aggregator(id="aggregator")
 
     # Build a simple fan out and fan in workflow
-    workflow = (
+    return (
         WorkflowBuilder()
         .set_start_executor(dispatcher)
-        .add_fan_out_edges(dispatcher, [average, summation, count])
-        .add_fan_in_edges([count, summation, average], aggregator)
+        .add_fan_out_edges(dispatcher, [averager, summation, counter])
+        .add_fan_in_edges([counter, summation, averager], aggregator)
         .build()
     )
+
+async def main() -> None:
+    workflow = create_workflow()
     generate_workflow_visualization(workflow, name="diagrams/workflow_concurrent")
 
     # Run the workflow
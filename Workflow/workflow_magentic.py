@@ -19,7 +19,7 @@ from agent_framework import (
     WorkflowRunState,
 )
 from agent_utilities import generate_workflow_visualization
-from agent_client_factory import get_azopenaichatclient, get_azopenairesponsesclient
+from agent_client_factory import client_registry, get_azopenaichatclient, get_azopenairesponsesclient
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -136,6 +136,9 @@ async def main() -> None:
                 else:
                     pending_request = None
 
+    # Close the shared HTTP connection pools used by the chat clients
+    await client_registry.aclose()
+
 # Run the main function
 if __name__ == "__main__":
     asyncio.run(main())
@@ -5,6 +5,7 @@
 import asyncio
 from agent_utilities import generate_workflow_visualization
 from agent_client_factory import get_azopenaichatclient
+from agent_structured_output import parse_response
 from dataclasses import dataclass
 from pydantic import BaseModel
 
@@ -66,7 +67,7 @@ class TurnManager(Executor):
         """Handle the agent's guess and request human guidance."""
         # Parse structured model output (defensive default if agent didn't reply)
         text = result.agent_run_response.text or ""
-        last_guess = GuessOutput.model_validate_json(text).guess if text else None
+        last_guess = parse_response(result, GuessOutput).guess if text else None
 
         # Craft a clear human prompt that defines higher/lower relative to agent's guess
         prompt = (
@@ -98,10 +99,10 @@ class TurnManager(Executor):
         )
         await ctx.send_message(AgentExecutorRequest(messages=[user_msg], should_respond=True))
 
-# Main function to build and run the workflow
-async def main() -> None:
+# Build the guessing game workflow
+def create_workflow(chat_client) -> Workflow:
+    """Build the workflow that alternates between the agent and the human player."""
     # Create the chat agent with structured output enforcement
-    chat_client = get_azopenaichatclient()
     agent = chat_client.create_agent(
         instructions=(
             "You guess a number between 1 and 20. "
@@ -117,7 +118,7 @@ async def main() -> None:
     request_info_executor = RequestInfoExecutor(id="request_info")
 
     # Build the workflow
-    workflow = (
+    return (
         WorkflowBuilder()
         .set_start_executor(turn_manager)
         .add_edge(turn_manager, agent_exec)
@@ -126,6 +127,10 @@ async def main() -> None:
         .add_edge(request_info_executor, turn_manager)
         .build()
     )
+
+# Main function to build and run the workflow
+async def main() -> None:
+    workflow = create_workflow(get_azopenaichatclient())
     generate_workflow_visualization(workflow, name="diagrams/workflow_request_and_response")
 
     print("🎯 Number Guessing Game")
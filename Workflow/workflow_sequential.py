@@ -4,8 +4,9 @@
 # pip install aioconsole
 
 import asyncio
+from agent_fusion import FusingWorkflowBuilder
 from agent_utilities import get_input_text
-from agent_framework import WorkflowBuilder, WorkflowContext, WorkflowOutputEvent, WorkflowViz, executor
+from agent_framework import Workflow, WorkflowContext, WorkflowOutputEvent, WorkflowViz, executor
 from typing_extensions import Never
 
 @executor(id="upper_case_executor")
@@ -32,19 +33,27 @@ async def reverse_text(text: str, ctx: WorkflowContext[Never, str]) -> None:
     await ctx.yield_output(result)
 
 # Main function to run the workflow
-async def main():
-    print("Please provide input text (via stdin or command line argument) to process.")
-    text = await get_input_text()
+def create_workflow(fuse: bool = True, debug: bool = False) -> Workflow:
+    """Build the sequential workflow.
 
-    # Build the sequential workflow
-    workflow = (
-        WorkflowBuilder()
+    The three executors are plain functions, so by default they are fused into a single step that calls
+    them one after the other; `debug=True` still reports what each of them sent, `fuse=False` keeps three steps.
+    """
+    return (
+        FusingWorkflowBuilder(fuse=fuse, debug=debug)
         .add_edge(to_upper_case, another_to_upper_text)
         .add_edge(another_to_upper_text, reverse_text)
         .set_start_executor(to_upper_case)
         .build()
     )
 
+async def main():
+    print("Please provide input text (via stdin or command line argument) to process.")
+    text = await get_input_text()
+
+    # Build the sequential workflow
+    workflow = create_workflow()
+
     # Run the workflow and stream events
     async for event in workflow.run_stream(text):
         print(f"Event: {event}")
@@ -6,15 +6,19 @@ from agent_framework import (
     AgentExecutor,
     AgentExecutorRequest,
     AgentExecutorResponse,
+    AgentProtocol,
     ChatMessage,
     Executor,
     Role,
+    Workflow,
     WorkflowBuilder,
     WorkflowContext,
     handler,
 )
 from typing_extensions import Never
 from agent_client_factory import get_azopenaichatclient
+from agent_envelopes import SharedRequest
+from agent_fan_in import FanInPolicy, StreamingFanIn
 from agent_utilities import WorkflowVisualizationType, generate_workflow_visualization
 
 # Define a dataclass to hold aggregated insights
@@ -29,86 +33,102 @@ class AggregatedInsights:
 class DispatchToExperts(Executor):
     """Dispatches the incoming prompt to all expert agent executors (fan-out)."""
 
+    def __init__(self, id: str | None = None):
+        super().__init__(id=id or "dispatcher")
+
     @handler
     async def dispatch(self, prompt: str, ctx: WorkflowContext[AgentExecutorRequest]) -> None:
+        # A single read-only request: the fan-out edges deliver this same object to every expert
         initial_message = ChatMessage(Role.USER, text=prompt)
-        for expert_id in self._expert_ids:
-            await ctx.send_message(
-                AgentExecutorRequest(messages=[initial_message], should_respond=True),
-                target_id=expert_id,
-            )
+        await ctx.send_message(SharedRequest([initial_message], should_respond=True))
 
 # Executor to aggregate responses from expert agents
 class AggregateInsights(Executor):
     """Aggregates expert agent responses into a single consolidated result (fan-in)."""
 
+    def __init__(self, expert_ids: list[str], id: str | None = None):
+        super().__init__(id=id or "aggregator")
+        self._expert_ids = expert_ids
+
     @handler
     async def aggregate(self, results: list[AgentExecutorResponse], ctx: WorkflowContext[Never, str]) -> None:
         by_id: dict[str, str] = {}
         for r in results:
             by_id[r.executor_id] = r.agent_run_response.text
 
-        research_text = by_id.get("researcher", "")
-        marketing_text = by_id.get("marketer", "")
-        legal_text = by_id.get("legal", "")
+        await ctx.yield_output(consolidate_insights(by_id))
 
-        aggregated = AggregatedInsights(
-            research=research_text,
-            marketing=marketing_text,
-            legal=legal_text,
-        )
+# Expert panel that aggregates the expert responses as they arrive (incremental fan-in)
+class StreamingInsights(StreamingFanIn):
+    """Runs the experts itself and consolidates their answers once the fan-in policy is met."""
 
-        # Provide a readable, consolidated string as the final workflow result.
-        consolidated = (
-            "Consolidated Insights\n"
-            "====================\n\n"
-            f"Research Findings:\n{aggregated.research}\n\n"
-            f"Marketing Angle:\n{aggregated.marketing}\n\n"
-            f"Legal/Compliance Notes:\n{aggregated.legal}\n"
-        )
+    def __init__(self, experts: dict[str, AgentProtocol], policy: FanInPolicy, id: str | None = None):
+        super().__init__(experts, policy, id=id or "aggregator")
 
-        await ctx.yield_output(consolidated)
+    async def finalize(self, responses: list[AgentExecutorResponse], missing: list[str], ctx: WorkflowContext[Never, str]) -> None:
+        by_id = {expert_id: "(no answer in time)" for expert_id in missing}
+        for response in responses:
+            by_id[response.executor_id] = response.agent_run_response.text
+        await ctx.yield_output(consolidate_insights(by_id))
 
-# Main function to build and visualize the workflow
-async def main() -> None:
-    # Create agent executors for domain experts
-    chat_client = get_azopenaichatclient()
+def consolidate_insights(by_id: dict[str, str]) -> str:
+    """Readable, consolidated string of the expert answers, by expert id."""
+    aggregated = AggregatedInsights(
+        research=by_id.get("researcher", ""),
+        marketing=by_id.get("marketer", ""),
+        legal=by_id.get("legal", ""),
+    )
+
+    return (
+        "Consolidated Insights\n"
+        "====================\n\n"
+        f"Research Findings:\n{aggregated.research}\n\n"
+        f"Marketing Angle:\n{aggregated.marketing}\n\n"
+        f"Legal/Compliance Notes:\n{aggregated.legal}\n"
+    )
+
+# Build the fan-out/fan-in workflow
+def create_workflow(chat_client, fan_in_policy: FanInPolicy | None = None) -> Workflow:
+    """Build the fan-out/fan-in workflow with the three expert agents.
 
-    researcher = AgentExecutor(
-        chat_client.create_agent(
+    With a `fan_in_policy`, the experts run inside a StreamingInsights executor instead of fan-out/fan-in
+    edges, and the insights are consolidated once the policy is met (for example 2 of 3 experts).
+    """
+    # Create the domain expert agents, by executor id
+    experts = {
+        "researcher": chat_client.create_agent(
             instructions=(
                 "You're an expert market and product researcher. Given a prompt, provide concise, factual insights,"
                 " opportunities, and risks."
             ),
         ),
-        id="researcher",
-    )
-    marketer = AgentExecutor(
-        chat_client.create_agent(
+        "marketer": chat_client.create_agent(
             instructions=(
                 "You're a creative marketing strategist. Craft compelling value propositions and target messaging"
                 " aligned to the prompt."
             ),
         ),
-        id="marketer",
-    )
-    legal = AgentExecutor(
-        chat_client.create_agent(
+        "legal": chat_client.create_agent(
             instructions=(
                 "You're a cautious legal/compliance reviewer. Highlight constraints, disclaimers, and policy concerns"
                 " based on the prompt."
             ),
         ),
-        id="legal",
-    )
+    }
+
+    dispatcher = DispatchToExperts(id="dispatcher")
+    if fan_in_policy is not None:
+        panel = StreamingInsights(experts, fan_in_policy, id="aggregator")
+        return WorkflowBuilder().set_start_executor(dispatcher).add_edge(dispatcher, panel).build()
 
+    # Create agent executors for domain experts
+    researcher, marketer, legal = (AgentExecutor(agent, id=expert_id) for expert_id, agent in experts.items())
     expert_ids = [researcher.id, marketer.id, legal.id]
 
-    dispatcher = DispatchToExperts(expert_ids=expert_ids, id="dispatcher")
     aggregator = AggregateInsights(expert_ids=expert_ids, id="aggregator")
 
     # Build a simple fan-out/fan-in workflow
-    workflow = (
+    return (
         WorkflowBuilder()
         .set_start_executor(dispatcher)
         .add_fan_out_edges(dispatcher, [researcher, marketer, legal])
@@ -116,6 +136,10 @@ async def main() -> None:
         .build()
     )
 
+# Main function to build and visualize the workflow
+async def main() -> None:
+    workflow = create_workflow(get_azopenaichatclient())
+
     # Generate workflow visualization
     print("Generating workflow visualization...")
     generate_workflow_visualization(workflow, name="diagrams/workflow_visualization")
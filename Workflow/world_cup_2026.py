@@ -1,8 +1,10 @@
 import asyncio
+from collections.abc import Mapping
 from dataclasses import dataclass
 from agent_framework import (
     AgentExecutor,
     AgentExecutorResponse,
+    AgentProtocol,
     AgentRunEvent,
     AgentRunResponse,
     AgentRunUpdateEvent,
@@ -13,12 +15,16 @@ from agent_framework import (
     RequestInfoMessage,
     RequestResponse,
     Role,
+    Workflow,
     WorkflowBuilder, 
     WorkflowContext,
     handler
 )
 from agent_utilities import generate_workflow_visualization
-from agent_client_factory import get_azopenaichatclient
+from agent_client_factory import client_registry, get_azopenaichatclient
+from agent_fan_in import FanInPolicy, StreamingFanIn
+from agent_hedging import HedgedAgent, Hedging
+from agent_prompt_cache import PromptCacheReport, PromptPrefixMiddleware
 
 EXPERT_INSTRUCTIONS = """
     Purpose
@@ -59,6 +65,9 @@ AGGREGATOR_INSTRUCTIONS = """
     - Your goal is to merge the insights of multiple analysts into the most balanced and justified final ranking.
 """
 
+# Ids of the expert executors whose predictions are aggregated
+EXPERT_IDS = ["expert_gaston_recondo", "expert_horacio_pagani", "expert_morena_beltran"]
+
 MY_PREDICTION = """
     1. Argentina because is Messi papa!
     2. France because is second
@@ -120,16 +129,39 @@ class Aggregator(Executor):
         #     print(f"Received prediction from {response.executor_id}:")
         #     print(response.agent_run_response.text)
         
+        predictions = [response.agent_run_response.text for response in input if response.executor_id in EXPERT_IDS]
+        # Experts left out by the fan-in policy of the expert panel
+        predictions += ["(No prediction in time.)"] * (len(EXPERT_IDS) - len(predictions))
+
         aggregated_prompt = SUMMARY_PROMPT.format(
-            expert_1_prediction=input[0].agent_run_response.text,
-            expert_2_prediction=input[1].agent_run_response.text,
-            expert_3_prediction=input[2].agent_run_response.text,
+            expert_1_prediction=predictions[0],
+            expert_2_prediction=predictions[1],
+            expert_3_prediction=predictions[2],
             my_prediction=await ctx.get_shared_state("shared_file_id")
         )
 
         await ctx.send_message(aggregated_prompt)
 
 
+class ExpertPanel(StreamingFanIn):
+    """Runs the experts and sends their predictions on to the aggregator's fan-in.
+
+    Messages sent by an executor are delivered when its superstep ends, so the aggregator receives the
+    predictions together once the fan-in policy is met, not one by one as they arrive. What the policy
+    saves is the wait for the experts still running at that point, which are cancelled.
+    """
+
+    def __init__(self, experts: Mapping[str, AgentProtocol], policy: FanInPolicy, id: str | None = None):
+        super().__init__(experts, policy, id=id or "expert_panel")
+
+    async def on_result(self, response: AgentExecutorResponse, ctx: WorkflowContext[AgentExecutorResponse]) -> None:
+        await ctx.send_message(response)
+
+    async def finalize(self, responses: list[AgentExecutorResponse], missing: list[str], ctx: WorkflowContext[AgentExecutorResponse]) -> None:
+        if missing:
+            print(f"Continuing without: {', '.join(missing)}")
+
+
 class UserPredictionManager(Executor):
     """Manages user feedback to refine the prediction."""
 
@@ -179,58 +211,98 @@ class UserPredictionManager(Executor):
         msg = ChatMessage(role=Role.USER, text=user_prediction)
         response = AgentRunResponse(messages=[msg])
         result = AgentExecutorResponse(
-            executor_id=ctx.executor.id,
+            executor_id=self.id,
             agent_run_response=response,
         )
         await ctx.send_message(result)
 
 
-def create_expert_recondo(chat_client) -> AgentExecutor:
-    return AgentExecutor(chat_client.create_agent(
+def with_hedging(agent: AgentProtocol, hedging: Hedging | None = None) -> AgentProtocol:
+    """The expert agent, which sends a duplicate of slow calls when given a Hedging."""
+    if hedging is not None:
+        return HedgedAgent(agent, hedging)
+    return agent
+
+def create_expert_recondo(chat_client, report: PromptCacheReport | None = None, hedging: Hedging | None = None) -> AgentProtocol:
+    return with_hedging(chat_client.create_agent(
         name="Gaston_Recondo",
         instructions=EXPERT_INSTRUCTIONS,
         temperature=0,
         top_p=0.8,
-    ), id="expert_gaston_recondo")
+        middleware=[PromptPrefixMiddleware("Gaston_Recondo", report)],
+    ), hedging)
 
-def create_expert_pagani(chat_client) -> AgentExecutor:
-    return AgentExecutor(chat_client.create_agent(
+def create_expert_pagani(chat_client, report: PromptCacheReport | None = None, hedging: Hedging | None = None) -> AgentProtocol:
+    return with_hedging(chat_client.create_agent(
         name="Horacio_Pagani",
         instructions=EXPERT_INSTRUCTIONS,
         temperature=1,
         top_p=0.8,
-    ), id="expert_horacio_pagani")
+        middleware=[PromptPrefixMiddleware("Horacio_Pagani", report)],
+    ), hedging)
 
-def create_expert_beltran(chat_client) -> AgentExecutor:
-    return AgentExecutor(chat_client.create_agent(
+def create_expert_beltran(chat_client, report: PromptCacheReport | None = None, hedging: Hedging | None = None) -> AgentProtocol:
+    return with_hedging(chat_client.create_agent(
         name="Morena_Beltran",
         instructions=EXPERT_INSTRUCTIONS,
         temperature=0.5,
         top_p=0.4,
-    ), id="expert_morena_beltran")
+        middleware=[PromptPrefixMiddleware("Morena_Beltran", report)],
+    ), hedging)
 
-def create_expert_vignolo(chat_client) -> AgentExecutor:
+def create_expert_vignolo(chat_client, report: PromptCacheReport | None = None) -> AgentExecutor:
     return AgentExecutor(chat_client.create_agent(
         name="Sebastian_Vignolo",
         instructions=AGGREGATOR_INSTRUCTIONS,
         temperature=0.1,
         top_p=0.8,
+        middleware=[PromptPrefixMiddleware("Sebastian_Vignolo", report)],
     ), id="expert_sebastian_vignolo")
 
-async def main() -> None:
+def create_workflow(
+    chat_client,
+    prompt_cache_report: PromptCacheReport | None = None,
+    fan_in_policy: FanInPolicy | None = None,
+    hedging: Mapping[str, Hedging] | None = None,
+) -> Workflow:
+    """Build the fan-out/fan-in workflow with the experts, the user prediction and the final synthesis.
+
+    The prompt cache usage of every agent is recorded in `prompt_cache_report` when given. With a
+    `fan_in_policy`, the experts run in an ExpertPanel, and the synthesis goes ahead once the policy is
+    met (for example 2 of 3 experts or 20 seconds) instead of waiting for the slowest expert. `hedging`
+    maps expert ids (EXPERT_IDS) to the Hedging of their agents; pass the same objects to every build
+    so the latency history and budgets carry over from one run to the next.
+    """
+    hedging = hedging or {}
     # Create the executors
     dispatcher = Dispatcher(id="dispatcher")
     aggregator = Aggregator(id="aggregator")
     user_prediction_manager = UserPredictionManager(id="user_prediction_manager")
     request_info_executor = RequestInfoExecutor(id="request_info")
-    openai_client = get_azopenaichatclient()
-    agent_recondo = create_expert_recondo(openai_client)
-    agent_pagani = create_expert_pagani(openai_client)
-    agent_beltran = create_expert_beltran(openai_client)
-    agent_vignolo = create_expert_vignolo(openai_client)
+    experts = {
+        "expert_gaston_recondo": create_expert_recondo(chat_client, prompt_cache_report, hedging.get("expert_gaston_recondo")),
+        "expert_horacio_pagani": create_expert_pagani(chat_client, prompt_cache_report, hedging.get("expert_horacio_pagani")),
+        "expert_morena_beltran": create_expert_beltran(chat_client, prompt_cache_report, hedging.get("expert_morena_beltran")),
+    }
+    agent_vignolo = create_expert_vignolo(chat_client, prompt_cache_report)
+
+    if fan_in_policy is not None:
+        expert_panel = ExpertPanel(experts, fan_in_policy, id="expert_panel")
+        return (
+            WorkflowBuilder()
+            .set_start_executor(dispatcher)
+            .add_fan_out_edges(dispatcher, [expert_panel, user_prediction_manager])
+            .add_edge(user_prediction_manager, request_info_executor)
+            .add_edge(request_info_executor, user_prediction_manager)
+            .add_fan_in_edges([user_prediction_manager, expert_panel], aggregator)
+            .add_edge(aggregator, agent_vignolo)
+            .build()
+        )
+
+    agent_recondo, agent_pagani, agent_beltran = (AgentExecutor(agent, id=expert_id) for expert_id, agent in experts.items())
 
     # Build the workflow
-    workflow = (
+    return (
         WorkflowBuilder()
         .set_start_executor(dispatcher)
         .add_fan_out_edges(dispatcher, [agent_recondo, agent_pagani, agent_beltran, user_prediction_manager])
@@ -240,6 +312,15 @@ async def main() -> None:
         .add_edge(aggregator, agent_vignolo)
         .build()
     )
+
+async def main() -> None:
+    # Cached prompt tokens per agent for this run
+    prompt_cache_report = PromptCacheReport()
+    # An expert that has not answered after 10 seconds gets a duplicate request. The synthesis waits for
+    # all three experts; pass fan_in_policy=FanInPolicy(quorum=2, timeout=20.0) to go ahead after 2 of
+    # them or 20 seconds instead, at the cost of leaving a prediction out
+    hedging = {expert_id: Hedging(initial_delay=10.0) for expert_id in EXPERT_IDS}
+    workflow = create_workflow(get_azopenaichatclient(), prompt_cache_report, hedging=hedging)
     generate_workflow_visualization(workflow, name="diagrams/world_cup_2026")
     print("This workflow has been created to predict the top 3 favorites to win the 2026 World Cup.")
     input("Press Enter to continue...")
@@ -257,15 +338,22 @@ async def main() -> None:
                 print()
             elif not isinstance(event, AgentRunUpdateEvent):
                 print(f"Event: {event}")
-            elif event.executor_id == agent_vignolo.id:
+            elif event.executor_id == "expert_sebastian_vignolo":
                 print(event.data, end="", flush=True)
     else:
         for event in await workflow.run(ENTRY_PROMPT):
             if not isinstance(event, AgentRunEvent):
                 print(f"Event: {event}")
-            elif isinstance(event, AgentRunEvent) and event.executor_id == agent_vignolo.id:
+            elif isinstance(event, AgentRunEvent) and event.executor_id == "expert_sebastian_vignolo":
                 print("Result of the workflow: \n")
                 print(event.data)
 
+    print()
+    print("Prompt cache usage:")
+    print(prompt_cache_report.format())
+
+    # Close the shared HTTP connection pools used by the chat clients
+    await client_registry.aclose()
+
 if __name__ == "__main__":
     asyncio.run(main())